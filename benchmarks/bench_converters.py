@@ -0,0 +1,251 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: how the three converters scale with feed size
+
+Generates synthetic feeds (see feed_generators.py) and times each converter's stages separately:
+    - walker   : walker.readFeed (parse), walker.cleanFeed (transform), walker.writeFeed (write)
+    - gsp      : gsp_inventory.readInventory, processInventory and writeInventory
+    - suredone : the export pipeline of writeLocalExport, which streams, so its stages are measured by difference:
+                 parse is the csv reading of the export, transform adds the row formatting of suredone_inventory.tsv
+                 and write is the rest of a full writeLocalExport (the output files themselves)
+
+Results are printed and saved to a JSON file along with the commit and library versions they were measured with.
+Given the JSON of an earlier run (-b), every stage is compared against it and slowdowns are flagged.
+
+Usage:
+    $ python3 bench_converters.py [options]
+Options:
+    -s | --sizes       : Comma separated row counts (default: 10000,100000,1000000)
+    -c | --converters  : Comma separated converters among walker, gsp, suredone (default: all)
+    -r | --runs        : Runs per size, the fastest is kept (default: 1)
+    -o | --output      : Path of the JSON results (default: benchmarks/results/converters_<timestamp>.json)
+    -b | --baseline    : JSON results of an earlier run to compare against
+    -t | --threshold   : Slowdown (in percent) flagged as a regression (default: 10)
+"""
+import os
+import sys
+import csv
+import json
+import time
+import getopt
+import shutil
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from feed_generators import FEEDS
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+CONVERTERS = ['walker', 'gsp', 'suredone']
+STAGES = ['parse', 'transform', 'write']
+
+
+class NullWriter(object):
+    """ Stands in for an OutputSink's csv writer, so formatting a row can be timed without writing it. """
+
+    def writerow(self, row):
+        pass
+
+
+def benchWalker(inputPath, workDirectory):
+    import walker
+    outputPath = os.path.join(workDirectory, 'walker.tsv')
+    start = time.perf_counter()
+    data = walker.readFeed(inputPath)
+    parsed = time.perf_counter()
+    data = walker.cleanFeed(data)
+    transformed = time.perf_counter()
+    walker.writeFeed(data, outputPath)
+    written = time.perf_counter()
+    return {'parse': parsed - start, 'transform': transformed - parsed, 'write': written - transformed}, outputPath
+
+
+def benchGSP(inputPath, workDirectory):
+    import gsp_inventory
+    outputPath = os.path.join(workDirectory, 'gsp_inventory.tsv')
+    start = time.perf_counter()
+    data = gsp_inventory.readInventory(inputPath)
+    parsed = time.perf_counter()
+    data = gsp_inventory.processInventory(data)
+    transformed = time.perf_counter()
+    gsp_inventory.writeInventory(data, outputPath, '\t')
+    written = time.perf_counter()
+    return {'parse': parsed - start, 'transform': transformed - parsed, 'write': written - transformed}, outputPath
+
+
+def benchSureDone(inputPath, workDirectory):
+    import suredone_download
+    outputPath = os.path.join(workDirectory, 'SureDone_Download.csv')
+
+    # Parse: decode and split the export into rows
+    start = time.perf_counter()
+    for _ in csv.reader(suredone_download.iterDecodedLines(suredone_download.iterFileChunks(inputPath))):
+        pass
+    parseTime = time.perf_counter() - start
+
+    # Parse + transform: also select and format every row the way suredone_inventory.tsv gets it
+    sink = suredone_download.getInventorySink(workDirectory)
+    start = time.perf_counter()
+    rows = csv.reader(suredone_download.iterDecodedLines(suredone_download.iterFileChunks(inputPath)))
+    sink.open(next(rows))
+    sink.writer = NullWriter()
+    for row in rows:
+        if row:
+            sink.writeRow(row)
+    transformTime = time.perf_counter() - start - parseTime
+    sink.discard()
+
+    # Parse + transform + write: the full pipeline, writing the output file and suredone_inventory.tsv
+    start = time.perf_counter()
+    suredone_download.writeLocalExport(inputPath, outputPath, delimiter=',')
+    writeTime = time.perf_counter() - start - parseTime - transformTime
+    return {'parse': parseTime, 'transform': max(transformTime, 0.0), 'write': max(writeTime, 0.0)}, \
+        os.path.join(workDirectory, 'suredone_inventory.tsv')
+
+
+BENCHMARKS = {'walker': benchWalker, 'gsp': benchGSP, 'suredone': benchSureDone}
+
+
+def runConverter(converter, rows, runs, feedDirectory):
+    """
+    Function that times one converter on a feed of the given size, generating the feed first if needed.
+    Returns
+    -------
+        - result : dict
+            Fastest time of every stage over the runs, their total, input and output sizes
+    """
+    writeFeed, fileName = FEEDS[converter]
+    inputPath = os.path.join(feedDirectory, '{}_{}'.format(rows, fileName))
+    if not os.path.exists(inputPath):
+        writeFeed(inputPath, rows)
+
+    best = None
+    for _ in range(runs):
+        workDirectory = tempfile.mkdtemp(prefix='bench_{}_'.format(converter))
+        try:
+            timings, outputPath = BENCHMARKS[converter](inputPath, workDirectory)
+            bytesOut = os.path.getsize(outputPath)
+        finally:
+            shutil.rmtree(workDirectory, ignore_errors=True)
+        if best is None or sum(timings.values()) < sum(best.values()):
+            best = timings
+    total = sum(best.values())
+    return {'converter': converter, 'rows': rows, 'parse': best['parse'], 'transform': best['transform'],
+            'write': best['write'], 'total': total, 'rowsPerSecond': rows / total if total else None,
+            'bytesIn': os.path.getsize(inputPath), 'bytesOut': bytesOut}
+
+
+def getVersionInfo():
+    """ Function that describes what was measured: commit of the repository, python and library versions. """
+    try:
+        commit = subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                                         stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    libraries = {}
+    for name in ('pandas', 'openpyxl', 'pyarrow'):
+        try:
+            libraries[name] = __import__(name).__version__
+        except ImportError:
+            libraries[name] = None
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'libraries': libraries, 'timestamp': datetime.now().isoformat(timespec='seconds')}
+
+
+def compareResults(results, baseline, threshold):
+    """
+    Function that prints every stage next to the same stage of an earlier run.
+    Returns
+    -------
+        - regressions : int
+            Number of stages slower than the baseline by more than threshold percent
+    """
+    previous = {(entry['converter'], entry['rows']): entry for entry in baseline['results']}
+    print('\nCompared to {} ({}):'.format(baseline['version'].get('commit'), baseline['version'].get('timestamp')))
+    regressions = 0
+    for entry in results:
+        old = previous.get((entry['converter'], entry['rows']))
+        if old is None:
+            continue
+        for stage in STAGES + ['total']:
+            if not old[stage]:
+                continue
+            change = (entry[stage] / old[stage] - 1) * 100
+            flag = ''
+            if change > threshold:
+                flag = '  <-- regression'
+                regressions += 1
+            print('    {:<9} {:>9} {:<10} {:9.3f} s -> {:9.3f} s  {:+7.1f}%{}'.format(
+                entry['converter'], entry['rows'], stage, old[stage], entry[stage], change, flag))
+    return regressions
+
+
+def parseBenchArgs(argv):
+    sizes = DEFAULT_SIZES
+    converters = CONVERTERS
+    runs = 1
+    outputPath = os.path.join(HERE, 'results',
+                              'converters_{}.json'.format(datetime.now().strftime('%Y_%m_%d-%H-%M-%S')))
+    baselinePath = None
+    threshold = 10.0
+    opts, args = getopt.getopt(argv, 's:c:r:o:b:t:',
+                               ['sizes=', 'converters=', 'runs=', 'output=', 'baseline=', 'threshold='])
+    for option, value in opts:
+        if option in ('-s', '--sizes'):
+            sizes = [int(size) for size in value.split(',') if size]
+        elif option in ('-c', '--converters'):
+            converters = [converter for converter in value.split(',') if converter in BENCHMARKS]
+        elif option in ('-r', '--runs'):
+            runs = max(1, int(value))
+        elif option in ('-o', '--output'):
+            outputPath = value
+        elif option in ('-b', '--baseline'):
+            baselinePath = value
+        elif option in ('-t', '--threshold'):
+            threshold = float(value)
+    return sizes, converters, runs, outputPath, baselinePath, threshold
+
+
+def main(argv):
+    sizes, converters, runs, outputPath, baselinePath, threshold = parseBenchArgs(argv)
+    feedDirectory = tempfile.mkdtemp(prefix='bench_feeds_')
+    # The converters log to $HOME/log and keep their state under $HOME, keep both out of the user's home
+    os.environ['HOME'] = feedDirectory
+    results = []
+    try:
+        print('{:<9} {:>9} {:>10} {:>10} {:>10} {:>10} {:>12}'.format(
+            'converter', 'rows', 'parse s', 'transform', 'write s', 'total s', 'rows/s'))
+        for converter in converters:
+            for rows in sizes:
+                result = runConverter(converter, rows, runs, feedDirectory)
+                results.append(result)
+                print('{:<9} {:>9} {:10.3f} {:10.3f} {:10.3f} {:10.3f} {:12.0f}'.format(
+                    converter, rows, result['parse'], result['transform'], result['write'], result['total'],
+                    result['rowsPerSecond'] or 0))
+    finally:
+        shutil.rmtree(feedDirectory, ignore_errors=True)
+
+    report = {'version': getVersionInfo(), 'runs': runs, 'results': results}
+    if os.path.dirname(outputPath) and not os.path.exists(os.path.dirname(outputPath)):
+        os.makedirs(os.path.dirname(outputPath))
+    with open(outputPath, 'w') as resultsFile:
+        json.dump(report, resultsFile, indent=2)
+    print('\nResults saved to {}'.format(outputPath))
+
+    if baselinePath is not None:
+        with open(baselinePath) as baselineFile:
+            baseline = json.load(baselineFile)
+        regressions = compareResults(results, baseline, threshold)
+        print('{} stage(s) more than {:.0f}% slower than the baseline.'.format(regressions, threshold))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
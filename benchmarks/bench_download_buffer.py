@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: 1 KB iter_content loop vs. the adaptive reusable-buffer reader
+
+Downloads the same export from a stand-in server running in a separate process (so its CPU time isn't counted)
+and writes it to disk with:
+    - legacy   : iter_content(chunk_size=1024) and one write() per chunk, the loop downloadExportedFile used
+    - adaptive : SureDone.iterDownload, reading into one reusable buffer and writing memoryview slices
+
+Reports throughput (MB/s) and client CPU time, best of several runs.
+
+Usage:
+    $ python3 bench_download_buffer.py [rows] [runs]
+"""
+import os
+import sys
+import time
+import socket
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from suredone_download import SureDone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def startServer(rows):
+    """ Function that starts the stand-in server in its own process and waits until it accepts connections. """
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, 'standin_server.py'), str(port), str(rows)],
+                               stdout=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, 'http://127.0.0.1:{}/v1/'.format(port)
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError('Stand-in server did not start.')
+
+
+def legacyDownload(url, path):
+    stream = requests.get(url, stream=True)
+    with open(path, 'wb') as downloadedFile:
+        for chunk in stream.iter_content(chunk_size=1024):
+            if chunk:
+                downloadedFile.write(chunk)
+
+
+def adaptiveDownload(sureDone, url, path):
+    with open(path, 'wb') as downloadedFile:
+        for chunk in sureDone.iterDownload(url):
+            downloadedFile.write(chunk)
+
+
+def measure(function, path, runs):
+    best = None
+    for _ in range(runs):
+        wallStart, cpuStart = time.perf_counter(), time.process_time()
+        function(path)
+        result = (time.perf_counter() - wallStart, time.process_time() - cpuStart)
+        if best is None or result[0] < best[0]:
+            best = result
+    return best
+
+
+def main(argv):
+    rows = int(argv[0]) if len(argv) > 0 else 100000
+    runs = int(argv[1]) if len(argv) > 1 else 3
+
+    process, apiEndpoint = startServer(rows)
+    try:
+        with SureDone('bench', 'bench', 60) as sureDone:
+            sureDone.api_endpoint = apiEndpoint
+            fileName = sureDone.apicall('get', 'bulk/exports?fields=guid,stock,price,title,longdescription')[
+                'export_file']
+            url = sureDone.apicall('get', 'bulk/exports/' + fileName, {})['url']
+            path = os.path.join(tempfile.mkdtemp(), 'export.csv')
+
+            # Warm up the server's export cache and the connection pool
+            adaptiveDownload(sureDone, url, path)
+            size = os.path.getsize(path) / 1048576.0
+
+            results = [('legacy', measure(lambda target: legacyDownload(url, target), path, runs)),
+                       ('adaptive', measure(lambda target: adaptiveDownload(sureDone, url, target), path, runs))]
+    finally:
+        process.kill()
+
+    print('Export size: {:.2f} MB'.format(size))
+    for name, (wall, cpu) in results:
+        print('{:<9} {:8.1f} MB/s  wall={:6.3f} s  cpu={:6.3f} s'.format(name, size / wall, wall, cpu))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+End-to-end benchmark: a full suredone_download.py run against the local stand-in server
+
+Starts the stand-in server in its own process with the requested simulation settings, points a temporary
+suredone.yaml at it (through the 'endpoint' setting) and runs the real script as a subprocess, exactly as a
+scheduled run would. Reports, for each run:
+    - wall time of the script
+    - requests the server received (api and file) and the status codes it answered
+    - bytes served and the resulting throughput
+    - peak memory (max RSS) of the script
+A run only counts as successful if the script exited 0, the server received requests and the output file was
+written and isn't empty: a script stopping early without an error is a failure, not a fast run.
+
+Usage:
+    $ python3 bench_end_to_end.py [options] [rows] [runs] [-- script arguments]
+Options:
+    --latency <seconds>  --export-delay <seconds>  --rate-limit <requests>  --rate-window <seconds>
+    --forbidden-every <n>  --bandwidth <bytes per second>
+    Every option is passed on to the stand-in server. Arguments after '--' are passed on to suredone_download.py
+    (e.g. -- -s 4 -n 2).
+"""
+import os
+import sys
+import json
+import time
+import socket
+import getopt
+import resource
+import tempfile
+import subprocess
+import statistics
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(os.path.dirname(HERE), 'suredone_download.py')
+
+SERVER_OPTIONS = ['latency=', 'export-delay=', 'rate-limit=', 'rate-window=', 'forbidden-every=', 'bandwidth=']
+
+
+def startServer(rows, serverArgs):
+    """ Function that starts the stand-in server in its own process and waits until it accepts connections. """
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, 'standin_server.py')] + serverArgs +
+                               [str(port), str(rows)], stdout=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, 'http://127.0.0.1:{}'.format(port)
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError('Stand-in server did not start.')
+
+
+def getServerStats(baseURL):
+    with urllib.request.urlopen(baseURL + '/stats', timeout=15) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def getChildMaxRSS():
+    """ Largest resident set (in MB) of any child process waited for so far. Linux reports KB, macOS bytes. """
+    maxRSS = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return maxRSS / (1024.0 * 1024.0) if sys.platform == 'darwin' else maxRSS / 1024.0
+
+
+def runScript(workDirectory, configPath, scriptArgs, run):
+    """ Function that runs suredone_download.py once and returns its wall time, exit code and output size. """
+    outputPath = os.path.join(workDirectory, 'run_{}'.format(run), 'suredone_inventory.csv')
+    os.makedirs(os.path.dirname(outputPath))
+    # The state directory holds the export cache and the change detection hashes, every run starts without them
+    environment = dict(os.environ, HOME=os.path.join(workDirectory, 'run_{}'.format(run)))
+    command = [sys.executable, SCRIPT, '-f', configPath, '-o', outputPath, '-t', '0', '-a'] + scriptArgs
+    start = time.perf_counter()
+    exitCode = subprocess.call(command, cwd=workDirectory, env=environment, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    wallTime = time.perf_counter() - start
+    # None when the script didn't write its output
+    outputSize = os.path.getsize(outputPath) if os.path.exists(outputPath) else None
+    return wallTime, exitCode, outputSize
+
+
+def getFailures(result):
+    """ Function that lists why a run didn't do the work it was benchmarked for, empty if it did. """
+    failures = []
+    if result['exit'] != 0:
+        failures.append('exit code {}'.format(result['exit']))
+    if result['requests'] <= 0:
+        failures.append('no request reached the server')
+    if result['output'] is None:
+        failures.append('no output file')
+    elif result['output'] == 0:
+        failures.append('empty output file')
+    return failures
+
+
+def parseBenchArgs(argv):
+    scriptArgs = []
+    if '--' in argv:
+        scriptArgs = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    opts, args = getopt.getopt(argv, '', SERVER_OPTIONS)
+    serverArgs = []
+    for option, value in opts:
+        serverArgs += [option, value]
+    rows = int(args[0]) if len(args) > 0 else 50000
+    runs = int(args[1]) if len(args) > 1 else 3
+    return rows, runs, serverArgs, scriptArgs
+
+
+def main(argv):
+    rows, runs, serverArgs, scriptArgs = parseBenchArgs(argv)
+    process, baseURL = startServer(rows, serverArgs)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workDirectory:
+            configPath = os.path.join(workDirectory, 'suredone.yaml')
+            with open(configPath, 'w') as configFile:
+                configFile.write('user: bench\ntoken: bench\nendpoint: {}/v1/\n'.format(baseURL))
+
+            for run in range(runs):
+                before = getServerStats(baseURL)
+                wallTime, exitCode, outputSize = runScript(workDirectory, configPath, scriptArgs, run)
+                after = getServerStats(baseURL)
+                statuses = {status: count - before['statuses'].get(status, 0)
+                            for status, count in after['statuses'].items()
+                            if count != before['statuses'].get(status, 0)}
+                bytesSent = after['bytesSent'] - before['bytesSent']
+                results.append({'wall': wallTime, 'exit': exitCode, 'requests': after['requests'] - before['requests'],
+                                'apiRequests': after['apiRequests'] - before['apiRequests'],
+                                'statuses': statuses, 'bytes': bytesSent, 'output': outputSize})
+                results[-1]['failures'] = getFailures(results[-1])
+                print('run {:<3} exit={} wall={:8.3f} s  requests={:<4} api={:<4} statuses={}  {:8.2f} MB/s{}'.format(
+                    run + 1, exitCode, wallTime, results[-1]['requests'], results[-1]['apiRequests'],
+                    json.dumps(statuses, sort_keys=True), bytesSent / wallTime / (1024 * 1024),
+                    '  FAILED: ' + ', '.join(results[-1]['failures']) if results[-1]['failures'] else ''))
+        # Read before the server process is waited for, so only the script's runs are counted
+        peakMemory = getChildMaxRSS()
+    finally:
+        process.terminate()
+        process.wait()
+
+    walls = [result['wall'] for result in results]
+    totalBytes = sum(result['bytes'] for result in results)
+    print('rows={} runs={} server={} script={}'.format(rows, runs, ' '.join(serverArgs) or '-',
+                                                        ' '.join(scriptArgs) or '-'))
+    print('wall time: mean={:.3f} s  median={:.3f} s  best={:.3f} s'.format(
+        statistics.mean(walls), statistics.median(walls), min(walls)))
+    print('throughput: {:.2f} MB/s'.format(totalBytes / sum(walls) / (1024 * 1024)))
+    print('requests per run: {:.1f}'.format(statistics.mean(result['requests'] for result in results)))
+    print('peak memory (max RSS of the script): {:.1f} MB'.format(peakMemory))
+    if any(result['failures'] for result in results):
+        print('Some runs failed, see the reasons above.')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: peak memory of the export pipeline as the catalog grows
+
+Streams synthetic exports of increasing size through the same outputs a run writes (the user-delimited file,
+suredone_inventory.tsv, the delta file and, when pyarrow is installed, the columnar cache), with a memory limit
+set the way -m/--memory-limit sets it, then reads the result back in chunks with iterExport. Every size runs in
+its own process so that peak RSS is measured separately. The peak should stay flat from the smallest catalog to
+the largest.
+
+Usage:
+    $ python3 bench_memory_ceiling.py [memoryLimitMB] [rows ...]
+"""
+import os
+import sys
+import json
+import shutil
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_SIZES = [10000, 100000, 1000000, 5000000]
+FIELDS = 'guid,stock,price,msrp,cost,title,condition,brand,upc,ebayid,ebayskip,total_stock'
+
+
+def runPipeline(rows, memoryLimit):
+    """ Child process: writes one export of the given size and returns its peak RSS in MB. """
+    import suredone_download
+    from standin_server import iterCatalog
+    suredone_download.LOGGER.verbose = False
+    suredone_download.MEMORY_BUDGET.maxMegabytes = memoryLimit
+
+    directory = tempfile.mkdtemp(prefix='bench_memory_')
+    try:
+        outputPath = os.path.join(directory, 'SureDone_Download.tsv')
+        sinks = [suredone_download.OutputSink(outputPath, delimiter='\t'),
+                 suredone_download.getInventorySink(directory),
+                 suredone_download.getDeltaSink(directory, os.path.join(directory, 'snapshot.sqlite'))]
+        if suredone_download.importOptional('pyarrow.ipc') is not None:
+            sinks.append(suredone_download.ColumnarSink(os.path.join(directory, 'latest_export.arrow')))
+        written = suredone_download.TeeWriter(sinks).writeStream(iterCatalog(rows, FIELDS))
+        readBack = sum(len(chunk) for chunk in suredone_download.iterExport(outputPath, delimiter='\t'))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return {'rows': written, 'readBack': readBack, 'peakMB': peak}
+
+
+def main(argv):
+    memoryLimit = float(argv[0]) if len(argv) > 0 else 64.0
+    sizes = [int(value) for value in argv[1:]] or DEFAULT_SIZES
+    print('Memory limit: {} MB'.format(memoryLimit))
+    peaks = []
+    for rows in sizes:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child', str(rows),
+                                          str(memoryLimit)])
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        peaks.append(result['peakMB'])
+        print('{:>10} rows  written={:>10}  read back={:>10}  peak RSS={:8.1f} MB'.format(
+            rows, result['rows'], result['readBack'], result['peakMB']))
+    print('Peak RSS growth from {} to {} rows: {:.1f} MB'.format(sizes[0], sizes[-1], peaks[-1] - peaks[0]))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        print(json.dumps(runPipeline(int(sys.argv[2]), float(sys.argv[3]))))
+    else:
+        main(sys.argv[1:])
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: DataFrame memory of an export read with inferred dtypes vs. EXPORT_SCHEMA
+
+Writes a synthetic export with every field of the default detailed field list, then reads it twice:
+    - inferred : pd.read_csv with its default dtype inference
+    - schema   : suredone_download.readExport, typed by EXPORT_SCHEMA
+and reports the deep memory usage of both, the columns that shrank the most and the identifiers inference mangled.
+
+Usage:
+    $ python3 bench_schema_memory.py [rows]
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from standin_server import generateCatalog
+from suredone_download import EXPORT_SCHEMA, readExport
+
+
+def main(argv):
+    rows = int(argv[0]) if len(argv) > 0 else 300000
+    fields = ','.join(EXPORT_SCHEMA)
+
+    descriptor, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(descriptor, 'wb') as exportFile:
+            exportFile.write(generateCatalog(rows, fields))
+
+        inferred = pd.read_csv(path)
+        typed = readExport(path)
+
+        inferredUsage = inferred.memory_usage(deep=True)
+        typedUsage = typed.memory_usage(deep=True)
+        print('{} rows, {} columns'.format(rows, len(typed.columns)))
+        print('inferred : {:10.1f} MB'.format(inferredUsage.sum() / 1024.0 ** 2))
+        print('schema   : {:10.1f} MB'.format(typedUsage.sum() / 1024.0 ** 2))
+        print('Reduction: {:.1f}%'.format((1 - typedUsage.sum() / float(inferredUsage.sum())) * 100))
+
+        print('\nLargest savings per column:')
+        savings = (inferredUsage - typedUsage).drop('Index').sort_values(ascending=False)
+        for column, saved in savings.head(10).items():
+            print('    {:<30} {:>8} -> {:<10} {:8.2f} MB'.format(column, str(inferred[column].dtype),
+                                                                  str(typed[column].dtype), saved / 1024.0 ** 2))
+
+        mangled = [column for column in typed.columns
+                   if EXPORT_SCHEMA.get(column) == 'string' and inferred[column].dtype.kind in 'if']
+        print('\nIdentifiers read as numbers by inference: {}'.format(', '.join(mangled) or 'none'))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: segmented (parallel Range) download vs. a single stream
+
+Serves one export from the stand-in server with every connection throttled to the same bandwidth, like a file
+host that limits per-connection throughput, and measures the wall-clock time to save it with 1, 2, 4 and 8
+segments. Every saved file is checked against the export.
+
+Usage:
+    $ python3 bench_segmented_download.py [rows] [bandwidthKBps]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from standin_server import StandInServer
+from suredone_download import SureDone, RawSink, TeeWriter, iterFileChunks
+
+
+def downloadOnce(server, fileName, segments, directory):
+    path = os.path.join(directory, 'export_{}.csv'.format(segments))
+    segmentPath = path + '.segments'
+    start = time.perf_counter()
+    with SureDone('bench', 'bench', 60, poolMaxSize=max(10, segments)) as sureDone:
+        sureDone.api_endpoint = server.apiEndpoint
+        url = sureDone.apicall('get', 'bulk/exports/' + fileName, {})['url']
+        if segments > 1 and sureDone.downloadSegments(url, segmentPath, segments):
+            TeeWriter([RawSink(path)]).writeStream(iterFileChunks(segmentPath))
+            os.remove(segmentPath)
+        else:
+            TeeWriter([RawSink(path)]).writeStream(sureDone.iterDownload(url))
+    elapsed = time.perf_counter() - start
+    with open(path, 'rb') as savedFile:
+        identical = savedFile.read() == server.getExport(fileName)
+    return elapsed, identical
+
+
+def main(argv):
+    rows = int(argv[0]) if len(argv) > 0 else 20000
+    bandwidth = int(argv[1]) * 1024 if len(argv) > 1 else 1024 * 1024
+
+    with StandInServer(rows=rows, bandwidth=bandwidth) as server:
+        fileName = server.startExport('guid,stock,price,msrp,cost,title,longdescription,brand,upc,ebayid')
+        size = len(server.getExport(fileName))
+        print('Export size: {:.2f} MB, per-connection bandwidth: {:.0f} KB/s'.format(size / 1048576.0,
+                                                                                    bandwidth / 1024.0))
+        directory = tempfile.mkdtemp()
+        baseline = None
+        for segments in (1, 2, 4, 8):
+            elapsed, identical = downloadOnce(server, fileName, segments, directory)
+            baseline = baseline or elapsed
+            print('segments={:<2} wall={:7.2f} s  speed-up={:5.2f}x  identical={}'.format(
+                segments, elapsed, baseline / elapsed, identical))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: pooled keep-alive session vs. a new connection per request
+
+Runs the same sequence of readiness polls (bulk/exports/<file>) and export downloads against the local
+stand-in server twice:
+    - baseline : module-level requests.get for every call, the way SureDone.apicall used to work
+    - pooled   : SureDone.apicall and SureDone.openDownloadStream, reusing the session's connection pool
+
+Usage:
+    $ python3 bench_session_pool.py [polls] [downloads] [rows]
+"""
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from standin_server import StandInServer
+from suredone_download import SureDone
+
+
+def runBaseline(server, fileName, polls, downloads):
+    """ Every call opens (and throws away) its own connection. """
+    timings = {'poll': [], 'download': []}
+    headers = {'x-auth-user': 'bench', 'x-auth-token': 'bench'}
+    for _ in range(polls):
+        start = time.perf_counter()
+        requests.get(server.apiEndpoint + 'bulk/exports/' + fileName, params={}, headers=headers, timeout=15).json()
+        timings['poll'].append(time.perf_counter() - start)
+    for _ in range(downloads):
+        start = time.perf_counter()
+        url = requests.get(server.apiEndpoint + 'bulk/exports/' + fileName, headers=headers, timeout=15).json()['url']
+        stream = requests.get(url, stream=True)
+        for chunk in stream.iter_content(chunk_size=1024):
+            pass
+        timings['download'].append(time.perf_counter() - start)
+    return timings
+
+
+def runPooled(server, fileName, polls, downloads):
+    """ Every call goes through the same SureDone object and its pooled session. """
+    timings = {'poll': [], 'download': []}
+    with SureDone('bench', 'bench', 15) as sureDone:
+        sureDone.api_endpoint = server.apiEndpoint
+        for _ in range(polls):
+            start = time.perf_counter()
+            sureDone.apicall('get', 'bulk/exports/' + fileName, {})
+            timings['poll'].append(time.perf_counter() - start)
+        for _ in range(downloads):
+            start = time.perf_counter()
+            url = sureDone.apicall('get', 'bulk/exports/' + fileName, {})['url']
+            stream = sureDone.openDownloadStream(url)
+            for chunk in stream.iter_content(chunk_size=1024):
+                pass
+            stream.close()
+            timings['download'].append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings, connections):
+    for kind in ('poll', 'download'):
+        values = timings[kind]
+        print('{:<9} {:<9} calls={:<5} mean={:8.3f} ms  median={:8.3f} ms'.format(
+            name, kind, len(values), statistics.mean(values) * 1000, statistics.median(values) * 1000))
+    print('{:<9} connections opened: {}'.format(name, connections))
+
+
+def main(argv):
+    polls = int(argv[0]) if len(argv) > 0 else 200
+    downloads = int(argv[1]) if len(argv) > 1 else 50
+    rows = int(argv[2]) if len(argv) > 2 else 2000
+
+    with StandInServer(rows=rows) as server:
+        fileName = server.startExport('guid,stock,price,msrp,cost,title,ebayid')
+
+        server.resetStats()
+        baseline = runBaseline(server, fileName, polls, downloads)
+        report('baseline', baseline, server.connections)
+
+        server.resetStats()
+        pooled = runPooled(server, fileName, polls, downloads)
+        report('pooled', pooled, server.connections)
+
+    for kind in ('poll', 'download'):
+        gain = 1 - statistics.mean(pooled[kind]) / statistics.mean(baseline[kind])
+        print('Per-call latency drop ({}): {:.1f}%'.format(kind, gain * 100))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Startup benchmark: how long the scripts take to get to an answer when they stop at the arguments
+
+Cron runs the scripts often, and runs that stop early (--help, unknown or invalid options) should not pay for
+importing pandas, requests and yaml or leave a log file behind. Every case is run as a subprocess under
+python -X importtime, in a temporary $HOME, and reports:
+    - wall time of the process
+    - import time: the cumulative time of every module imported at the top level, from -X importtime
+    - heavy modules imported (pandas, requests, yaml, ...) and the slowest imports
+    - whether a log file was created
+
+Given a git revision (-c), the same cases are run on the scripts as they were at that revision, to show the gain.
+
+Usage:
+    $ python3 bench_startup.py [options]
+Options:
+    -r | --runs     : Runs per case, the median is reported (default: 5)
+    -c | --compare  : Git revision to compare against (e.g. HEAD~1)
+    -t | --top      : Slowest imports listed per case (default: 5)
+"""
+import os
+import sys
+import time
+import getopt
+import shutil
+import tempfile
+import subprocess
+import statistics
+import importlib.util
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# Script and arguments of every case. '-h' rather than '--help', which older revisions didn't handle.
+CASES = [
+    ('suredone_download.py', 'help', ['-h']),
+    ('suredone_download.py', 'invalid option', ['--no-such-option']),
+    ('suredone_download.py', 'invalid value', ['--log-level', 'loud']),
+    ('gsp_inventory.py', 'help', ['-h']),
+    ('gsp_inventory.py', 'invalid option', ['--no-such-option']),
+]
+
+# Modules a run stopping at the arguments has no use for. -X importtime also lists failed imports, so only the
+# modules installed here are looked for.
+HEAVY_MODULES = [name for name in ['pandas', 'numpy', 'requests', 'urllib3', 'yaml', 'aiohttp', 'pyarrow', 'asyncio']
+                 if importlib.util.find_spec(name) is not None]
+
+
+def parseImportTimes(output):
+    """
+    Function that reads the report of python -X importtime.
+    Parameters
+    ----------
+        - output : str
+            What the process wrote to stderr
+    Returns
+    -------
+        - imports : list
+            (module, cumulative microseconds) of every module imported at the top level, the modules they import
+            being counted in their time
+        - modules : set
+            Every module imported
+    """
+    imports = []
+    modules = set()
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        # Nested imports are indented under the module importing them
+        if not name[1:].startswith(' '):
+            imports.append((name.strip(), int(cumulative)))
+    return imports, modules
+
+
+def runCase(scriptDirectory, script, args):
+    """
+    Function that runs a script once under -X importtime in a temporary $HOME.
+    Returns
+    -------
+        - result : dict
+            wall (seconds), importTime (seconds), imports, modules and logCreated
+    """
+    home = tempfile.mkdtemp(prefix='bench_startup_')
+    try:
+        # The scripts log to $HOME/log and read their defaults from $HOME
+        environment = dict(os.environ, HOME=home)
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(scriptDirectory, script)] + args,
+                                 cwd=home, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        wall = time.perf_counter() - start
+        imports, modules = parseImportTimes(process.stderr.decode('utf-8', 'replace'))
+        logDirectory = os.path.join(home, 'log')
+        logCreated = os.path.isdir(logDirectory) and bool(os.listdir(logDirectory))
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+    return {'wall': wall, 'importTime': sum(cumulative for _, cumulative in imports) / 1e6, 'imports': imports,
+            'modules': modules, 'logCreated': logCreated}
+
+
+def measureCases(scriptDirectory, runs):
+    """ Function that runs every case, runs times, and keeps the median times. """
+    results = []
+    for script, case, args in CASES:
+        samples = [runCase(scriptDirectory, script, args) for _ in range(runs)]
+        last = samples[-1]
+        results.append({'script': script, 'case': case,
+                        'wall': statistics.median(sample['wall'] for sample in samples),
+                        'importTime': statistics.median(sample['importTime'] for sample in samples),
+                        'heavy': [name for name in HEAVY_MODULES if name in last['modules']],
+                        'slowest': sorted(last['imports'], key=lambda entry: -entry[1]),
+                        'logCreated': last['logCreated']})
+    return results
+
+
+def exportRevision(revision):
+    """ Function that extracts the scripts as they were at a git revision into a temporary directory. """
+    directory = tempfile.mkdtemp(prefix='bench_startup_rev_')
+    archive = subprocess.check_output(['git', 'archive', revision], cwd=ROOT)
+    subprocess.run(['tar', '-x', '-C', directory], input=archive, check=True)
+    return directory
+
+
+def printResults(title, results, top):
+    print('\n{}'.format(title))
+    print('{:<22} {:<15} {:>9} {:>10}  {:<5}  {}'.format('script', 'case', 'wall ms', 'import ms', 'log', 'heavy'))
+    for result in results:
+        print('{:<22} {:<15} {:9.1f} {:10.1f}  {:<5}  {}'.format(
+            result['script'], result['case'], result['wall'] * 1000, result['importTime'] * 1000,
+            'yes' if result['logCreated'] else 'no', ','.join(result['heavy']) or '-'))
+        print('{:<38} slowest: {}'.format('', ', '.join('{} {:.1f} ms'.format(name, cumulative / 1000)
+                                                         for name, cumulative in result['slowest'][:top])))
+
+
+def parseBenchArgs(argv):
+    runs = 5
+    revision = None
+    top = 5
+    opts, args = getopt.getopt(argv, 'r:c:t:', ['runs=', 'compare=', 'top='])
+    for option, value in opts:
+        if option in ('-r', '--runs'):
+            runs = max(1, int(value))
+        elif option in ('-c', '--compare'):
+            revision = value
+        elif option in ('-t', '--top'):
+            top = max(0, int(value))
+    return runs, revision, top
+
+
+def main(argv):
+    runs, revision, top = parseBenchArgs(argv)
+    current = measureCases(ROOT, runs)
+    printResults('Working tree (median of {} runs):'.format(runs), current, top)
+    if revision is None:
+        return 0
+
+    directory = exportRevision(revision)
+    try:
+        previous = measureCases(directory, runs)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    printResults('{} (median of {} runs):'.format(revision, runs), previous, top)
+
+    print('\nGain over {}:'.format(revision))
+    for old, new in zip(previous, current):
+        print('    {:<22} {:<15} wall {:8.1f} ms -> {:8.1f} ms ({:+6.1f}%)   import {:8.1f} ms -> {:8.1f} ms'.format(
+            new['script'], new['case'], old['wall'] * 1000, new['wall'] * 1000,
+            (new['wall'] / old['wall'] - 1) * 100 if old['wall'] else 0.0,
+            old['importTime'] * 1000, new['importTime'] * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Check: resumable export downloads
+
+Downloads an export from a stand-in server that drops the connection several times mid-stream, then verifies
+that the saved file is byte-for-byte identical to the export and that no .part file was left behind.
+
+Usage:
+    $ python3 check_resume.py [rows] [cutAfterBytes] [cutCount]
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from standin_server import StandInServer
+from suredone_download import SureDone, RawSink, TeeWriter, RetryPolicy
+
+
+def main(argv):
+    rows = int(argv[0]) if len(argv) > 0 else 20000
+    cutAfterBytes = int(argv[1]) if len(argv) > 1 else 100000
+    cutCount = int(argv[2]) if len(argv) > 2 else 5
+
+    with StandInServer(rows=rows, cutAfterBytes=cutAfterBytes, cutCount=cutCount) as server:
+        fileName = server.startExport('guid,stock,price,title,longdescription')
+        expected = server.getExport(fileName)
+
+        policies = {'get': RetryPolicy(), 'write': RetryPolicy(),
+                    'download': RetryPolicy(maxAttempts=cutCount + 1, baseDelay=0.05, maxDelay=0.1)}
+        with SureDone('check', 'check', 15, retryPolicies=policies) as sureDone:
+            sureDone.api_endpoint = server.apiEndpoint
+            url = sureDone.apicall('get', 'bulk/exports/' + fileName, {})['url']
+            directory = tempfile.mkdtemp()
+            path = os.path.join(directory, 'export.csv')
+            rowCount = TeeWriter([RawSink(path)]).writeStream(sureDone.iterDownload(url))
+
+        with open(path, 'rb') as savedFile:
+            saved = savedFile.read()
+        print('Bytes expected: {}, saved: {}'.format(len(expected), len(saved)))
+        print('Rows written: {}'.format(rowCount))
+        print('Resumes: {}'.format(len(policies['download'].history)))
+        print('Identical: {}'.format(saved == expected))
+        leftBehind = [name for name in os.listdir(directory) if name.endswith('.part')]
+        print('.part left behind: {}'.format(bool(leftBehind)))
+        if saved != expected or leftBehind:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
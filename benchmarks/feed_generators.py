@@ -0,0 +1,246 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic feed generators for the three converters
+
+Writes files shaped like the ones the scripts receive, at any size, from a seeded random generator so that
+repeated runs produce identical files:
+    - Walker CSV     : part description, part number, part MO inventory, part GG inventory (walker.py)
+    - GSP workbook   : Site, ItemNumber, QuantityOnHand in the first sheet of an .xlsx (gsp_inventory.py)
+    - SureDone export: the bulk export CSV, from the stand-in server's catalog generator (suredone_download.py)
+
+The workbook is written directly as Office Open XML with the standard library, streaming the sheet, so that
+million-row workbooks can be generated without holding them in memory.
+
+Usage:
+    $ python3 feed_generators.py [walker|gsp|suredone] [rows] [path]
+"""
+import os
+import sys
+import csv
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+from standin_server import DEFAULT_FIELDS, iterCatalog
+
+WALKER_COLUMNS = ['part description', 'part number', 'part MO inventory', 'part GG inventory']
+GSP_COLUMNS = ['Site', 'ItemNumber', 'QuantityOnHand']
+
+# Words the part descriptions are made of. Walker descriptions often contain commas, which walker.py strips.
+DESCRIPTION_WORDS = ['Exhaust', 'Muffler', 'Catalytic Converter', 'Pipe', 'Clamp', 'Gasket', 'Hanger', 'Flange',
+                     'Resonator', 'Tail Pipe', 'Bracket', 'Direct Fit', 'Universal', 'Front', 'Rear', 'Left', 'Right',
+                     'Stainless', 'Aluminized', '2.25 in.', '2.5 in.', '3 in.', 'Kit', 'Assembly']
+GSP_SITES = ['MO', 'GG', 'TX', 'CA', 'NJ', 'GA']
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>')
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>')
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>')
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>')
+XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+    '<cellXfs count="1"><xf xfId="0"/></cellXfs>'
+    '</styleSheet>')
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+
+def generateWalkerRow(index, generator):
+    """
+    Function that returns one row of a Walker feed.
+    Parameters
+    ----------
+        - index : int
+            Position of the row, used to keep part numbers unique
+        - generator : random.Random
+            Seeded random generator
+    Returns
+    -------
+        - row : list
+            Values in the order of WALKER_COLUMNS
+    """
+    words = generator.sample(DESCRIPTION_WORDS, generator.randint(2, 6))
+    # Roughly a third of the descriptions carry commas
+    description = ', '.join(words) if generator.random() < 0.35 else ' '.join(words)
+    partNumber = '{:05d}'.format(index) if generator.random() < 0.2 else '{}-{:06d}'.format(
+        generator.choice(['WAL', '15', '16', '17', '53']), index)
+    # Inventories are counts, with the occasional blank for parts a warehouse doesn't carry
+    moInventory = '' if generator.random() < 0.05 else str(generator.randint(0, 250))
+    ggInventory = '' if generator.random() < 0.05 else str(generator.randint(0, 250))
+    return [description, partNumber, moInventory, ggInventory]
+
+
+def writeWalkerCSV(path, rows, seed=1):
+    """
+    Function that writes a synthetic walker.csv.
+    Parameters
+    ----------
+        - path : str
+            Path of the file to write
+        - rows : int
+            Number of data rows
+        - seed : int
+            Seed of the random generator
+    """
+    generator = random.Random(seed)
+    with open(path, 'w', encoding='utf-8', newline='') as walkerFile:
+        writer = csv.writer(walkerFile, lineterminator='\r\n')
+        writer.writerow(WALKER_COLUMNS)
+        for index in range(rows):
+            writer.writerow(generateWalkerRow(index, generator))
+
+
+def generateGSPRow(index, generator):
+    """
+    Function that returns one row of a GSP inventory feed. None stands for an empty cell.
+    Parameters
+    ----------
+        - index : int
+            Position of the row
+        - generator : random.Random
+            Seeded random generator
+    Returns
+    -------
+        - row : list
+            Values in the order of GSP_COLUMNS
+    """
+    site = None if generator.random() < 0.01 else generator.choice(GSP_SITES)
+    itemNumber = None if generator.random() < 0.01 else generator.choice(['NCV', 'NKC', 'NHC', 'FDG']) + str(
+        10000 + index)
+    quantity = None if generator.random() < 0.03 else generator.randint(0, 500)
+    return [site, itemNumber, quantity]
+
+
+def getCellReference(column, row):
+    """ Function that returns the A1-style reference of a cell, for the first 26 columns. """
+    return '{}{}'.format(chr(ord('A') + column), row)
+
+
+def formatXLSXRow(values, rowNumber):
+    """
+    Function that renders one worksheet row. Strings are written inline, so no shared string table is needed.
+    Parameters
+    ----------
+        - values : list
+            Cell values (str, int, float or None for an empty cell)
+        - rowNumber : int
+            1-based row number
+    Returns
+    -------
+        - xml : str
+    """
+    cells = []
+    for column, value in enumerate(values):
+        if value is None:
+            continue
+        reference = getCellReference(column, rowNumber)
+        if isinstance(value, str):
+            cells.append('<c r="{}" t="inlineStr"><is><t>{}</t></is></c>'.format(reference, escape(value)))
+        else:
+            cells.append('<c r="{}"><v>{}</v></c>'.format(reference, value))
+    return '<row r="{}">{}</row>'.format(rowNumber, ''.join(cells))
+
+
+def writeGSPWorkbook(path, rows, seed=1, rowsPerWrite=1000):
+    """
+    Function that writes a synthetic GSPInventoryFeed.xlsx.
+    Parameters
+    ----------
+        - path : str
+            Path of the workbook to write
+        - rows : int
+            Number of data rows (at most 1,048,575, the sheet limit of Excel)
+        - seed : int
+            Seed of the random generator
+        - rowsPerWrite : int
+            Rows rendered per write to the compressed sheet
+    """
+    generator = random.Random(seed)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        workbook.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        workbook.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        workbook.writestr('xl/workbook.xml', XLSX_WORKBOOK)
+        workbook.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        workbook.writestr('xl/styles.xml', XLSX_STYLES)
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(XLSX_SHEET_START.encode('utf-8'))
+            pending = [formatXLSXRow(GSP_COLUMNS, 1)]
+            for index in range(rows):
+                pending.append(formatXLSXRow(generateGSPRow(index, generator), index + 2))
+                if len(pending) >= rowsPerWrite:
+                    sheet.write(''.join(pending).encode('utf-8'))
+                    pending = []
+            pending.append(XLSX_SHEET_END)
+            sheet.write(''.join(pending).encode('utf-8'))
+
+
+def writeSureDoneExport(path, rows, fields=DEFAULT_FIELDS, seed=1):
+    """
+    Function that writes a synthetic SureDone bulk export, the file downloadExportedFile receives.
+    Parameters
+    ----------
+        - path : str
+            Path of the file to write
+        - rows : int
+            Number of product rows
+        - fields : str
+            Comma-separated field names
+        - seed : int
+            Seed of the random generator
+    """
+    with open(path, 'wb') as exportFile:
+        for chunk in iterCatalog(rows, fields, seed):
+            exportFile.write(chunk)
+
+
+# Generator and file name of every feed
+FEEDS = {
+    'walker': (writeWalkerCSV, 'walker.csv'),
+    'gsp': (writeGSPWorkbook, 'GSPInventoryFeed.xlsx'),
+    'suredone': (writeSureDoneExport, 'suredone_export.csv'),
+}
+
+
+if __name__ == '__main__':
+    feed = sys.argv[1] if len(sys.argv) > 1 else 'walker'
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    writer, fileName = FEEDS[feed]
+    path = sys.argv[3] if len(sys.argv) > 3 else os.path.join(os.getcwd(), fileName)
+    writer(path, rows)
+    print('Wrote {} rows to {} ({:.1f} MB)'.format(rows, path, os.path.getsize(path) / 1024.0 ** 2))
@@ -0,0 +1,470 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+SureDone Stand-in Server
+
+A local, dependency-free stand-in for the parts of the SureDone API used by suredone_download.py.
+Used by the benchmarks in this directory so that nothing has to talk to api.suredone.com.
+
+Endpoints served:
+    - GET /v1/bulk/exports?...          : Starts an export and returns its file name
+    - GET /v1/bulk/exports/<fileName>   : Returns the download URL of an export once it has been generated
+    - GET /files/<fileName>             : Serves the synthetic export CSV (supports Range requests)
+    - GET /stats                        : Request, connection, status and byte counters as JSON
+
+Simulation and fault injection:
+    - latency : Seconds added before every api response
+    - exportDelay : Seconds an export takes to generate. Until then it answers 'failure' with its progress.
+    - rateLimit / rateWindow : Api requests allowed per window. Responses carry the X-Rate-Limit-* headers
+      SureDone sends, requests over the limit get a 429.
+    - forbiddenEvery : Every n-th api request gets a 403 without a JSON body (retried by the client)
+    - cutAfterBytes / cutCount : Drop the connection after sending cutAfterBytes bytes of a file, cutCount times
+    - bandwidth : Throttle every file response to this many bytes per second, per connection
+
+Usage:
+    $ python3 standin_server.py [options] [port] [rows]
+Options:
+    --latency <seconds>  --export-delay <seconds>  --rate-limit <requests>  --rate-window <seconds>
+    --forbidden-every <n>  --bandwidth <bytes per second>
+"""
+import sys
+import csv
+import io
+import json
+import getopt
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_FIELDS = 'guid,stock,price,msrp,cost,title,condition,brand,upc,ebayid'
+
+
+def generateCatalog(rows, fields=DEFAULT_FIELDS, seed=1):
+    """
+    Function that generates a synthetic SureDone export as CSV bytes.
+    Parameters
+    ----------
+        - rows : int
+            Number of product rows to generate
+        - fields : str
+            Comma-separated field names, the same format as the bulk/exports 'fields' parameter
+        - seed : int
+            Seed of the random generator so that repeated runs serve identical files
+    Returns
+    -------
+        - content : bytes
+            UTF-8 encoded CSV, header included
+    """
+    return b''.join(iterCatalog(rows, fields, seed))
+
+
+def iterCatalog(rows, fields=DEFAULT_FIELDS, seed=1, rowsPerChunk=1000):
+    """
+    Generator version of generateCatalog, for exports too large to hold in memory.
+    Parameters
+    ----------
+        - rows : int
+            Number of product rows to generate
+        - fields : str
+            Comma-separated field names
+        - seed : int
+            Seed of the random generator
+        - rowsPerChunk : int
+            Rows encoded per yielded chunk
+    Yields
+    ------
+        - chunk : bytes
+            UTF-8 encoded CSV, the header in the first chunk
+    """
+    generator = random.Random(seed)
+    fieldList = [field.strip() for field in fields.split(',') if field.strip()]
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(fieldList)
+    for index in range(rows):
+        writer.writerow([generateValue(field, index, generator) for field in fieldList])
+        if (index + 1) % rowsPerChunk == 0:
+            yield output.getvalue().encode('utf-8')
+            output.seek(0)
+            output.truncate()
+    if output.tell():
+        yield output.getvalue().encode('utf-8')
+
+
+def generateValue(field, index, generator):
+    """
+    Function that returns a plausible value for a single SureDone field.
+    Parameters
+    ----------
+        - field : str
+            Name of the field
+        - index : int
+            Row number, used to build unique identifiers
+        - generator : random.Random
+            Random generator to draw values from
+    Returns
+    -------
+        - value : str
+    """
+    if field == 'guid' or field.endswith('sku'):
+        return 'SKU{:08d}'.format(index)
+    if field in ('stock', 'total_stock', 'totalsold'):
+        return str(generator.randint(0, 500))
+    if 'price' in field or field in ('msrp', 'cost', 'weight'):
+        return '{:.2f}'.format(generator.uniform(1, 1000))
+    if field == 'condition':
+        return generator.choice(['New', 'Used', 'Remanufactured'])
+    if field == 'brand':
+        return generator.choice(['Acme', 'Bosch', 'Denso', 'Walker', 'GSP'])
+    if field in ('ebaycatid', 'ebaystoreid', 'ebaysiteid') or field.endswith('profileid'):
+        # Shared by many listings, only a handful of distinct values
+        return str(generator.choice([0, 100, 6000, 33637, 177773]))
+    if field in ('upc', 'ebayid', 'amznasin') or field.endswith('id'):
+        return str(generator.randint(10 ** 11, 10 ** 12 - 1))
+    if field.endswith(('skip', 'enabled', 'buyitnow', 'upcnot', 'inprogress')) or field.startswith('walmartis'):
+        return generator.choice(['0', '1'])
+    if field in ('warranty', 'walmartcategory', 'walmartstatus'):
+        return generator.choice(['None', '30 Days', '1 Year', 'Lifetime', 'PUBLISHED', 'Automotive'])
+    if field.startswith('date') or field.endswith('time'):
+        return '2020-{:02d}-{:02d} 12:00:00'.format(generator.randint(1, 12), generator.randint(1, 28))
+    if 'description' in field or field in ('title', 'ebaytitle', 'ebaysubtitle'):
+        # Descriptions contain delimiters, quotes and new lines just like real exports do
+        return 'Part {}, fits "most" models\nSee listing'.format(index)
+    return 'value{}'.format(generator.randint(0, 9999))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """ Request handler that answers like the SureDone bulk/exports endpoints. """
+
+    # Keep connections open between requests, same as the real API
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super(StandInHandler, self).setup()
+        self.server.recordConnection()
+
+    def log_message(self, format, *args):
+        # Silence the default per-request logging to stderr
+        pass
+
+    def do_GET(self):
+        self.server.recordRequest()
+        parsed = urlparse(self.path)
+        path = parsed.path
+        if path.startswith('/v1/'):
+            self.handleAPI(parsed)
+        elif path == '/stats':
+            self.sendJSON(self.server.getStats())
+        elif path.startswith('/files/'):
+            content = self.server.getExport(path[len('/files/'):])
+            if content is None:
+                self.sendJSON({'result': 'failure'}, status=404)
+                return
+            self.sendContent(content, self.headers.get('Range'))
+        else:
+            self.sendJSON({'result': 'failure', 'message': 'Unknown endpoint.'}, status=404)
+
+    def handleAPI(self, parsed):
+        """ Function that answers the bulk/exports endpoints, with the configured latency and injected errors. """
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        verdict, rateHeaders = self.server.admitAPIRequest()
+        if verdict == 429:
+            self.sendJSON({'result': 'failure', 'message': 'Too many requests.'}, status=429, headers=rateHeaders)
+            return
+        if verdict == 403:
+            self.sendBody(b'<html><body>403 Forbidden</body></html>', 'text/html', status=403, headers=rateHeaders)
+            return
+
+        path = parsed.path
+        if path == '/v1/bulk/exports':
+            query = parse_qs(parsed.query)
+            fileName = self.server.startExport(query.get('fields', [DEFAULT_FIELDS])[0])
+            self.sendJSON({'result': 'success', 'export_file': fileName}, headers=rateHeaders)
+        elif path.startswith('/v1/bulk/exports/'):
+            fileName = path[len('/v1/bulk/exports/'):]
+            if not self.server.hasExport(fileName):
+                self.sendJSON({'result': 'failure', 'message': 'Export not found.'}, status=404, headers=rateHeaders)
+                return
+            progress = self.server.getExportProgress(fileName)
+            if progress < 100:
+                self.sendJSON({'result': 'failure', 'message': 'Export is being generated.', 'progress': progress},
+                              headers=rateHeaders)
+                return
+            self.sendJSON({'result': 'success', 'url': self.server.baseURL + '/files/' + fileName},
+                          headers=rateHeaders)
+        else:
+            self.sendJSON({'result': 'failure', 'message': 'Unknown endpoint.'}, status=404, headers=rateHeaders)
+
+    def sendJSON(self, payload, status=200, headers=None):
+        self.sendBody(json.dumps(payload).encode('utf-8'), 'application/json', status=status, headers=headers)
+
+    def sendBody(self, body, contentType, status=200, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.recordResponse(status, len(body))
+
+    def sendContent(self, content, rangeHeader=None):
+        start, end = 0, len(content) - 1
+        byteRange = parseRange(rangeHeader, len(content))
+        if byteRange is not None:
+            start, end = byteRange
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, len(content)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+
+        body = content[start:end + 1]
+        self.server.recordResponse(206 if byteRange is not None else 200, 0)
+        cutAt = self.server.takeCut()
+        if cutAt is not None and cutAt < len(body):
+            # Send part of the body then drop the connection, like a flaky network would
+            self.writeBody(body[:cutAt])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.writeBody(body)
+
+    def writeBody(self, body):
+        bandwidth = self.server.bandwidth
+        if not bandwidth:
+            self.wfile.write(body)
+            self.server.recordBytes(len(body))
+            return
+        # Send in small blocks, sleeping so that this connection never goes faster than the bandwidth
+        blockSize = 16 * 1024
+        for start in range(0, len(body), blockSize):
+            block = body[start:start + blockSize]
+            self.wfile.write(block)
+            self.server.recordBytes(len(block))
+            time.sleep(len(block) / float(bandwidth))
+
+
+def parseRange(rangeHeader, size):
+    """
+    Function that parses a single 'bytes=<start>-[<end>]' Range header.
+    Returns
+    -------
+        - range : tuple
+            (start, end) inclusive, or None if the header is missing or not satisfiable
+    """
+    if not rangeHeader or not rangeHeader.startswith('bytes='):
+        return None
+    startText, _, endText = rangeHeader[len('bytes='):].partition('-')
+    if not startText.isdigit():
+        return None
+    start = int(startText)
+    end = int(endText) if endText.isdigit() else size - 1
+    if start >= size:
+        return None
+    return start, min(end, size - 1)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """ Threaded HTTP server holding the stand-in's exports and request statistics. """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, rows=1000, cutAfterBytes=None, cutCount=0, bandwidth=None, latency=0.0,
+                 exportDelay=0.0, rateLimit=None, rateWindow=60.0, forbiddenEvery=0):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - port : int
+                Port to listen on. 0 picks a free port.
+            - rows : int
+                Number of rows in every generated export
+            - cutAfterBytes : int
+                Bytes of a file response sent before the connection is dropped
+            - cutCount : int
+                Number of file responses to cut
+            - bandwidth : int
+                Bytes per second allowed on each connection serving a file. None doesn't throttle.
+            - latency : float
+                Seconds added before every api response
+            - exportDelay : float
+                Seconds an export takes to become ready
+            - rateLimit : int
+                Api requests allowed per rateWindow. None doesn't limit.
+            - rateWindow : float
+                Length of the rate limit window in seconds
+            - forbiddenEvery : int
+                Answer every n-th api request with a 403. 0 never does.
+        """
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', port), StandInHandler)
+        self.rows = rows
+        self.cutAfterBytes = cutAfterBytes
+        self.cutCount = cutCount
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.exportDelay = exportDelay
+        self.rateLimit = rateLimit
+        self.rateWindow = rateWindow
+        self.forbiddenEvery = forbiddenEvery
+        self.exports = {}
+        self.exportStarts = {}
+        self.windowStart = time.monotonic()
+        self.windowCount = 0
+        self.connections = 0
+        self.requests = 0
+        self.apiRequests = 0
+        self.statuses = {}
+        self.bytesSent = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def baseURL(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+    @property
+    def apiEndpoint(self):
+        return self.baseURL + '/v1/'
+
+    def recordConnection(self):
+        with self.lock:
+            self.connections += 1
+
+    def recordRequest(self):
+        with self.lock:
+            self.requests += 1
+
+    def takeCut(self):
+        """ Function that returns where to cut the next file response, None when no cut is left. """
+        with self.lock:
+            if self.cutAfterBytes is None or self.cutCount <= 0:
+                return None
+            self.cutCount -= 1
+            return self.cutAfterBytes
+
+    def recordResponse(self, status, size):
+        with self.lock:
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+            self.bytesSent += size
+
+    def recordBytes(self, size):
+        with self.lock:
+            self.bytesSent += size
+
+    def admitAPIRequest(self):
+        """
+        Function that applies the rate limit and the 403 injection to an api request.
+        Returns
+        -------
+            - verdict : int
+                429 or 403 to reject the request, None to serve it
+            - headers : dict
+                X-Rate-Limit-* headers to send with the response
+        """
+        with self.lock:
+            self.apiRequests += 1
+            headers = {}
+            if self.rateLimit is not None:
+                now = time.monotonic()
+                if now - self.windowStart >= self.rateWindow:
+                    self.windowStart = now
+                    self.windowCount = 0
+                self.windowCount += 1
+                resetMs = int((self.windowStart + self.rateWindow - now) * 1000)
+                headers = {'X-Rate-Limit-Limit': str(self.rateLimit),
+                           'X-Rate-Limit-Remaining': str(max(self.rateLimit - self.windowCount, 0)),
+                           'X-Rate-Limit-Time-Reset-Ms': str(resetMs)}
+                if self.windowCount > self.rateLimit:
+                    return 429, headers
+            if self.forbiddenEvery and self.apiRequests % self.forbiddenEvery == 0:
+                return 403, headers
+            return None, headers
+
+    def getStats(self):
+        with self.lock:
+            return {'connections': self.connections, 'requests': self.requests, 'apiRequests': self.apiRequests,
+                    'statuses': dict(self.statuses), 'bytesSent': self.bytesSent, 'exports': len(self.exports)}
+
+    def resetStats(self):
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            self.apiRequests = 0
+            self.statuses = {}
+            self.bytesSent = 0
+
+    def startExport(self, fields):
+        with self.lock:
+            fileName = 'export_{}.csv'.format(len(self.exports) + 1)
+            self.exports[fileName] = generateCatalog(self.rows, fields)
+            self.exportStarts[fileName] = time.monotonic()
+        return fileName
+
+    def getExportProgress(self, fileName):
+        """ Function that returns how far (in percent) an export is from being generated. """
+        if not self.exportDelay:
+            return 100
+        elapsed = time.monotonic() - self.exportStarts[fileName]
+        return min(100, int(elapsed * 100 / self.exportDelay))
+
+    def hasExport(self, fileName):
+        return fileName in self.exports
+
+    def getExport(self, fileName):
+        return self.exports.get(fileName)
+
+    def start(self):
+        """ Function that starts serving in a background thread. """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """ Function that stops serving and closes the listening socket. """
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exctype, value, traceBack):
+        self.stop()
+
+
+def parseServerArgs(argv):
+    """ Function that reads the command line of the stand-in server into StandInServer's arguments. """
+    options = {}
+    long_options = ['latency=', 'export-delay=', 'rate-limit=', 'rate-window=', 'forbidden-every=', 'bandwidth=']
+    opts, args = getopt.getopt(argv, '', long_options)
+    for option, value in opts:
+        if option == '--latency':
+            options['latency'] = float(value)
+        elif option == '--export-delay':
+            options['exportDelay'] = float(value)
+        elif option == '--rate-limit':
+            options['rateLimit'] = int(value)
+        elif option == '--rate-window':
+            options['rateWindow'] = float(value)
+        elif option == '--forbidden-every':
+            options['forbiddenEvery'] = int(value)
+        elif option == '--bandwidth':
+            options['bandwidth'] = int(value)
+    options['port'] = int(args[0]) if len(args) > 0 else 8080
+    options['rows'] = int(args[1]) if len(args) > 1 else 1000
+    return options
+
+
+if __name__ == '__main__':
+    server = StandInServer(**parseServerArgs(sys.argv[1:]))
+    print('Serving SureDone stand-in at {}'.format(server.apiEndpoint))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -33,6 +33,13 @@ Parameters/Options:
         |                           - All others for .txt
     -p  | --preserve        : Do not delete original file if declared
     -v  | --verbose         : Show outputs in terminal as well as log file
+    -l  | --log-level       : Least severe entries written to the log: normal, warning, error or code-breaker
+        |                       - Default: normal (every entry)
+        | --profile         : Time every stage and record its peak memory and bytes in and out
+        |                       - The JSON report is written next to the log file, as <log name>_profile.json
+        | --cprofile        : Same as --profile, and also dump cProfile stats to <log name>_profile.pstats
+        | --metrics         : Path of a .prom file the run's metrics are written to at exit, for node_exporter's
+        |                     textfile collector (rows, bytes, stage durations, log messages)
 
 Example:
     $ python3 suredone_download.py
@@ -49,15 +56,17 @@ Example:
 # Need python version 3.4 or higher for pathlib
 from pathlib import Path
 import sys
-import inspect
 import time
 import csv
 import os
-import pandas as pd
 from datetime import datetime
 import traceback
 import getopt
 import shutil
+from profiling import RunProfiler, getReportPaths
+from metrics import MetricsEmitter, declareRunMetrics
+from logwriter import BatchedLogWriter, SEVERITY_LEVELS
+# pandas takes longer to import than a run of --help takes in total, readInventory imports it when it is needed
 
 currentMilliTime = lambda: int(round(time.time() * 1000))
 
@@ -66,7 +75,7 @@ RUN_TIME = currentMilliTime()
 START_TIME = datetime.now()
 
 # Record python version and platform for checking when the script kicks in
-PYTHON_VERSION = float(sys.version[:sys.version.index(' ') - 2])
+PYTHON_VERSION = sys.version_info[:2]
 if sys.platform == 'win32' or sys.platform == 'win64':  # Windows
     PLATFORM = 'windows'
 elif sys.platform == 'linux' or sys.platform == 'linux2':  # Linux
@@ -94,27 +103,69 @@ def main(argv):
     :param argv: arguments coming from the commandline
     :return:
     """
-    localFrame = inspect.currentframe()
-
     # Verify python version and platform type
     checkPlatformAndPythonVersion()
-    LOGGER.writeLog("Platform type and python version verified.", localFrame.f_lineno)
 
     # Parse arguments
     inputFilePath, outputFilePath, delimiter, preserveOldFiles, verbose = parseArgs(argv)
-    LOGGER.writeLog("Args parsed...", localFrame.f_lineno)
-    LOGGER.writeLog("Input file path: {}".format(inputFilePath), localFrame.f_lineno)
-    LOGGER.writeLog("Output file path: {}".format(outputFilePath), localFrame.f_lineno)
-    LOGGER.writeLog("Using delimiter: {}".format("[TAB SPACE]" if delimiter == '\t' else delimiter),
-                    localFrame.f_lineno)
-    LOGGER.writeLog("Preserve input file: {}".format("NO" if not preserveOldFiles else "YES"), localFrame.f_lineno)
-    LOGGER.writeLog("Verbose: {}".format("OFF" if not verbose else "ON"), localFrame.f_lineno)
-    LOGGER.writeLog("===============================================", localFrame.f_lineno)
+    LOGGER.writeLog("Platform type and python version verified.")
+    LOGGER.writeLog("Args parsed...")
+    LOGGER.writeLog("Input file path: {}".format(inputFilePath))
+    LOGGER.writeLog("Output file path: {}".format(outputFilePath))
+    LOGGER.writeLog("Using delimiter: {}".format("[TAB SPACE]" if delimiter == '\t' else delimiter))
+    LOGGER.writeLog("Preserve input file: {}".format("NO" if not preserveOldFiles else "YES"))
+    LOGGER.writeLog("Verbose: {}".format("OFF" if not verbose else "ON"))
+    LOGGER.writeLog("===============================================")
 
     # Read file
-    data = pd.read_excel(inputFilePath)
-    LOGGER.writeLog("File loaded...", localFrame.f_lineno)
+    bytesRead = os.path.getsize(inputFilePath)
+    with PROFILER.stage('parse', bytesIn=bytesRead):
+        data = readInventory(inputFilePath)
+    LOGGER.writeLog("File loaded...")
+
+    with PROFILER.stage('transform'):
+        data = processInventory(data)
+    LOGGER.writeLog("Data processed.")
+
+    # Save file as tsv
+    with PROFILER.stage('write') as writeStage:
+        writeInventory(data, outputFilePath, delimiter)
+        writeStage.addBytes(bytesOut=os.path.getsize(outputFilePath))
+    LOGGER.metrics.inc('rows_processed_total', len(data))
+    LOGGER.metrics.inc('bytes_read_total', bytesRead)
+    LOGGER.metrics.inc('bytes_written_total', os.path.getsize(outputFilePath))
+
+    LOGGER.writeLog("File saved as {} at path: {}".format(outputFilePath[-4:], outputFilePath))
+
+    # Time to remove the original file (If preserve is declared as a command line flag)
+    if not preserveOldFiles:
+        with PROFILER.stage('purge'):
+            os.remove(inputFilePath)
+        LOGGER.writeLog("Removed input file.")
+    LOGGER.metrics.set('run_success', 1)
+    LOGGER.writeLog("Execution complete - exitting.")
+
+
+def readInventory(inputFilePath):
+    """
+    Function that reads the GSP inventory workbook.
+
+    :param inputFilePath: str: Path to the .xlsx file
+    :return:
+        data: DataFrame: The first sheet of the workbook
+    """
+    import pandas as pd
+    return pd.read_excel(inputFilePath)
+
 
+def processInventory(data):
+    """
+    Function that prepares the inventory for SQL Server: missing values are filled and quantities made integers.
+
+    :param data: DataFrame: Inventory as read by readInventory
+    :return:
+        data: DataFrame: The processed inventory
+    """
     # Fill nas with null values so they can be interpreted as null in SQL Server
     data['Site'].fillna('', inplace=True)
     data['ItemNumber'].fillna('', inplace=True)
@@ -122,9 +173,18 @@ def main(argv):
 
     # Convert quantity in hand to integer
     data['QuantityOnHand'] = data['QuantityOnHand'].astype(int)
-    LOGGER.writeLog("Data processed.", localFrame.f_lineno)
+    return data
 
-    # Save file as tsv
+
+def writeInventory(data, outputFilePath, delimiter='\t'):
+    """
+    Function that saves the processed inventory as a delimited file.
+
+    :param data: DataFrame: Inventory as returned by processInventory
+    :param outputFilePath: str: Path of the file to write
+    :param delimiter: str: Single character separating the columns
+    :return:
+    """
     columnList = [
         'Site',
         'ItemNumber',
@@ -135,14 +195,6 @@ def main(argv):
     data.to_csv(outputFilePath, encoding='utf-8', escapechar='\\', float_format='%.2f', index=False, columns=columnList,
                 line_terminator='\r\n', quoting=csv.QUOTE_NONE, sep=delimiter)
 
-    LOGGER.writeLog("File saved as {} at path: {}".format(outputFilePath[-4:], outputFilePath), localFrame.f_lineno)
-
-    # Time to remove the original file (If preserve is declared as a command line flag)
-    if not preserveOldFiles:
-        os.remove(inputFilePath)
-        LOGGER.writeLog("Removed input file.", localFrame.f_lineno)
-    LOGGER.writeLog("Execution complete - exitting.", localFrame.f_lineno)
-
 
 def parseArgs(argv):
     """
@@ -161,10 +213,10 @@ def parseArgs(argv):
         preserve: boolean: Determines whether to remove all occurrences of the input file (default=False)
         verbose: boolean: Show log outputs in the console
     """
-    localFrame = inspect.currentframe()
     # Defining options in for command line arguments
-    options = "hi:o:d:vp"
-    long_options = ["help", "input=", "output=", 'delimiter=', 'verbose', 'preserve']
+    options = "hi:o:d:vpl:"
+    long_options = ["help", "input=", "output=", 'delimiter=', 'verbose', 'preserve', 'profile', 'cprofile',
+                    'metrics=', 'log-level=']
     inputFileExtension = '.xlsx'
     inputFileName = 'GSPInventoryFeed' + inputFileExtension
 
@@ -199,15 +251,14 @@ def parseArgs(argv):
         opts, args = getopt.getopt(argv, options, long_options)
     except getopt.GetoptError:
         # Not logging here since this is a command-line feature and must be printed on console
-        print("Error in arguments!")
-        print(HELP_MESSAGE)
+        print("Error in arguments!", file=LOGGER.terminal)
+        print(HELP_MESSAGE, file=LOGGER.terminal)
         exit()
 
     for option, value in opts:
-        if option == '-h':
-            # Turn on verbose, print help message, and exit
-            LOGGER.verbose = True
-            print(HELP_MESSAGE)
+        if option in ('-h', '--help'):
+            # Print help message on the console only, and exit
+            print(HELP_MESSAGE, file=LOGGER.terminal)
             sys.exit()
         elif option in ("-i", "--input"):
             inputFilePath = value
@@ -220,6 +271,21 @@ def parseArgs(argv):
             preserveOldFiles = True
         elif option in ("-v", "--verbose"):
             verbose = True
+        elif option in ("-l", "--log-level"):
+            if value not in SEVERITY_LEVELS:
+                print("Error in arguments! Log level must be one of: normal, warning, error, code-breaker",
+                      file=LOGGER.terminal)
+                print(HELP_MESSAGE, file=LOGGER.terminal)
+                exit()
+            # Entries less severe than the level are dropped
+            LOGGER.setLevel(value)
+        elif option in ("--profile", "--cprofile"):
+            # Profiling the run, the report is written at exit
+            PROFILER.enable(*getReportPaths(LOGGER.getLog().name, cProfile=option == '--cprofile'))
+        elif option == "--metrics":
+            # Recording the run's metrics, the .prom file is written at exit
+            LOGGER.metrics.enable(value)
+            PROFILER.addListener(LOGGER.metrics.observeStage)
 
     # Updating logger's behavior based on verbose
     LOGGER.verbose = verbose
@@ -229,16 +295,14 @@ def parseArgs(argv):
             inputFileExtension):
         LOGGER.writeLog(
             """Invalid file path. Check if it exists, is not a directory and has {} extension. Exiting.""".format(
-                inputFileExtension),
-            localFrame.f_lineno, severity='code-breaker', data={'code': 1})
+                inputFileExtension), severity='code-breaker', data={'code': 1})
         exit()
 
     # Validate output file directory path
     if not os.path.exists(os.path.dirname(outputFilePath)) or not os.path.isdir(outputFilePath):
         LOGGER.writeLog(
             """Invalid output file path. Check if it exists and is not a directory.
-             \rReverting to defaults.""",
-            localFrame.f_lineno, severity='warning', data={'code': 1})
+             \rReverting to defaults.""", severity='warning', data={'code': 1})
         outputFilePath = outputDefaultPath
 
     # Change output file's extension based on the delimiter
@@ -261,7 +325,6 @@ def validateDelimiter(delimiter, defaultDilimiter):
     :return:
 <br>    delimiter : str: The same delimiter if validated and a ',' as a delimiter if not validated.
     """
-    localFrame = inspect.currentframe()
     # Account for '\\t' and '\t'
     if delimiter == '\\t':
         delimiter = '\t'
@@ -269,7 +332,7 @@ def validateDelimiter(delimiter, defaultDilimiter):
     # Check for length
     if len(delimiter) > 1:
         LOGGER.writeLog("Length of the delimiter was greater than one character, switching to default ',' delimiter.",
-                        localFrame.f_lineno, severity='warning')
+                        severity='warning')
         delimiter = ','
         return delimiter
 
@@ -278,7 +341,7 @@ def validateDelimiter(delimiter, defaultDilimiter):
 
     if delimiter not in acceptableDelimiters:
         LOGGER.writeLog("Delimiter was not selected from acceptable options, switching to ',' default delimiter.",
-                        localFrame.f_lineno, severity='warning')
+                        severity='warning')
         delimiter = defaultDilimiter
         return delimiter
 
@@ -291,21 +354,20 @@ def checkPlatformAndPythonVersion():
     Will exit the code with an error entry in the log if requirements not satisfied
     :return:
     """
-    localFrame = inspect.currentframe()
     # Check if python version is 3.5 or higher
     """
     # NOTE:
     # More precision is not required since python is a very compatible and platform-free language (Windows Python 3.6 
     # and Linux Python 3.8 can easily run the same file without any errors.
     """
-    if not PYTHON_VERSION >= 3.5:
-        LOGGER.writeLog("Must use Python version 3.5 or higher!", localFrame.f_lineno, severity='code-breaker',
+    if not PYTHON_VERSION >= (3, 5):
+        LOGGER.writeLog("Must use Python version 3.5 or higher!", severity='code-breaker',
                         data={'code': 1})
         exit()
 
     # Check if the platform is either windows or linux
     if PLATFORM not in ('windows', 'linux'):
-        LOGGER.writeLog("Please use Windows or Linux platform.", localFrame.f_lineno, severity='code-breaker',
+        LOGGER.writeLog("Please use Windows or Linux platform.", severity='code-breaker',
                         data={'code': 1})
 
 
@@ -315,13 +377,27 @@ def checkPlatformAndPythonVersion():
 class Logger(object):
     """ The logger class that will handle all outputs, may it be console or log file. """
 
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, metrics=None, level='normal'):
         self.terminal = sys.stdout
-        self.log = open(self.getLogPath(), "a")
-        # Write the header row
-        self.log.write(' Ind. |LineNo.| Time stamp  : Message')
-        self.log.write('\n=====================================\n')
+        # Opened by the first entry, so that runs stopping at the arguments (e.g. --help) leave no log file behind
+        self.log = None
         self.verbose = verbose
+        # Entries less severe than the level are dropped
+        self.level = SEVERITY_LEVELS[level]
+        # Counters and histograms of the run, fed along with the log and written with --metrics
+        self.metrics = metrics if metrics is not None else MetricsEmitter('gsp_inventory')
+
+    def setLevel(self, level):
+        """
+        Function that sets the least severe entries still logged.
+
+        :param level: str: 'normal', 'warning', 'error' or 'code-breaker'
+        """
+        self.level = SEVERITY_LEVELS[level]
+
+    def isEnabledFor(self, severity):
+        """ Function that tells whether entries of a severity are logged, to skip building costly messages. """
+        return SEVERITY_LEVELS.get(severity, 0) >= self.level
 
     def getLogPath(self):
         """
@@ -358,19 +434,35 @@ class Logger(object):
                 os.mkdir(logFilePath)
                 return os.path.join(logFilePath, logFileName)
 
+    def getLog(self):
+        """
+        Function that returns the writer of the log file, opening the file and writing its header on first use.
+
+        :return:
+            log: BatchedLogWriter: Entries are queued and written in batches by a background thread, see logwriter.py
+        """
+        if self.log is None:
+            self.log = BatchedLogWriter(self.getLogPath())
+            # Write the header row
+            self.log.write(' Ind. |LineNo.| Time stamp  : Message')
+            self.log.write('\n=====================================\n')
+        return self.log
+
     def write(self, message):
         if self.verbose:
             self.terminal.write(message)
             self.terminal.flush()
-        self.log.write(message)
+        self.getLog().write(message)
 
-    def writeLog(self, message, lineNumber, severity='normal', data=None):
+    def writeLog(self, message, lineNumber=None, severity='normal', data=None):
         """
         Function that writes out to the log file and console based on verbose.
         The function will change behavior slightly based on severity of the message.
+        Entries below the logger's level are dropped before anything else is done, the others are queued and
+        formatted by the writer thread.
 
         :param message: str: Message to write
-        :param lineNumber: int: File line number that created this log entry.
+        :param lineNumber: int: File line number that created this log entry. Defaults to the caller's line.
         :param severity: str: Defines what the message is related to. Is the message:
                     - [N] : A 'normal' notification
                     - [W] : A 'warning'
@@ -387,33 +479,21 @@ class Logger(object):
                     - error : str
                         String produced by exception if an exception occured
         """
-        # Get a timestamp
-        timestamp = self.getCurrentTimestamp()
-
-        # Format the message based on severity
-        lineNumber = str(lineNumber)
-        if severity == 'normal':
-            indicator = '[N]'
-            toWrite = ' ' + indicator + '  |  ' + lineNumber + '  | ' + timestamp + ': ' + message
-        elif severity == 'warning':
-            indicator = '[W]'
-            toWrite = ' ' + indicator + '  |  ' + lineNumber + '  | ' + timestamp + ': ' + message
-        elif severity == 'error':
-            indicator = '[X]'
-            toWrite = ' ' + indicator + '  |  ' + lineNumber + '  | ' + timestamp + ': ' + message
-        elif severity == 'code-breaker':
-            indicator = '[!]'
-            toWrite = ' ' + indicator + '  |  ' + lineNumber + '  | ' + timestamp + ': ' + message
+        if SEVERITY_LEVELS.get(severity, 0) < self.level:
+            return
+        if lineNumber is None:
+            lineNumber = sys._getframe(1).f_lineno
 
+        details = None
+        if severity == 'code-breaker' and data is not None:
             if data['code'] == 2:  # Response recieved but unsuccessful
-                details = '\n[ErrorDetailsStart]\n' + data['response'] + '\n[ErrorDetailsEnd]'
-                toWrite = toWrite + details
+                details = data['response']
             elif data['code'] == 3:  # YAML loading error
-                details = '\n[ErrorDetailsStart]\n' + data['error'] + '\n[ErrorDetailsEnd]'
-                toWrite = toWrite + details
+                details = data['error']
 
-        # Write out the message
-        self.log.write(toWrite + '\n')
+        # Queue the entry, the writer thread formats it
+        self.getLog().put((time.time(), severity, lineNumber, message, details))
+        self.metrics.inc('log_messages_total', severity=severity)
         if self.verbose:
             self.terminal.write(message + '\n')
             self.terminal.flush()
@@ -449,16 +529,26 @@ class Logger(object):
         LOGGER.write('Traceback:\n')
         for i in traceback.format_list(traceback.extract_tb(traceBack)):
             LOGGER.write(i)
+        # The process is about to exit, write out everything queued so far
+        LOGGER.flush()
 
     def flush(self):
         # This flush method is needed for python 3 compatibility.
-        # This handles the flush command by doing nothing.
-        # You might want to specify some extra behavior here.
-        pass
+        # Writes out the entries still queued for the log file.
+        if self.log is not None:
+            self.log.flush()
 
 
+# Metrics of the run, fed through the logger and only written with --metrics
+METRICS = MetricsEmitter('gsp_inventory')
+declareRunMetrics(METRICS)
+METRICS.counter('bytes_read_total', 'Bytes of the input workbook')
+
 # Determine log file path
-LOGGER = Logger(verbose=False)
+LOGGER = Logger(verbose=False, metrics=METRICS)
+
+# Stage timings of the run, only collected with --profile
+PROFILER = RunProfiler('gsp_inventory')
 if __name__ == '__main__':
     sys.stdout = LOGGER
     sys.excepthook = LOGGER.exceptionLogger
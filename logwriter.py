@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Batched log file writer shared by the converter scripts
+
+The scripts' Logger hands every entry to a BatchedLogWriter as a raw record (time, severity, line number,
+message). A background thread formats the records and writes them in batches, so logging costs the caller an
+append to a queue. The file keeps the usual format:
+
+     [N]  |  123  | 12:34:56.789: Message
+     [!]  |  456  | 12:34:56.790: Message
+    [ErrorDetailsStart]
+    details
+    [ErrorDetailsEnd]
+
+flush() writes everything queued before returning, from any thread. It is called by the Logger's
+exceptionLogger and at exit, so the last entries before a crash are never lost.
+"""
+import atexit
+import threading
+import collections
+from datetime import datetime
+
+# Indicator written for every severity
+SEVERITY_INDICATORS = {'normal': '[N]', 'warning': '[W]', 'error': '[X]', 'code-breaker': '[!]'}
+# Order of the severities, for the level cutoff
+SEVERITY_LEVELS = {'normal': 0, 'warning': 1, 'error': 2, 'code-breaker': 3}
+
+# Records queued before the writer thread is woken up early
+DEFAULT_BATCH_SIZE = 256
+# Longest time (seconds) a record waits in the queue
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+
+def formatRecord(record):
+    """
+    Function that renders a log record the way the Logger always wrote its entries.
+    Parameters
+    ----------
+        - record : tuple
+            (created, severity, lineNumber, message, details) with created a time.time() value and details None
+            or what to put between the [ErrorDetailsStart] and [ErrorDetailsEnd] markers
+    Returns
+    -------
+        - text : str
+            The entry, new line included
+    """
+    created, severity, lineNumber, message, details = record
+    timestamp = datetime.fromtimestamp(created).strftime('%H:%M:%S.%f')[:-3]
+    text = ' ' + SEVERITY_INDICATORS.get(severity, '[N]') + '  |  ' + str(lineNumber) + '  | ' + timestamp + ': ' + \
+        message
+    if details is not None:
+        # Details may be a response or an exception object, rendered here rather than by the caller
+        text += '\n[ErrorDetailsStart]\n' + str(details) + '\n[ErrorDetailsEnd]'
+    return text + '\n'
+
+
+class BatchedLogWriter(object):
+    """ A log file written by a background thread, in batches. """
+
+    def __init__(self, path, batchSize=DEFAULT_BATCH_SIZE, flushInterval=DEFAULT_FLUSH_INTERVAL):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - path : str
+                Path of the log file, appended to
+            - batchSize : int
+                Records queued before the writer thread is woken up
+            - flushInterval : float
+                Seconds between two writes when fewer records than batchSize are queued
+        """
+        self.name = path
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.file = open(path, 'a')
+        # Appending to and popping from a deque are thread safe, callers never wait for the writer
+        self.pending = collections.deque()
+        self.writeLock = threading.Lock()
+        self.wakeUp = threading.Event()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name='log-writer')
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.close)
+
+    def put(self, record):
+        """
+        Function that queues a record (see formatRecord) or raw text to be written.
+        Parameters
+        ----------
+            - record : tuple or str
+        """
+        if self.closed:
+            # Past close(), nothing drains the queue anymore
+            self.writeRecords([record])
+            return
+        self.pending.append(record)
+        if len(self.pending) >= self.batchSize:
+            self.wakeUp.set()
+
+    def write(self, text):
+        """ Function that queues raw text, written as it is. """
+        self.put(text)
+
+    def run(self):
+        """ Loop of the writer thread. """
+        while not self.closed:
+            self.wakeUp.wait(self.flushInterval)
+            self.wakeUp.clear()
+            self.flush()
+
+    def flush(self):
+        """ Function that writes every queued record and flushes the file. Safe to call from any thread. """
+        # Taking the records and writing them under one lock keeps concurrent flushes in order
+        with self.writeLock:
+            records = []
+            while True:
+                try:
+                    records.append(self.pending.popleft())
+                except IndexError:
+                    break
+            if records:
+                self.writeText(records)
+
+    def writeRecords(self, records):
+        with self.writeLock:
+            self.writeText(records)
+
+    def writeText(self, records):
+        if self.file.closed:
+            return
+        self.file.write(''.join(record if isinstance(record, str) else formatRecord(record) for record in records))
+        self.file.flush()
+
+    def close(self):
+        """ Function that stops the writer thread and writes what is left. Later records are written directly. """
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeUp.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join(self.flushInterval * 4)
+        self.flush()
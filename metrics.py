@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Prometheus metrics shared by the converter scripts
+
+Counters, gauges and histograms fed by the scripts' Logger while they run, written at exit to a .prom file in the
+text exposition format, for node_exporter's textfile collector to pick up. The file is written to a temporary
+name and renamed, so the collector never reads half of it.
+
+Every metric is named <prefix>_<name>, the prefix being the script's name (e.g. suredone_download_api_calls_total).
+Until enable() is called nothing is recorded and every call returns straight away.
+
+Usage:
+    metrics = MetricsEmitter('suredone_download')
+    metrics.counter('api_calls_total', 'API calls made, by method and HTTP status')
+    metrics.enable('/var/lib/node_exporter/textfile/suredone_download.prom')
+    metrics.inc('api_calls_total', method='get', status='200')
+"""
+import os
+import time
+import atexit
+import threading
+
+# Upper bounds (seconds) of the duration histograms, from sub-second api calls to half-hour exports
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+
+class MetricsEmitter(object):
+    """ Collects the metrics of one run and writes them to a .prom file at exit. """
+
+    def __init__(self, prefix):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - prefix : str
+                Prepended to every metric name
+        """
+        self.prefix = prefix
+        self.enabled = False
+        self.path = None
+        self.startedAt = None
+        self.definitions = {}
+        self.order = []
+        self.values = {}
+        self.finished = False
+        # Shards and download segments report from worker threads
+        self.lock = threading.Lock()
+
+    def counter(self, name, description):
+        """ Function that declares a counter (a total that only goes up during the run). """
+        self.declare(name, 'counter', description)
+
+    def gauge(self, name, description):
+        """ Function that declares a gauge (a value that is set). """
+        self.declare(name, 'gauge', description)
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS):
+        """ Function that declares a histogram of observed values, counted in cumulative buckets. """
+        self.declare(name, 'histogram', description, sorted(buckets))
+
+    def declare(self, name, kind, description, buckets=None):
+        if name not in self.definitions:
+            self.order.append(name)
+        self.definitions[name] = (kind, description, buckets)
+        self.values.setdefault(name, {})
+
+    def enable(self, path):
+        """
+        Function that starts recording. The file is written when the process exits.
+        Parameters
+        ----------
+            - path : str
+                Path of the .prom file, usually in node_exporter's textfile directory
+        """
+        if self.enabled:
+            return
+        self.enabled = True
+        self.path = path
+        self.startedAt = time.time()
+        if 'run_success' in self.definitions:
+            # Until the script reports that it completed
+            self.set('run_success', 0)
+        atexit.register(self.write)
+
+    def inc(self, name, value=1, **labels):
+        """ Function that adds value to a counter. Labels are given as keyword arguments. """
+        if not self.enabled:
+            return
+        key = getLabelKey(labels)
+        with self.lock:
+            series = self.values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """ Function that sets a gauge. """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.values[name][getLabelKey(labels)] = value
+
+    def observe(self, name, value, **labels):
+        """ Function that adds an observation to a histogram. """
+        if not self.enabled:
+            return
+        buckets = self.definitions[name][2]
+        key = getLabelKey(labels)
+        with self.lock:
+            series = self.values[name]
+            if key not in series:
+                series[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            histogram = series[key]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def observeStage(self, name, seconds):
+        """ Function that records how long a stage of the run took, given to RunProfiler.addListener(). """
+        self.observe('stage_duration_seconds', seconds, stage=name)
+
+    def render(self):
+        """
+        Function that formats every metric in the Prometheus text exposition format.
+        Returns
+        -------
+            - text : str
+        """
+        lines = []
+        with self.lock:
+            for name in self.order:
+                kind, description, buckets = self.definitions[name]
+                fullName = self.prefix + '_' + name
+                lines.append('# HELP {} {}'.format(fullName, escapeHelp(description)))
+                lines.append('# TYPE {} {}'.format(fullName, kind))
+                for key in sorted(self.values[name]):
+                    value = self.values[name][key]
+                    if kind != 'histogram':
+                        lines.append('{}{} {}'.format(fullName, formatLabels(key), formatValue(value)))
+                        continue
+                    for bound, count in zip(buckets, value['buckets']):
+                        lines.append('{}_bucket{} {}'.format(fullName, formatLabels(key, ('le', formatValue(bound))),
+                                                             count))
+                    lines.append('{}_bucket{} {}'.format(fullName, formatLabels(key, ('le', '+Inf')),
+                                                         value['count']))
+                    lines.append('{}_sum{} {}'.format(fullName, formatLabels(key), formatValue(value['sum'])))
+                    lines.append('{}_count{} {}'.format(fullName, formatLabels(key), value['count']))
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        """ Function that writes the metrics to the .prom file. Called at exit, only the first call counts. """
+        if not self.enabled or self.finished:
+            return
+        self.finished = True
+        if 'run_duration_seconds' in self.definitions:
+            self.set('run_duration_seconds', time.time() - self.startedAt)
+            self.set('last_run_timestamp_seconds', time.time())
+        # node_exporter only reads *.prom files, the temporary one is ignored until it is renamed
+        partPath = self.path + '.' + str(os.getpid()) + '.tmp'
+        with open(partPath, 'w') as metricsFile:
+            metricsFile.write(self.render())
+        os.replace(partPath, self.path)
+
+
+def declareRunMetrics(metrics):
+    """
+    Function that declares the metrics every script reports: run duration and outcome, stage durations, rows and
+    bytes written and log messages.
+    Parameters
+    ----------
+        - metrics : MetricsEmitter
+    """
+    metrics.gauge('run_duration_seconds', 'Wall time of the last run')
+    metrics.gauge('last_run_timestamp_seconds', 'Unix time the last run ended at')
+    metrics.gauge('run_success', '1 if the last run completed, 0 if it stopped early')
+    metrics.histogram('stage_duration_seconds', 'Duration of every stage of the run, by stage')
+    metrics.counter('rows_processed_total', 'Rows written to the outputs')
+    metrics.counter('bytes_written_total', 'Bytes of output written')
+    metrics.counter('log_messages_total', 'Log entries written, by severity')
+
+
+def getLabelKey(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def formatLabels(key, extra=None):
+    pairs = list(key) + ([extra] if extra is not None else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, escapeLabel(value)) for name, value in pairs) + '}'
+
+
+def formatValue(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
+
+
+def escapeLabel(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def escapeHelp(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
@@ -0,0 +1,325 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Run profiler shared by the converter scripts
+
+Times every stage of a run (config load, export request, readiness wait, download, parse, transform, write,
+purge...) and records, per stage, the peak traced memory and the bytes read and written. With --profile the
+scripts enable it and a JSON report is written when the run exits, optionally along with a cProfile dump.
+
+When it isn't enabled every call returns straight away: stage() hands back a shared no-op context manager and
+timeIterable() the iterable itself, so instrumented code costs nothing measurable. Listeners (e.g. the metrics
+emitter) can still be told how long every stage took, without the memory tracing and report of --profile.
+
+Report (JSON):
+    - script, startedAt, totalSeconds, exitedAt
+    - peakTracedBytes : peak of the memory allocated by python during the run (tracemalloc)
+    - maxRSSBytes : peak resident memory of the process, where the platform reports it
+    - cProfile : path of the cProfile dump, if one was requested (read it with pstats)
+    - stages : list, in the order the stages first ran
+        - name, calls, seconds, cpuSeconds, peakTracedBytes, bytesIn, bytesOut
+        - within : for stages timed piece by piece while streaming (e.g. parse inside download), the stage they
+                   ran in. Their cpuSeconds and peakTracedBytes are those of that stage. Pieces timed in parallel
+                   threads are added up, so they can exceed the wall time of that stage.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import platform
+import threading
+import tracemalloc
+from datetime import datetime
+try:
+    # Not available on Windows
+    import resource
+except ImportError:
+    resource = None
+
+
+class NullStage(object):
+    """ Context manager handed out while profiling is off. """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceBack):
+        return False
+
+    def addBytes(self, bytesIn=0, bytesOut=0):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage(object):
+    """ One timed run of a stage, used as a context manager. """
+
+    def __init__(self, profiler, name, bytesIn=0, bytesOut=0):
+        self.profiler = profiler
+        self.name = name
+        self.bytesIn = bytesIn
+        self.bytesOut = bytesOut
+        self.peak = 0
+        self.start = None
+        self.cpuStart = None
+
+    def __enter__(self):
+        self.profiler.enterStage(self)
+        self.cpuStart = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceBack):
+        seconds = time.perf_counter() - self.start
+        cpuSeconds = time.process_time() - self.cpuStart
+        self.profiler.exitStage(self, seconds, cpuSeconds)
+        return False
+
+    def addBytes(self, bytesIn=0, bytesOut=0):
+        """ Function that counts bytes read or written by the stage once they are known. """
+        self.bytesIn += bytesIn
+        self.bytesOut += bytesOut
+
+
+class RunProfiler(object):
+    """ Collects the stages of one run and writes them to a JSON report at exit. """
+
+    def __init__(self, script):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - script : str
+                Name of the script, written in the report
+        """
+        self.script = script
+        self.enabled = False
+        self.reportPath = None
+        self.cProfilePath = None
+        self.cProfiler = None
+        self.stages = {}
+        self.order = []
+        self.active = []
+        self.startedAt = None
+        self.start = None
+        self.finished = False
+        self.listeners = []
+        # Stages timed piece by piece may be fed from worker threads (e.g. shards downloading in parallel)
+        self.lock = threading.Lock()
+
+    def enable(self, reportPath, cProfilePath=None):
+        """
+        Function that starts profiling the run. The report is written when the process exits.
+        Parameters
+        ----------
+            - reportPath : str
+                Path of the JSON report
+            - cProfilePath : str
+                Path of the cProfile dump. None doesn't run cProfile.
+        """
+        if self.enabled:
+            return
+        self.enabled = True
+        self.reportPath = reportPath
+        self.cProfilePath = cProfilePath
+        self.startedAt = datetime.now()
+        self.start = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if cProfilePath is not None:
+            import cProfile
+            self.cProfiler = cProfile.Profile()
+            self.cProfiler.enable()
+        atexit.register(self.finish)
+
+    def addListener(self, listener):
+        """
+        Function that registers a callable told the duration of every stage, whether profiling is enabled or not.
+        Parameters
+        ----------
+            - listener : callable
+                Called as listener(name, seconds) when a stage ends
+        """
+        self.listeners.append(listener)
+
+    def stage(self, name, bytesIn=0, bytesOut=0):
+        """
+        Function that returns a context manager timing the code it wraps as one call of the stage.
+        Stages may be nested, the memory peak of an inner stage also counts for the outer one.
+        Parameters
+        ----------
+            - name : str
+                Name of the stage. Repeated stages are added up.
+            - bytesIn : int
+                Bytes the stage reads, if known beforehand
+            - bytesOut : int
+                Bytes the stage writes, if known beforehand
+        """
+        if not self.enabled and not self.listeners:
+            return NULL_STAGE
+        return Stage(self, name, bytesIn, bytesOut)
+
+    def timeIterable(self, name, iterable):
+        """
+        Function that times how long the items of an iterable take to produce, for stages that stream (e.g. parsing
+        rows while they are downloaded). Returns the iterable untouched when profiling is off.
+        """
+        if not self.enabled:
+            return iterable
+        return self.iterTimed(name, iterable)
+
+    def iterTimed(self, name, iterable):
+        within = self.active[-1].name if self.active else None
+        iterator = iter(iterable)
+        seconds = 0.0
+        calls = 0
+        clock = time.perf_counter
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    seconds += clock() - start
+                    return
+                seconds += clock() - start
+                calls += 1
+                yield item
+        finally:
+            self.addTime(name, seconds, calls, within=within)
+
+    def addTime(self, name, seconds, calls=1, within=None):
+        """
+        Function that adds time measured piece by piece to a stage.
+        Parameters
+        ----------
+            - name : str
+                Name of the stage
+            - seconds : float
+            - calls : int
+                Number of pieces measured
+            - within : str
+                Stage these pieces ran in. Defaults to the innermost stage running.
+        """
+        if not self.enabled:
+            return
+        if within is None and self.active:
+            within = self.active[-1].name
+        with self.lock:
+            record = self.getRecord(name)
+            record['seconds'] += seconds
+            record['calls'] += calls
+            record['within'] = within
+
+    def addBytes(self, name, bytesIn=0, bytesOut=0):
+        """ Function that counts bytes read or written by a stage. """
+        if not self.enabled:
+            return
+        with self.lock:
+            record = self.getRecord(name)
+            record['bytesIn'] += bytesIn
+            record['bytesOut'] += bytesOut
+
+    def getRecord(self, name):
+        if name not in self.stages:
+            self.stages[name] = {'name': name, 'calls': 0, 'seconds': 0.0, 'cpuSeconds': None,
+                                 'peakTracedBytes': None, 'bytesIn': 0, 'bytesOut': 0}
+            self.order.append(name)
+        return self.stages[name]
+
+    def enterStage(self, stage):
+        if not self.enabled:
+            return
+        if self.active:
+            # The peak is reset for the new stage, the running one keeps what it reached so far
+            self.active[-1].peak = max(self.active[-1].peak, tracemalloc.get_traced_memory()[1])
+        if hasattr(tracemalloc, 'reset_peak'):  # python 3.9+
+            tracemalloc.reset_peak()
+        self.active.append(stage)
+
+    def exitStage(self, stage, seconds, cpuSeconds):
+        for listener in self.listeners:
+            listener(stage.name, seconds)
+        if not self.enabled:
+            return
+        stage.peak = max(stage.peak, tracemalloc.get_traced_memory()[1])
+        self.active.remove(stage)
+        if self.active:
+            self.active[-1].peak = max(self.active[-1].peak, stage.peak)
+        with self.lock:
+            record = self.getRecord(stage.name)
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['cpuSeconds'] = (record['cpuSeconds'] or 0.0) + cpuSeconds
+            record['peakTracedBytes'] = max(record['peakTracedBytes'] or 0, stage.peak)
+            record['bytesIn'] += stage.bytesIn
+            record['bytesOut'] += stage.bytesOut
+
+    def finish(self):
+        """ Function that stops profiling and writes the report. Called at exit, only the first call counts. """
+        if not self.enabled or self.finished:
+            return
+        self.finished = True
+        totalSeconds = time.perf_counter() - self.start
+        if self.cProfiler is not None:
+            self.cProfiler.disable()
+            self.cProfiler.dump_stats(self.cProfilePath)
+        peakTraced = tracemalloc.get_traced_memory()[1]
+        for record in self.stages.values():
+            if record['peakTracedBytes'] is not None:
+                peakTraced = max(peakTraced, record['peakTracedBytes'])
+        tracemalloc.stop()
+
+        stages = []
+        for name in self.order:
+            record = dict(self.stages[name])
+            within = self.stages.get(record.get('within'))
+            if within is not None:
+                record['cpuSeconds'] = within['cpuSeconds']
+                record['peakTracedBytes'] = within['peakTracedBytes']
+            stages.append(record)
+        report = {'script': self.script, 'startedAt': self.startedAt.isoformat(),
+                  'exitedAt': datetime.now().isoformat(), 'totalSeconds': totalSeconds,
+                  'peakTracedBytes': peakTraced, 'maxRSSBytes': getMaxRSS(), 'python': platform.python_version(),
+                  'platform': platform.platform(), 'cProfile': self.cProfilePath, 'stages': stages}
+        writeReport(self.reportPath, report)
+
+
+def getMaxRSS():
+    """ Function that returns the peak resident memory of the process in bytes, None where it isn't reported. """
+    if resource is None:
+        return None
+    maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return maxRSS if sys.platform == 'darwin' else maxRSS * 1024
+
+
+def getReportPaths(logPath, cProfile=False):
+    """
+    Function that names the report (and cProfile dump) of a run after its log file.
+    Parameters
+    ----------
+        - logPath : str
+            Path of the run's log file
+        - cProfile : bool
+            Whether a cProfile dump is wanted
+    Returns
+    -------
+        - reportPath : str
+            <log name>_profile.json
+        - cProfilePath : str
+            <log name>_profile.pstats, None if cProfile is False
+    """
+    base = os.path.splitext(logPath)[0] + '_profile'
+    return base + '.json', base + '.pstats' if cProfile else None
+
+
+def writeReport(path, report):
+    """ Function that writes the report to a temporary file first and moves it into place. """
+    partPath = path + '.part'
+    with open(partPath, 'w') as reportFile:
+        json.dump(report, reportFile, indent=2)
+    os.replace(partPath, path)
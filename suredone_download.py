@@ -79,6 +79,7 @@ Parameters/Options:
     -f  | --file            : Path to the configuration file containing API keys
         |                       - Default in %APPDATA%/local/suredone.yaml on Window
         |                       - Default in $HOME/suredone.yaml
+        |                       - Keys: user, token and optionally endpoint (base URL of the API)
     -c  | --fields          : Comma separated string containing fields to export
         |                       - Default: "guid,stock,price,msrp,cost,ebayid"
     -o  | --output          : Path for the output file to be downloaded at
@@ -87,9 +88,44 @@ Parameters/Options:
     -p  | --preserve        : Do not delete older files that start with 'SureDone_' in the download directory
         |                       - This funciton is limited to default download locations only.
         |                       - Defining custom output path will render this feature useless.
+        |                       - Only the top level of the download directory is cleaned, subdirectories are left alone
+        | --keep-files      : Number of the newest previous outputs of each kind (downloads, inventories) kept
+        |                       - Default: 0
+        | --keep-age        : Previous outputs modified less than this many seconds ago are kept
+        |                       - Default: none are kept for their age
     -v  | --verbose         : Show outputs in terminal as well as log file
+    -l  | --log-level       : Least severe entries written to the log: normal, warning, error or code-breaker
+        |                       - Default: normal (every entry)
     -w  | --wait            : Custom timeout for requests invoked by the script (specified in seconds)
         |                       - Default: 15 seconds
+    -r  | --retry-budget    : Maximum total time (in seconds) the run may spend waiting between retries
+        |                       - Default: 900 seconds
+    -s  | --segments        : Number of parallel connections used to download the export file
+        |                       - Default: 1 (single stream)
+        |                       - Falls back to a single stream if the file server doesn't support ranges
+    -i  | --poll-cap        : Longest wait (in seconds) between two checks of whether the export is ready
+        |                       - Default: 30 seconds
+    -n  | --shards          : Number of narrower exports the fields are split into, requested and downloaded in parallel
+        |                       - Default: 1 (one export with every field)
+        |                       - Shards are joined on guid, so the output is ordered by guid
+    -e  | --delta           : Also write suredone_inventory_delta.tsv with only the rows added, changed or removed
+        |                     since the last run (a snapshot of every run's row hashes is kept for the next one)
+    -t  | --cache-ttl       : Seconds a finished export is reused by later runs asking for the same fields
+        |                       - Default: 300 seconds, 0 disables the cache
+        |                       - An export still being generated is always shared with runs started meanwhile
+    -m  | --memory-limit    : Megabytes the script's row buffers may use, for machines with little memory
+        |                       - Default: no limit (fixed buffer sizes)
+        |                       - Downloads and outputs always stream, the limit sizes the buffers that don't
+    -a  | --always-write    : Write the outputs (and purge old files) even when the export didn't change
+        |                       - By default an export identical to the last run's, written to the same place with
+        |                         the same delimiter, is not rewritten: the previous files are kept and
+        |                         suredone_inventory.unchanged is created
+    -u  | --exit-unchanged  : Exit with code 3 instead of 0 when the export didn't change and the files were kept
+        | --profile         : Time every stage of the run and record its peak memory and bytes in and out
+        |                       - The JSON report is written next to the log file, as <log name>_profile.json
+        | --cprofile        : Same as --profile, and also dump cProfile stats to <log name>_profile.pstats
+        | --metrics         : Path of a .prom file the run's metrics are written to at exit, for node_exporter's
+        |                     textfile collector (api calls by status, retries, sleeps, bytes, rows, stage durations)
 Example:
     $ python3 suredone_download.py
     $ python3 suredone_download.py -f [config.yaml]
@@ -108,85 +144,326 @@ import sys
 import os
 import getopt
 import platform
-import requests
-import yaml
 import json
-import pandas as pd
 import re
 import time
-import inspect
 import traceback
+import socket
+import threading
+import random
+import codecs
+import hashlib
+import heapq
+import operator
+import shutil
+import tempfile
+import sqlite3
+import importlib
 from os.path import expanduser
 from datetime import datetime
 import csv
+from profiling import RunProfiler, getReportPaths
+from metrics import MetricsEmitter, declareRunMetrics
+from logwriter import BatchedLogWriter, SEVERITY_LEVELS
+# requests, yaml, pandas, asyncio and the optional aiohttp and pyarrow take longer to import than most runs of
+# --help take in total: they are imported by the functions using them, so the command line starts without them
 
 currentMilliTime = lambda: int(round(time.time() * 1000))
 
-PYTHON_VERSION = float(sys.version[:sys.version.index(' ') - 2])
+PYTHON_VERSION = sys.version_info[:2]
 
 # Time tracking variables
 RUN_TIME = currentMilliTime()
 START_TIME = datetime.now()
 
+# Base URL of the SureDone API. A config file can point the script elsewhere with an 'endpoint' setting.
+DEFAULT_API_ENDPOINT = 'https://api.suredone.com/v1/'
+
+# Connection pool defaults for the SureDone API session
+# - POOL_CONNECTIONS : Number of distinct hosts to keep a pool for (API host and export file host)
+# - POOL_MAXSIZE : Number of keep-alive connections kept open per host
+# - KEEP_ALIVE_IDLE : Seconds of idleness before TCP keep-alive probes are sent on a pooled socket
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_KEEP_ALIVE = True
+DEFAULT_KEEP_ALIVE_IDLE = 60
+
+# Rate limiting defaults
+# - RATE_LIMIT_PERIOD : Seconds in which a full bucket refills when the API doesn't tell us its reset time
+# - RATE_LIMIT_FALLBACK_WAIT : Seconds to wait on a 429 that carries neither reset nor Retry-After headers
+DEFAULT_RATE_LIMIT_PERIOD = 60.0
+DEFAULT_RATE_LIMIT_FALLBACK_WAIT = 40.0
+
+# Retry defaults
+# - RETRY_BUDGET : Total seconds a single run may spend sleeping between retries, across all calls
+DEFAULT_RETRY_BUDGET = 900.0
+
+# Bytes read at a time when a saved file has to be scanned (e.g. to count its records)
+FILE_BUFFER_SIZE = 1024 * 1024
+
+# Parallel connections used to download an export. 1 downloads it as a single stream.
+DEFAULT_SEGMENTS = 1
+
+# Download buffer sizing
+# - CHUNK_SIZE : Size of the first read from a download stream
+# - MIN/MAX_CHUNK_SIZE : Bounds the read size adapts between
+# - CHUNK_TARGET_SECONDS : Wanted duration of a single read. Faster reads grow the buffer, slower ones shrink it
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+CHUNK_TARGET_SECONDS = 0.1
+
+# Export readiness polling
+# - POLL_INITIAL_DELAY : Seconds before the first readiness check when no history is available
+# - POLL_MAX_DELAY : Cap of the delay between two checks
+# - POLL_FACTOR : Growth of the delay after every check that found the export not ready
+# - POLL_MAX_WAIT : Seconds to wait for an export before giving up
+# - POLL_HISTORY_SIZE : Readiness times remembered per field set
+DEFAULT_POLL_INITIAL_DELAY = 2.0
+DEFAULT_POLL_MAX_DELAY = 30.0
+DEFAULT_POLL_FACTOR = 1.5
+DEFAULT_POLL_MAX_WAIT = 1800.0
+POLL_HISTORY_SIZE = 20
+
+# Sharded exports
+# - SHARDS : Number of narrow exports the field list is split into. 1 runs a single wide export.
+# - SORT_RUN_ROWS : Rows sorted in memory at a time when a shard is ordered by guid before the merge
+DEFAULT_SHARDS = 1
+SORT_RUN_ROWS = 100000
+
+# Memory ceiling
+# - MEMORY_LIMIT : Megabytes the row buffers of a run (sort runs, columnar batches, DataFrame chunks) may hold together.
+#                  None keeps their fixed sizes.
+# - ROW_VALUE_BYTES : Estimated memory held by one parsed value (a short str in a list)
+# - MIN_BUFFER_ROWS : Fewest rows a buffer is given, however low the limit
+# - EXPORT_CHUNK_ROWS : Rows per DataFrame when a saved export is read in chunks
+DEFAULT_MEMORY_LIMIT = None
+ROW_VALUE_BYTES = 80
+MIN_BUFFER_ROWS = 1000
+EXPORT_CHUNK_ROWS = 100000
+
+# Change detection
+# - UNCHANGED_MARKER : File created next to the outputs when the export didn't change since the last run
+# - EXIT_CODE_UNCHANGED : Exit code of a run that found the export unchanged with --exit-unchanged, so scheduled
+#                         imports can skip too
+UNCHANGED_MARKER = 'suredone_inventory.unchanged'
+EXIT_CODE_UNCHANGED = 3
+
+# Outputs of previous runs purged from the default download directory, matched on the file name. The newest files
+# are kept per pattern with --keep-files.
+EXPORT_RETENTION_PATTERNS = [r'SureDone_Download_.*\.(csv|tsv|txt)$', r'suredone_inventory.*\.(csv|tsv|txt)$']
+# Files removed per batch while purging, and threads removing batches at once
+PURGE_BATCH_SIZE = 256
+PURGE_WORKERS = 4
+
+# Seconds a finished export is reused by later runs asking for the same account and fields
+DEFAULT_EXPORT_CACHE_TTL = 300.0
+
+# Rows converted at a time when the export is copied to the columnar cache
+COLUMNAR_BATCH_ROWS = 65536
+
+# Requests an AsyncSureDone object keeps in flight at once, across every coroutine using it
+DEFAULT_ASYNC_CONCURRENCY = 8
+
+# Optional modules already looked for by importOptional(), None when they aren't installed
+OPTIONAL_MODULES = {}
 
-def main(argv):
-    localFrame = inspect.currentframe()
 
+def importOptional(name):
+    """
+    Function that imports an optional module the first time it is needed.
+    Parameters
+    ----------
+        - name : str
+            Name of the module, e.g. 'aiohttp' or 'pyarrow.ipc'
+    Returns
+    -------
+        - module : module
+            None if it isn't installed
+    """
+    if name not in OPTIONAL_MODULES:
+        try:
+            OPTIONAL_MODULES[name] = importlib.import_module(name)
+        except ImportError:
+            OPTIONAL_MODULES[name] = None
+    return OPTIONAL_MODULES[name]
+
+
+def main(argv):
     # Parse arguments
     # When verbose argument is added, change the verbose of the logger based on the argument as well
     waitTime, configPath, delimiter, outputFilePath, preserveOldFiles, verbose, dataFields, \
-    outputFileExtension = parseArgs(argv)
+    outputFileExtension, segments, pollCap, shards, delta, cacheTTL, detectChanges, exitUnchanged, customOutput, \
+    retention = parseArgs(argv)
 
     # Check if python version is 3.5 or higher
-    if not PYTHON_VERSION >= 3.5:
-        LOGGER.writeLog("Must use Python version 3.5 or higher!", localFrame.f_lineno, severity='code-breaker',
+    if not PYTHON_VERSION >= (3, 5):
+        LOGGER.writeLog("Must use Python version 3.5 or higher!", severity='code-breaker',
                         data={'code': 1})
         exit()
 
-    LOGGER.writeLog("SureDone bulk downloader initalized.\n", localFrame.f_lineno, severity='normal')
+    LOGGER.writeLog("SureDone bulk downloader initalized.\n", severity='normal')
 
-    LOGGER.writeLog("Wait time: {} seconds.".format(waitTime), localFrame.f_lineno, severity='normal')
-    LOGGER.writeLog("Configurations path: {}.".format(configPath), localFrame.f_lineno, severity='normal')
-    LOGGER.writeLog("Fields: {}.".format(dataFields), localFrame.f_lineno, severity='normal')
-    LOGGER.writeLog("Delimiter: {}.".format(delimiter if delimiter != '\t' else '[TAB SPACE]'), localFrame.f_lineno,
+    LOGGER.writeLog("Wait time: {} seconds.".format(waitTime), severity='normal')
+    LOGGER.writeLog("Configurations path: {}.".format(configPath), severity='normal')
+    LOGGER.writeLog("Fields: {}.".format(dataFields), severity='normal')
+    LOGGER.writeLog("Delimiter: {}.".format(delimiter if delimiter != '\t' else '[TAB SPACE]'), severity='normal')
+    LOGGER.writeLog("Output File Extension: {}.".format(outputFileExtension), severity='normal')
+    LOGGER.writeLog("Preserve old files: {}.".format(preserveOldFiles), severity='normal')
+    LOGGER.writeLog("Download segments: {}.".format(segments), severity='normal')
+    LOGGER.writeLog("Readiness poll cap: {} seconds.".format(pollCap), severity='normal')
+    LOGGER.writeLog("Export shards: {}.".format(shards), severity='normal')
+    LOGGER.writeLog("Delta output: {}.".format(delta), severity='normal')
+    LOGGER.writeLog("Export cache TTL: {} seconds.".format(cacheTTL), severity='normal')
+    LOGGER.writeLog("Skip unchanged exports: {}.".format(detectChanges), severity='normal')
+    LOGGER.writeLog("Exit code of unchanged exports: {}.".format(EXIT_CODE_UNCHANGED if exitUnchanged else 0),
                     severity='normal')
-    LOGGER.writeLog("Output File Extension: {}.".format(outputFileExtension), localFrame.f_lineno, severity='normal')
-    LOGGER.writeLog("Preserve old files: {}.".format(preserveOldFiles), localFrame.f_lineno, severity='normal')
-    LOGGER.writeLog("Verbose: {}.\n".format(verbose), localFrame.f_lineno, severity='normal')
+    LOGGER.writeLog("Memory limit: {}.".format('{} MB'.format(MEMORY_BUDGET.maxMegabytes)
+                                               if MEMORY_BUDGET.maxMegabytes is not None else 'none'),
+                    severity='normal')
+    LOGGER.writeLog("Verbose: {}.\n".format(verbose), severity='normal')
 
     # Parse configuration
-    user, apiToken = loadConfig(configPath)
+    with PROFILER.stage('config'):
+        user, apiToken, apiEndpoint = loadConfig(configPath)
+
+    LOGGER.writeLog("Configuration read.", severity='normal')
 
-    LOGGER.writeLog("Configuration read.", localFrame.f_lineno, severity='normal')
+    # Initialize API handler object. The same pooled session is used for every call made in this run,
+    # sized so that every download segment and every shard gets its own connection
+    sureDone = SureDone(user, apiToken, waitTime, poolMaxSize=max(DEFAULT_POOL_MAXSIZE, segments, shards),
+                        apiEndpoint=apiEndpoint)
+    historyPath = os.path.join(getStateDirectory(), 'export_history.json')
 
-    # Initialize API handler object
-    sureDone = SureDone(user, apiToken, waitTime)
+    # The latest export is also kept in columnar form for other tools, when pyarrow is available
+    extraSinks = []
+    columnarSink = getColumnarSink()
+    if columnarSink is not None:
+        extraSinks.append(columnarSink)
+
+    # The delta is computed against the last run of the same account and fields
+    if delta:
+        snapshotKey = hashlib.sha1((user + ','.join(normalizeFields(dataFields))).encode('utf-8')).hexdigest()[:16]
+        snapshotPath = os.path.join(getStateDirectory(), 'snapshot_{}.sqlite'.format(snapshotKey))
+        extraSinks.append(getDeltaSink(os.path.dirname(outputFilePath), snapshotPath))
+
+    if shards > 1:
+        # Every shard is exported, polled and downloaded on its own, then they are joined on guid
+        try:
+            # Requests, waits and downloads of the shards overlap, so they are timed as one stage
+            with PROFILER.stage('download'):
+                stats = downloadShardedExport(dataFields, shards, outputFilePath, sureDone, delimiter=delimiter,
+                                              extraSinks=extraSinks, historyPath=historyPath, pollCap=pollCap)
+        except LoadingError as error:
+            LOGGER.writeLog("Can not export for some reason.", severity='code-breaker',
+                            data={'code': 2, 'response': str(error)})
+            return
+        finally:
+            sureDone.close()
+        return finishRun(outputFilePath, stats, exitUnchanged, retention)
 
     # Get data to send to the bulk/exports sub module
     data = getDataForExports(dataFields)
 
-    # Invoke the GET API call to bulk/exports sub module
-    exportRequestResponse = sureDone.apicall('get', 'bulk/exports{}'.format(data))
+    # Runs asking for the same account and fields within the TTL share one export
+    exportCache = ExportCache(os.path.join(getStateDirectory(), 'export_cache.json'), ttl=cacheTTL)
+    cacheKey = exportCache.getKey(user, data)
+    # An export identical to the one written last time for this account and fields, to the same outputs, isn't
+    # written again. Default outputs are named after the time of the run, so only their directory tells them apart.
+    changeDetector = None
+    if detectChanges:
+        outputKey = outputFilePath if customOutput else os.path.dirname(outputFilePath)
+        changeKey = ChangeDetector.getKey(cacheKey, outputKey, delimiter)
+        changeDetector = ChangeDetector(os.path.join(getStateDirectory(), 'content_hashes.json'), changeKey)
+    with PROFILER.stage('request'):
+        fileName, entry = requestExport(data, sureDone, exportCache, cacheKey)
+    if fileName is None:
+        sureDone.close()
+        return
 
-    LOGGER.writeLog("API response recieved.", localFrame.f_lineno, severity='normal')
+    if entry is not None and entry['localPath']:
+        # Downloaded by a recent run, nothing to ask the API for
+        LOGGER.writeLog("Using the local copy at {}.".format(entry['localPath']), severity='normal')
+        stats = writeLocalExport(entry['localPath'], outputFilePath, delimiter=delimiter, extraSinks=extraSinks,
+                                 changeDetector=changeDetector)
+        sureDone.close()
+        return finishRun(outputFilePath, stats, exitUnchanged, retention)
 
-    # If the returning json has a 'result' key with 'success' value...
-    if exportRequestResponse['result'] == 'success':
-        # Get the file name of the newly exported file
-        fileName = exportRequestResponse['export_file']
+    if entry is None:
+        # Readiness times are remembered per field set, to wait about the right time before the first check
+        poller = ExportReadinessPoller(historyPath=historyPath,
+                                       historyKey=hashlib.sha1(data.encode('utf-8')).hexdigest()[:16],
+                                       maxDelay=pollCap)
+    else:
+        # Started by another run, which already waited for part of the export's usual time
+        poller = ExportReadinessPoller(maxDelay=pollCap,
+                                       maxWait=max(exportCache.maxPending - (time.time() - entry['requestedAt']), 0))
+    cacheSink = None
+    if exportCache.enabled:
+        cacheSink = RawSink(exportCache.getLocalPath(cacheKey), hashContent=True)
+        extraSinks.append(cacheSink)
 
-        # Download and save the file
-        downloadExportedFile(fileName, outputFilePath, sureDone, delimiter=delimiter)
+    # Download and save the file
+    stats = downloadExportedFile(fileName, outputFilePath, sureDone, delimiter=delimiter, segments=segments,
+                                 poller=poller, extraSinks=extraSinks, changeDetector=changeDetector)
+    if stats is None and entry is not None:
+        # The shared export never became ready (or expired on the server), start our own
+        LOGGER.writeLog("Export {} can't be reused, requesting a new one.".format(fileName), severity='warning')
+        exportCache.forget(cacheKey)
+        with PROFILER.stage('request'):
+            fileName, entry = requestExport(data, sureDone, exportCache, cacheKey)
+        if fileName is not None:
+            poller = ExportReadinessPoller(historyPath=historyPath,
+                                           historyKey=hashlib.sha1(data.encode('utf-8')).hexdigest()[:16],
+                                           maxDelay=pollCap)
+            stats = downloadExportedFile(fileName, outputFilePath, sureDone, delimiter=delimiter, segments=segments,
+                                         poller=poller, extraSinks=extraSinks, changeDetector=changeDetector)
+    if stats is not None and cacheSink is not None:
+        exportCache.recordDownloaded(cacheKey, cacheSink.path, cacheSink.bytesReceived, cacheSink.getContentHash())
+    else:
+        exportCache.forget(cacheKey)
+    sureDone.close()
 
-        safeExit(outputFilePath, marker='execution-complete')
+    return finishRun(outputFilePath, stats, exitUnchanged, retention)
 
-    # If the returning JSON wasn't successful in the first place, end the code with a generic error.
-    else:
-        LOGGER.writeLog("Can not export for some reason.", localFrame.f_lineno, severity='code-breaker',
-                        data={'code': 2, 'response': exportRequestResponse})
+
+def finishRun(outputFilePath, stats, exitUnchanged=False, retention=None):
+    """
+    Function that flags whether the outputs changed, purges the files of previous runs, prints the summary and picks
+    the exit code.
+    Parameters
+    ----------
+        - outputFilePath : str
+            Path of the user-delimited output file
+        - stats : dict
+            Stats returned by the download, None if nothing was downloaded
+        - exitUnchanged : bool
+            Exit with EXIT_CODE_UNCHANGED when the outputs of the last run were kept
+        - retention : RetentionManager
+            Purges the default download directory, None keeps every file
+    Returns
+    -------
+        - exitCode : int
+            EXIT_CODE_UNCHANGED when the outputs of the last run were kept and exitUnchanged is set, else None
+    """
+    unchanged = stats is not None and stats.get('unchanged', False)
+    if stats is not None:
+        setUnchangedMarker(os.path.dirname(outputFilePath), unchanged)
+        LOGGER.metrics.inc('rows_processed_total', stats['rows'])
+        LOGGER.metrics.inc('bytes_downloaded_total', stats.get('bytesDownloaded', 0))
+        LOGGER.metrics.inc('bytes_written_total', stats['bytesWritten'])
+        LOGGER.metrics.set('run_success', 1)
+    # Previous files are only removed once new ones are in place: a failed run, or one that kept the outputs of
+    # the last run, leaves them all
+    if retention is not None and stats is not None and not unchanged:
+        purgeOldExports(retention, protected=stats['outputs'])
+    safeExit(outputFilePath, marker='execution-complete', stats=stats)
+    if unchanged and exitUnchanged:
+        return EXIT_CODE_UNCHANGED
+    return None
 
 
-def safeExit(downloadPath, marker=''):
+def safeExit(downloadPath, marker='', stats=None):
     """
     Function that will perform a basic print job at the end of the script.
     Parameters
@@ -196,9 +473,20 @@ def safeExit(downloadPath, marker=''):
         - marker : str
             An identifier of what initiated the function.
             Currently we only have one initiator of this function, could be more later.
+        - stats : dict
+            Record and byte counts collected while the file was downloaded (see downloadExportedFile).
+            When missing, the saved file is scanned instead.
     """
-    # Read the csv's length
-    numRows = len(pd.read_csv(downloadPath))
+    # Use the counts collected during the download, fall back to scanning the saved file
+    if stats is not None:
+        numRows = stats['rows']
+        numBytes = stats['bytesWritten']
+    elif os.path.exists(downloadPath):
+        numRows = countCsvRows(downloadPath)
+        numBytes = os.path.getsize(downloadPath)
+    else:
+        numRows = 0
+        numBytes = 0
 
     # Get ending time
     END_TIME = datetime.now()
@@ -214,9 +502,55 @@ def safeExit(downloadPath, marker=''):
         print("Ending time: {}".format(END_TIME.strftime("%H:%M:%S")))
         print("Total execution time: {} milliseconds ({} seconds)".format(executionTime, (executionTime / 1000)))
         print("Total records in downloaded file: {}".format(numRows))
+        print("Total bytes written: {}".format(numBytes))
+        if stats is not None and stats.get('unchanged'):
+            print("Export unchanged since the last run, its files were kept")
         print("=================================================================")
 
 
+def countCsvRows(path, bufferSize=FILE_BUFFER_SIZE):
+    """
+    Function that counts the records of a delimited file without parsing it.
+    The file is scanned in large binary buffers. New lines inside quoted fields are not counted, quote state is
+    carried across buffer boundaries. Works for any delimiter since only quotes and new lines matter.
+    Parameters
+    ----------
+        - path : str
+            Path of the file to count
+        - bufferSize : int
+            Bytes read per buffer
+    Returns
+    -------
+        - numRows : int
+            Number of records, header excluded
+    """
+    lineCount = 0
+    inQuotes = False
+    lastByte = b''
+    with open(path, 'rb') as countedFile:
+        while True:
+            buffer = countedFile.read(bufferSize)
+            if not buffer:
+                break
+            if b'"' not in buffer:
+                # Fast path, the whole buffer is either inside or outside a quoted field
+                if not inQuotes:
+                    lineCount += buffer.count(b'\n')
+            else:
+                # Every quote flips the state, escaped quotes ("") flip it twice
+                for index, piece in enumerate(buffer.split(b'"')):
+                    if index > 0:
+                        inQuotes = not inQuotes
+                    if not inQuotes:
+                        lineCount += piece.count(b'\n')
+            lastByte = buffer[-1:]
+
+    # The last record may not end with a new line
+    if lastByte and lastByte != b'\n':
+        lineCount += 1
+    return max(lineCount - 1, 0)
+
+
 def loadConfig(configPath):
     """
     Function that parses the configuration file and reads user and apiToken variables.
@@ -232,14 +566,17 @@ def loadConfig(configPath):
             Username from the configuration file
         - apiToken : str
             Api authentication token from the configuration file
+        - apiEndpoint : str
+            Base URL of the API, from the optional 'endpoint' setting (e.g. a local stand-in server).
+            Defaults to DEFAULT_API_ENDPOINT.
     """
-    localFrame = inspect.currentframe()
+    import yaml
     # Loading configurations
     with open(configPath, 'r') as stream:
         try:
             config = yaml.safe_load(stream)
         except yaml.YAMLError as exc:
-            LOGGER.writeLog("Error while loading YAML.", localFrame.f_lineno, severity='code-breaker',
+            LOGGER.writeLog("Error while loading YAML.", severity='code-breaker',
                             data={'code': 3, 'error': exc})
 
     # Try to read the user and api_token from suredone_api set in the settings
@@ -248,37 +585,34 @@ def loadConfig(configPath):
         user = config['user']
         apiToken = config['token']
     except KeyError as exc:
-        LOGGER.writeLog("Not found user or token in config file.", localFrame.f_lineno, severity='code-breaker',
+        LOGGER.writeLog("Not found user or token in config file.", severity='code-breaker',
                         data={'code': 3, 'error': exc})
         exit()
-    return user, apiToken
+    apiEndpoint = config.get('endpoint') or DEFAULT_API_ENDPOINT
+    if not apiEndpoint.endswith('/'):
+        apiEndpoint += '/'
+    return user, apiToken, apiEndpoint
 
 
-def getDefaultDownloadPath(preserve, extension):
+def getDefaultDownloadPath(extension):
     """
     Function to check the operating system and determine the appropriate 
     download path for the export file based on operating system.
-    This funciton also purges the whole directory with any previous export files.
+    Previous export files in the directory are purged by purgeOldExports(), once a changed export was written.
     
     Returns
     -------
         - downloadPath : str
             A valid path that points to the diretory where the file should be downloaded
     """
-    localFrame = inspect.currentframe()
     # Generate file name
     suffix = datetime.now().strftime('%Y_%m_%d-%H-%M-%S')
     fileName = 'SureDone_Download_' + suffix + extension
 
     # If the platform is windows, set the download path to the current user's Downloads folder
-    toPurge = ['SureDone_Download_', 'suredone_inventory']
     if sys.platform == 'win32' or sys.platform == 'win64':  # Windows
         downloadPath = os.path.expandvars(r'%USERPROFILE%')
         downloadPath = os.path.join(downloadPath, 'Downloads')
-        if not preserve:
-            for purgePattern in toPurge:
-                purge(downloadPath, purgePattern)
-            LOGGER.writeLog("Purged existing files.", localFrame.f_lineno, severity='normal')
 
         downloadPath = os.path.join(downloadPath, fileName)
         return downloadPath
@@ -287,18 +621,90 @@ def getDefaultDownloadPath(preserve, extension):
     elif sys.platform == 'linux' or sys.platform == 'linux2':  # Linux
         downloadPath = expanduser('~')
         downloadPath = os.path.join(downloadPath, 'downloads')
-        if os.path.exists(downloadPath):
-            if not preserve:
-                for purgePattern in toPurge:
-                    purge(downloadPath, purgePattern)
-                LOGGER.writeLog("Purged existing files.", localFrame.f_lineno, severity='normal')
-        else:  # Create the downloads directory
+        if not os.path.exists(downloadPath):  # Create the downloads directory
             os.mkdir(downloadPath)
 
         downloadPath = os.path.join(downloadPath, fileName)
         return downloadPath
 
 
+def purgeOldExports(retention, protected=()):
+    """
+    Function that removes the files written by previous runs from the default download directory.
+    Parameters
+    ----------
+        - retention : RetentionManager
+            Set up by parseArgs() for the default download directory
+        - protected : list
+            Paths of the files written by this run, never removed
+    Returns
+    -------
+        - report : dict
+            See RetentionManager.purge()
+    """
+    with PROFILER.stage('purge'):
+        report = retention.purge(protected=protected)
+    LOGGER.metrics.inc('files_purged_total', report['removed'])
+    LOGGER.metrics.inc('bytes_purged_total', report['bytesReclaimed'])
+    LOGGER.writeLog("Purged {} previous files, {} bytes reclaimed ({} kept, {} entries scanned).".format(
+        report['removed'], report['bytesReclaimed'], report['kept'], report['scanned']), severity='normal')
+    return report
+
+
+def setUnchangedMarker(directory, unchanged):
+    """
+    Function that creates suredone_inventory.unchanged next to the outputs when the catalog didn't change since the
+    last run, and removes it otherwise. Imports scheduled on their own can check for it and skip as well.
+    Parameters
+    ----------
+        - directory : str
+            Directory of the outputs
+        - unchanged : bool
+    """
+    markerPath = os.path.join(directory, UNCHANGED_MARKER)
+    if unchanged:
+        with open(markerPath, 'w') as markerFile:
+            markerFile.write(datetime.now().strftime('%Y-%m-%d %H:%M:%S') + '\n')
+    elif os.path.exists(markerPath):
+        os.remove(markerPath)
+
+
+def normalizeFields(fields):
+    """
+    Function that splits a comma-separated field string into a list without spaces, empty entries or duplicates.
+
+    :param fields: str: Comma-separated string of fields
+    :return: list: Field names in their original order
+    """
+    # Split the data fields based on ',' and they strip each field of any spaces
+    fieldList = []
+    seen = set()
+
+    # Iterate through each field and make sure a duplicate isn't present
+    for field in fields.split(','):
+        field = field.strip(' ')
+        if field and field not in seen:
+            seen.add(field)
+            fieldList.append(field)
+    return fieldList
+
+
+def splitFieldGroups(fieldList, shards, keyField='guid'):
+    """
+    Function that splits a field list into groups for sharded exports. Every group starts with the key field so
+    the shards can be joined back together.
+
+    :param fieldList: list: Field names, as returned by normalizeFields
+    :param shards: int: Number of groups wanted
+    :param keyField: str: Field present in every group
+    :return: list: One list of fields per group, contiguous slices of the original order
+    """
+    others = [field for field in fieldList if field != keyField]
+    shards = max(1, min(shards, len(others)))
+    size = -(-len(others) // shards) if others else 1
+    return [[keyField] + others[start:start + size] for start in range(0, max(len(others), 1), size)]
+
+
 def getDataForExports(fields):
     """
     Function that prepares the data that will be sent to the bulk/exports sub module.
@@ -323,22 +729,8 @@ def getDataForExports(fields):
     #   ebaybuyitnow,ebayupcnot,ebayskip,amznsku,amznasin,amznprice,amznskip,walmartskip,walmartprice,
     #   walmartcategory,walmartdescription,walmartislisted,walmartinprogress,walmartstatus,walmarturl,total_stock'
 
-    data['fields'] = fields
-    # Split the data fields based on ',' and they strip each field of any spaces
-    t = list(map(lambda x: x.strip(' '), data['fields'].split(',')))
-    seen = set()
-    seen_add = seen.add
-    field_list = list()
-
-    # Iterate through each field and make sure a duplicate isn't present
-    for element in t:
-        k = element
-        if k not in seen:
-            seen_add(k)
-            field_list.append(k)
-
-    # Rejoin the fields into a single string, separated by a ','
-    data['fields'] = ','.join(field_list)
+    # Remove spaces and duplicates, then rejoin the fields into a single string, separated by a ','
+    data['fields'] = ','.join(normalizeFields(fields))
 
     # Compule the string to be added in the url
     dataStr = '?'
@@ -348,7 +740,8 @@ def getDataForExports(fields):
     return dataStr
 
 
-def downloadExportedFile(fileName, downloadFilePath, sureDone, delimiter=','):
+def downloadExportedFile(fileName, downloadFilePath, sureDone, delimiter=',', extraSinks=None,
+                         segments=DEFAULT_SEGMENTS, poller=None, changeDetector=None):
     """
     Fucntion that is invoked once the file is exported and is ready to download.
     Invokes the download stream, reads it and write to the file in the decided download directory.
@@ -360,490 +753,3657 @@ def downloadExportedFile(fileName, downloadFilePath, sureDone, delimiter=','):
             Path to the download directory.
         - sureDone : SureDone object
             Object of the SureDone API handler class
+        - delimiter : str
+            Delimiter of the file saved at downloadFilePath
+        - extraSinks : list
+            Additional OutputSink objects written in the same pass as the two default outputs
+        - segments : int
+            Number of concurrent Range requests used to download the file. 1 downloads it as a single stream.
+        - poller : ExportReadinessPoller
+            Decides how long to wait between readiness checks. Defaults to one without history.
+        - changeDetector : ChangeDetector
+            When given, the outputs are only written if the export changed since the last run
+    Returns
+    -------
+        - stats : dict
+            Collected while the file was written, None if the download didn't happen
+                - rows : int
+                    Number of records in the export
+                - bytesDownloaded : int
+                    Bytes received from the download stream
+                - bytesWritten : int
+                    Size of the file saved at downloadFilePath
+                - unchanged : bool
+                    True if the export was identical to the last run's and nothing was written
+                - outputs : list
+                    Paths of the files written, empty when unchanged
     """
-    localFrame = inspect.currentframe()
-    errorCount = 0
-    while True:
-        # Invoke api call to the same module but with a filename and no data 
-        fileDownloadURLResponse = sureDone.apicall('get', 'bulk/exports/' + fileName, {})
+    with PROFILER.stage('wait'):
+        url = waitForExportURL(fileName, sureDone, poller=poller)
+    if url is None:
+        return None
+    LOGGER.writeLog("Starting file download.", severity='normal')
 
-        # If the result was successfull...
-        if fileDownloadURLResponse['result'] == 'success':
-            # Set the path, get the download URL of the file requested, and start a stream to download it
-            LOGGER.writeLog("Starting file download.", localFrame.f_lineno, severity='normal')
-            downloadStream = requests.get(fileDownloadURLResponse['url'], stream=True)
-
-            # Get all the file bytes in the stream and write to the file
-            index = 0
-            with open(downloadFilePath, 'wb') as downloadedFile:
-                for index, chunk in enumerate(downloadStream.iter_content(chunk_size=1024)):
-                    if chunk:  # filter out keep-alive new chunks
-                        downloadedFile.write(chunk)
-
-            # Re open the saved csv and save it back with the desired delimiter
-            # As long as the delimiter desired is not ',' becasue the default way of delimiting the csv is via ','
-            if delimiter != ',':
-                temp = pd.read_csv(downloadFilePath)
-                temp.to_csv(downloadFilePath, sep=delimiter, index=False)
-            LOGGER.writeLog("Saved to " + downloadFilePath, localFrame.f_lineno, severity='normal')
-
-            # Also convert the file to a tab-separated file and save as suredone_inventory.tsv
-            temp = pd.read_csv(downloadFilePath, sep=delimiter)
-            secondFilePath = os.path.join(os.path.dirname(downloadFilePath), 'suredone_inventory.tsv')
-            myList = list(temp.columns.values)
-            temp.to_csv(secondFilePath, sep='\t', encoding='utf-8', quoting=csv.QUOTE_NONE, float_format='%.2f',
-                        index=False, escapechar='\\', columns=myList)
-            LOGGER.writeLog("TSV saved to " + secondFilePath, localFrame.f_lineno, severity='normal')
-            break
-        else:
-            # If the api call with the file name in the url wasn't successfull
-            # Increase the error count and check if error count has crossed 10 or not.
-            # More than 10 attempts with errors will end the code
-            errorCount += 1
-            if errorCount > 10:
-                LOGGER.writeLog("Can not download.", localFrame.f_lineno, severity='code-breaker',
-                                data={'code': 2, 'response': fileDownloadURLResponse})
-                break
+    primarySink, inventorySink, sinks = getExportSinks(downloadFilePath, delimiter, extraSinks)
+    # The export is saved and hashed first: its columns are typed before the outputs are written, and an unchanged
+    # one costs nothing but the download. Broken streams are resumed with Range requests.
+    stagingPath = downloadFilePath + '.download'
+    try:
+        with PROFILER.stage('download') as downloadStage:
+            staged = segments > 1 and sureDone.downloadSegments(url, stagingPath, segments)
+            if segments > 1 and not staged:
+                LOGGER.writeLog("Server doesn't support ranges, downloading as a single stream.", severity='warning')
+            if staged:
+                bytesDownloaded, contentHash = saveChunks(iterFileChunks(stagingPath))
             else:
-                LOGGER.writeLog('Attempt ' + str(errorCount) + ' ' + str(fileDownloadURLResponse), localFrame.f_lineno,
-                                severity='warning')
-                time.sleep(30)
-                continue
+                bytesDownloaded, contentHash = saveChunks(sureDone.iterDownload(url), stagingPath)
+            downloadStage.addBytes(bytesIn=bytesDownloaded)
+        if changeDetector is not None and changeDetector.isUnchanged(contentHash):
+            LOGGER.writeLog("Export identical to the last run's ({}), outputs not rewritten.".format(
+                contentHash[:16]), severity='normal')
+            clearDeltas(extraSinks, stagingPath)
+            writeRawCopies(extraSinks, stagingPath)
+            return {'rows': changeDetector.previous['rows'], 'bytesDownloaded': bytesDownloaded,
+                    'bytesWritten': 0, 'unchanged': True, 'outputs': []}
+        # One parse of the saved export feeds the user-delimited file, suredone_inventory.tsv and any extra sink
+        with PROFILER.stage('process'):
+            teeWriter = TeeWriter(sinks, columnKinds=getColumnKinds(iterFileChunks(stagingPath)))
+            teeWriter.writeStream(iterFileChunks(stagingPath))
+    finally:
+        if os.path.exists(stagingPath):
+            os.remove(stagingPath)
+    if changeDetector is not None:
+        changeDetector.record(contentHash, [primarySink.path, inventorySink.path], teeWriter.rowCount)
+    LOGGER.writeLog("Saved to " + downloadFilePath, severity='normal')
+    LOGGER.writeLog("TSV saved to " + inventorySink.path, severity='normal')
 
+    # Counted while writing, so the summary never has to read the files again
+    return {'rows': teeWriter.rowCount, 'bytesDownloaded': bytesDownloaded,
+            'bytesWritten': primarySink.bytesWritten, 'unchanged': False, 'outputs': [sink.path for sink in sinks]}
 
-def parseArgs(argv):
+
+def saveChunks(chunks, path=None):
     """
-    Function that parses the arguments sent from the command line 
-    and returns the behavioral variables to the caller.
+    Function that hashes a stream while it is received, saving it to a file on the way when a path is given.
     Parameters
     ----------
-        - argv : str
-            Arguments sent through the command line
-    
+        - chunks : iterable
+            Byte chunks of the file
+        - path : str
+            Where to save them. None only hashes.
     Returns
     -------
-        - waitTime : int
-            The time defined in seconds by the user before which the requests must not timeout if a response is not received from the API
-            Can be float in order to access millisecond scale
-        - configPath : str
-            A custom path to the configuration file containing API keys
-        - delimiter : str
-            A single character that is to be used as the delimiter in the CSVs
-        - outputFilePath : str
-            A custom path to the location where the file needs to be downloaded. Must contain the file name as well.
-        - verbose : bool
-        - preserveOldFiles : bool
-            A boolean variable that will tell the script to keep or remove older downloaded files in the download path
+        - size : int
+            Bytes received
+        - contentHash : str
+            SHA-256 of the content, in hexadecimal
     """
-    # Defining options in for command line arguments
-    options = "hw:f:d:o:vpc:"
-    long_options = ["help", "wait=", "file=", 'delimiter=', 'output=', 'verbose', 'preserve', 'fields=']
-
-    # Arguments
-    waitTime = 15
-    configPath = 'suredone.yaml'
-    customConfigPathFoundAndValidated = False
-    delimiter = ','
-    outputFilePath = ''
-    customOutputPathFoundAndValidated = False
-    verbose = False
-    preserveOldFiles = False
-    defaultOutputFileExtension = '.txt'
-    outputFileExtension = defaultOutputFileExtension
-    defaultFieldsBrief = 'guid,stock,price,msrp,cost,ebayid'
-    defaultFieldsDetailed = 'guid,stock,price,msrp,cost,title,longdescription,condition,brand,upc,media1,weight,' \
-                            'datesold,totalsold,manufacturerpartnumber,warranty,mpn,ebayid,ebaysku,ebaycatid,' \
-                            'ebaystoreid,ebayprice,ebaytitle,ebaystarttime,ebayendtime,ebaysiteid,ebaysubtitle,' \
-                            'ebaypaymentprofileid,ebayreturnprofileid,ebayshippingprofileid,ebaybestofferenabled,' \
-                            'ebaybestofferminimumprice,ebaybestofferautoacceptprice,ebaybuyitnow,ebayupcnot,ebayskip,' \
-                            'amznsku,amznasin,amznprice,amznskip,walmartskip,walmartprice,walmartcategory,' \
-                            'walmartdescription,walmartislisted,walmartinprogress,walmartstatus,walmarturl,total_stock'
-
-    dataFields = defaultFieldsDetailed
-
-    # Extracting arguments
-    opts = None
+    contentHash = hashlib.sha256()
+    size = 0
+    savedFile = open(path, 'wb') if path is not None else None
     try:
-        opts, args = getopt.getopt(argv, options, long_options)
-    except getopt.GetoptError:
-        # Not logging here since this is a command-line feature and must be printed on console
-        print("Error in arguments!")
-        print(HELP_MESSAGE)
-        exit()
-
-    for option, value in opts:
-        if option == '-h':
-            # Turn on verbose, print help message, and exit
-            LOGGER.verbose = True
-            print(HELP_MESSAGE)
-            sys.exit()
-        elif option in ("-w", "--wait"):
-            waitTime = float(value)
-        elif option in ("-f", "--file"):
-            configPath = value
-            customConfigPathFoundAndValidated = validateConfigPath(configPath)
-        elif option in ("-d", "--delimiter"):
-            delimiter = value
-            delimiter = validateDelimiter(delimiter)
-        elif option in ("-o", "--output"):
-            outputFilePath = value
-            customOutputPathFoundAndValidated = validateDownloadPath(outputFilePath)
-        elif option in ("-p", "--preserve"):
-            preserveOldFiles = True
-        elif option in ("-v", "--verbose"):
-            verbose = True
-            # Updating logger's behavior based on verbose
-            LOGGER.verbose = verbose
-        elif option in ("-c", "--fields"):
-            dataFields = validateFields(value, defaultFieldsDetailed)
-
-    # Determine the output file extension based on the delimiter chosen
-    if delimiter == '\t':
-        outputFileExtension = '.tsv'
-    elif delimiter == ',':
-        outputFileExtension = '.csv'
+        for chunk in chunks:
+            contentHash.update(chunk)
+            size += len(chunk)
+            if savedFile is not None:
+                savedFile.write(chunk)
+    finally:
+        if savedFile is not None:
+            savedFile.close()
+    return size, contentHash.hexdigest()
 
-    # If custom path to config file wasn't found, search in default locations
-    if not customConfigPathFoundAndValidated:
-        configPath = getDefaultConfigPath()
-    if not customOutputPathFoundAndValidated:
-        outputFilePath = getDefaultDownloadPath(preserve=preserveOldFiles, extension=outputFileExtension)
 
-    return waitTime, configPath, delimiter, outputFilePath, preserveOldFiles, verbose, dataFields, outputFileExtension
+def getExportSinks(downloadFilePath, delimiter=',', extraSinks=None):
+    """
+    Function that builds the outputs of an export: the user-delimited file, suredone_inventory.tsv and any extra sink.
+    Parameters
+    ----------
+        - downloadFilePath : str
+            Path of the user-delimited output file
+        - delimiter : str
+            Delimiter of that file
+        - extraSinks : list
+            Additional sinks
+    Returns
+    -------
+        - primarySink : RawSink or OutputSink
+        - inventorySink : OutputSink
+        - sinks : list
+            Every sink, to give to a TeeWriter
+    """
+    if delimiter == ',':
+        # The export is already comma separated, save its bytes as they are
+        primarySink = RawSink(downloadFilePath)
+    else:
+        # Re-delimit the export row by row while it is downloading
+        primarySink = OutputSink(downloadFilePath, delimiter=delimiter)
+    inventorySink = getInventorySink(os.path.dirname(downloadFilePath))
+    return primarySink, inventorySink, [primarySink, inventorySink] + list(extraSinks or [])
 
 
-def validateFields(inputString, defaultFields):
+def writeRawCopies(sinks, sourcePath):
     """
-    Function to check if the fields String is properly formatted (each word separated by a comma) with no
-    special characters involved.
-
-    :param inputString: str: String inputted in commandline
-    :param defaultFields: str: Default fields decided
-    :return: Same input string if successfully validated else the default fields.
+    Function that writes a saved export, byte for byte, to the RawSinks among sinks (e.g. the export cache's copy),
+    for the exports that aren't written through a TeeWriter.
+    Parameters
+    ----------
+        - sinks : list
+            Sinks of the run, the RawSinks among them are written
+        - sourcePath : str
+            File holding the export as it was downloaded
     """
-    localFrame = inspect.currentframe()
-
-    fieldsList = inputString.split(',')
+    rawSinks = [sink for sink in sinks or [] if isinstance(sink, RawSink)]
+    if not rawSinks:
+        return
+    try:
+        for sink in rawSinks:
+            sink.open()
+        for chunk in iterFileChunks(sourcePath):
+            for sink in rawSinks:
+                sink.writeChunk(chunk)
+        for sink in rawSinks:
+            sink.commit()
+    except BaseException:
+        for sink in rawSinks:
+            sink.discard()
+        raise
 
-    for field in fieldsList:
-        # Check if this field contains an alphabet
-        if not re.search('[a-zA-Z]', field):
-            LOGGER.writeLog("Error found in [{}] field. Reverting to defaults.", localFrame.f_lineno,
-                            severity='warning')
-            return defaultFields
 
-        # Check that it only contains alphanumeric characters
-        if not re.match('[a-zA-Z0-9_]', field):
-            LOGGER.writeLog("Error found in [{}] field. Reverting to defaults.", localFrame.f_lineno,
-                            severity='warning')
-            return defaultFields
-    return inputString
+def clearDeltas(sinks, sourcePath):
+    """
+    Function that empties the delta outputs of an export identical to the last run's, so that the changes of the
+    previous run are never imported twice. The snapshots are left as they are.
+    Parameters
+    ----------
+        - sinks : list
+            Sinks of the run, the DeltaSinks among them are written
+        - sourcePath : str
+            Comma separated copy of the export, its header is read
+    """
+    deltaSinks = [sink for sink in sinks or [] if isinstance(sink, DeltaSink)]
+    if not deltaSinks:
+        return
+    header = next(csv.reader(iterDecodedLines(iterFileChunks(sourcePath))), None)
+    for sink in deltaSinks:
+        sink.writeEmpty(header or [])
 
 
-def validateDownloadPath(path):
+def writeLocalExport(sourcePath, downloadFilePath, delimiter=',', extraSinks=None, changeDetector=None):
     """
-    Function that will vlidate the custom download path and load defaul if not found.
+    Function that writes the outputs of an export from a local copy instead of downloading it.
     Parameters
     ----------
-        - path : str
-            The custom download path that needs to be validated
+        - sourcePath : str
+            Comma separated copy of the export, as downloaded
+        - downloadFilePath : str
+            Path of the user-delimited output file
+        - delimiter : str
+            Delimiter of that file
+        - extraSinks : list
+            Additional sinks
+        - changeDetector : ChangeDetector
+            When given, the outputs are only written if the copy differs from the last export written
     Returns
     -------
-        - path : str
-            The same path as input if validated and a default download path if invalidated
+        - stats : dict
+            Same as downloadExportedFile's
     """
-    localFrame = inspect.currentframe()
-    if not path.endswith('.csv'):
-        LOGGER.writeLog(
-            "The download path must define the filename as well with '.csv' extension. Switching to default download location.",
-            localFrame.f_lineno, severity='warning')
-        return False
-    return True
+    if changeDetector is not None:
+        _, contentHash = saveChunks(iterFileChunks(sourcePath))
+        if changeDetector.isUnchanged(contentHash):
+            LOGGER.writeLog("Export identical to the last run's ({}), outputs not rewritten.".format(
+                contentHash[:16]), severity='normal')
+            clearDeltas(extraSinks, sourcePath)
+            return {'rows': changeDetector.previous['rows'], 'bytesDownloaded': 0, 'bytesWritten': 0,
+                    'unchanged': True, 'outputs': []}
+    primarySink, inventorySink, sinks = getExportSinks(downloadFilePath, delimiter, extraSinks)
+    with PROFILER.stage('process'):
+        teeWriter = TeeWriter(sinks, columnKinds=getColumnKinds(iterFileChunks(sourcePath)))
+        teeWriter.writeStream(iterFileChunks(sourcePath))
+    if changeDetector is not None:
+        changeDetector.record(contentHash, [primarySink.path, inventorySink.path], teeWriter.rowCount)
+    LOGGER.writeLog("Saved to " + downloadFilePath, severity='normal')
+    LOGGER.writeLog("TSV saved to " + inventorySink.path, severity='normal')
+    return {'rows': teeWriter.rowCount, 'bytesDownloaded': 0, 'bytesWritten': primarySink.bytesWritten,
+            'unchanged': False, 'outputs': [sink.path for sink in sinks]}
 
 
-def validateDelimiter(delimiter):
+def requestExport(data, sureDone, exportCache=None, cacheKey=None):
     """
-    Function that validates the delimiter option input by the user.
-    Main issues to check for is length and make sure that the chosen delimiter is within a list of acceptable options.
+    Function that starts an export, or finds one started by a recent run for the same account and fields.
     Parameters
     ----------
-        - delimiter : str
-            The user-specified delimiter option
-    
+        - data : str
+            Query string built by getDataForExports()
+        - sureDone : SureDone object
+            Object of the SureDone API handler class
+        - exportCache : ExportCache
+            Cache of recent exports. None always starts a new export.
+        - cacheKey : str
+            Key of this export in the cache
     Returns
     -------
-        - delimiter : str
-            The same delimiter if validated and a ',' as a delimiter if not validated.
+        - fileName : str
+            Name of the export file or None if the export couldn't be started
+        - entry : dict
+            The cache entry reused, None when a new export was started
     """
-    localFrame = inspect.currentframe()
-    # Account for '\\t' and '\t'
-    if delimiter == '\\t':
-        delimiter = '\t'
+    entry = exportCache.lookup(cacheKey) if exportCache is not None else None
+    if entry is not None:
+        LOGGER.writeLog("Reusing export {} requested {:.0f} seconds ago.".format(
+            entry['fileName'], time.time() - entry['requestedAt']), severity='normal')
+        return entry['fileName'], entry
 
-    # Check for length
-    if len(delimiter) > 1:
-        LOGGER.writeLog("Length of the delimiter was greater than one character, switching to default ',' delimiter.",
-                        localFrame.f_lineno, severity='warning')
-        delimiter = ','
-        return delimiter
+    # Invoke the GET API call to bulk/exports sub module
+    exportRequestResponse = sureDone.apicall('get', 'bulk/exports{}'.format(data))
+    LOGGER.writeLog("API response recieved.", severity='normal')
 
-    # Check that it's within acceptable options
-    acceptableDelimiters = [',', '\t', ':', ';', '|', ' ']
+    # If the returning JSON wasn't successful, end the code with a generic error.
+    if exportRequestResponse['result'] != 'success':
+        LOGGER.writeLog("Can not export for some reason.", severity='code-breaker',
+                        data={'code': 2, 'response': exportRequestResponse})
+        return None, None
+    fileName = exportRequestResponse['export_file']
+    if exportCache is not None:
+        exportCache.recordRequested(cacheKey, fileName)
+    return fileName, None
+
+
+def waitForExportURL(fileName, sureDone, poller=None):
+    """
+    Function that checks bulk/exports/<fileName> until the export is ready and returns its download URL.
+    Parameters
+    ----------
+        - fileName : str
+            Name of the export file returned by bulk/exports
+        - sureDone : SureDone object
+            Object of the SureDone API handler class
+        - poller : ExportReadinessPoller
+            Decides how long to wait between readiness checks. Defaults to one without history.
+    Returns
+    -------
+        - url : str
+            Download URL of the export or None if it wasn't ready in time
+    """
+    # Waiting for the export to be generated is not a failure, so these delays don't draw from the retry budget
+    if poller is None:
+        poller = ExportReadinessPoller()
+    firstDelay = poller.start()
+    if firstDelay > 0:
+        LOGGER.writeLog("Waited {:.1f} seconds, the usual time this export takes.".format(firstDelay),
+                        severity='normal')
+        LOGGER.metrics.inc('sleep_seconds_total', firstDelay, reason='poll')
+    while True:
+        # Invoke api call to the same module but with a filename and no data
+        fileDownloadURLResponse = sureDone.apicall('get', 'bulk/exports/' + fileName, {})
+
+        # If the result was successfull, the download URL of the file is ready
+        if fileDownloadURLResponse['result'] == 'success':
+            readySeconds = poller.recordReady()
+            LOGGER.writeLog("Export {} ready after {:.1f} seconds and {} checks.".format(
+                fileName, readySeconds, poller.checks + 1), severity='normal')
+            return fileDownloadURLResponse['url']
+
+        # If the api call with the file name in the url wasn't successfull the export isn't ready yet
+        # Wait (shortly at first, longer later) and ask again. Running out of time ends the code
+        delay = poller.wait(fileDownloadURLResponse)
+        if delay is None:
+            LOGGER.writeLog("Can not download.", severity='code-breaker',
+                            data={'code': 2, 'response': fileDownloadURLResponse})
+            return None
+        LOGGER.writeLog('Attempt {} {} - checked again after {:.1f} seconds.'.format(
+            poller.checks, fileDownloadURLResponse, delay), severity='warning')
+        LOGGER.metrics.inc('sleep_seconds_total', delay, reason='poll')
+
+
+def downloadShardedExport(dataFields, shards, downloadFilePath, sureDone, delimiter=',', extraSinks=None,
+                          historyPath=None, pollCap=DEFAULT_POLL_MAX_DELAY):
+    """
+    Function that splits the field list into groups, exports and downloads every group concurrently and joins
+    them back on guid into the same outputs a single export would produce.
+    Narrow exports are generated faster by SureDone than one wide export. Shards are sorted by guid out of core
+    and merged row by row, so memory stays bounded whatever the catalog size. Rows of the output are ordered by guid.
+    Parameters
+    ----------
+        - dataFields : str
+            Comma-separated fields to export
+        - shards : int
+            Number of exports to split the fields into
+        - downloadFilePath : str
+            Path of the user-delimited output file
+        - sureDone : SureDone object
+            Object of the SureDone API handler class
+        - delimiter : str
+            Delimiter of the file saved at downloadFilePath
+        - extraSinks : list
+            Additional OutputSink objects written in the same pass as the two default outputs
+        - historyPath : str
+            Readiness history file for the shards' pollers
+        - pollCap : float
+            Longest wait between two readiness checks of a shard
+    Returns
+    -------
+        - stats : dict
+            Same as downloadExportedFile's, and
+                - outputs : list
+                    Paths of the files written
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    fieldList = normalizeFields(dataFields)
+    if 'guid' not in fieldList:
+        fieldList.insert(0, 'guid')
+    groups = splitFieldGroups(fieldList, shards)
+    LOGGER.writeLog("Exporting {} shards: {}".format(len(groups), [','.join(group) for group in groups]),
+                    severity='normal')
+
+    workDirectory = tempfile.mkdtemp(prefix='suredone_shards_', dir=os.path.dirname(downloadFilePath) or None)
+    try:
+        shardPaths = [os.path.join(workDirectory, 'shard_{}.csv'.format(index)) for index in range(len(groups))]
+        with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+            futures = [pool.submit(fetchShard, sureDone, ','.join(group), path, historyPath, pollCap)
+                       for group, path in zip(groups, shardPaths)]
+            # Raise the first failure, if any
+            bytesDownloaded = sum(future.result() for future in futures)
+        LOGGER.writeLog("All shards downloaded, merging on guid.", severity='normal')
+
+        # The merged export is saved first, so that its columns can be typed before the outputs are written
+        mergedPath = os.path.join(workDirectory, 'merged.csv')
+        shardRows = [iterSortedRows(path, 'guid', workDirectory=workDirectory) for path in shardPaths]
+        with open(mergedPath, 'w', encoding='utf-8', newline='') as mergedFile:
+            csv.writer(mergedFile, lineterminator='\n').writerows(iterMergedRows(shardRows, 'guid',
+                                                                               fieldOrder=fieldList))
+
+        primarySink = OutputSink(downloadFilePath, delimiter=delimiter)
+        inventorySink = getInventorySink(os.path.dirname(downloadFilePath))
+        teeWriter = TeeWriter([primarySink, inventorySink] + list(extraSinks or []),
+                              columnKinds=getColumnKinds(iterFileChunks(mergedPath)))
+        teeWriter.writeStream(iterFileChunks(mergedPath))
+    finally:
+        shutil.rmtree(workDirectory, ignore_errors=True)
+
+    LOGGER.writeLog("Saved to " + downloadFilePath, severity='normal')
+    LOGGER.writeLog("TSV saved to " + inventorySink.path, severity='normal')
+    return {'rows': teeWriter.rowCount, 'bytesDownloaded': bytesDownloaded,
+            'bytesWritten': primarySink.bytesWritten, 'outputs': [sink.path for sink in teeWriter.rowSinks]}
+
+
+def fetchShard(sureDone, fields, path, historyPath=None, pollCap=DEFAULT_POLL_MAX_DELAY):
+    """
+    Function that triggers one shard's export, waits for it and downloads it as it is.
+    Parameters
+    ----------
+        - sureDone : SureDone object
+            Object of the SureDone API handler class
+        - fields : str
+            Comma-separated fields of the shard
+        - path : str
+            Path to save the shard at
+        - historyPath : str
+            Readiness history file
+        - pollCap : float
+            Longest wait between two readiness checks
+    Returns
+    -------
+        - bytesDownloaded : int
+    """
+    data = getDataForExports(fields)
+    exportRequestResponse = sureDone.apicall('get', 'bulk/exports{}'.format(data))
+    if exportRequestResponse['result'] != 'success':
+        raise LoadingError('Shard export failed: {}'.format(exportRequestResponse))
+    poller = ExportReadinessPoller(historyPath=historyPath,
+                                   historyKey=hashlib.sha1(data.encode('utf-8')).hexdigest()[:16], maxDelay=pollCap)
+    url = waitForExportURL(exportRequestResponse['export_file'], sureDone, poller=poller)
+    if url is None:
+        raise LoadingError('Shard export {} was not ready in time.'.format(exportRequestResponse['export_file']))
+    # The shard is only sorted and merged later, its bytes are saved without being parsed
+    sink = RawSink(path)
+    sink.open()
+    try:
+        for chunk in sureDone.iterDownload(url):
+            if chunk:  # filter out keep-alive new chunks
+                sink.writeChunk(chunk)
+    except BaseException:
+        sink.discard()
+        raise
+    sink.commit()
+    return sink.bytesWritten
+
+
+def iterSortedRows(path, keyColumn, runRows=None, workDirectory=None):
+    """
+    Generator that reads a CSV file sorted by one column, without holding more than runRows rows in memory.
+    Rows are sorted in runs that are spilled to temporary files, then the runs are merged.
+    Parameters
+    ----------
+        - path : str
+            Path of a comma separated file with a header
+        - keyColumn : str
+            Column to sort by (string order)
+        - runRows : int
+            Rows sorted in memory at a time. Defaults to what the run's MEMORY_BUDGET allows.
+        - workDirectory : str
+            Directory for the temporary run files
+    Yields
+    ------
+        - row : list
+            The header first, then every data row in key order
+    """
+    runPaths = []
+    run = []
+    try:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as sortedFile:
+            reader = csv.reader(sortedFile)
+            header = next(reader, None)
+            if header is None:
+                return
+            keyIndex = header.index(keyColumn)
+            sortKey = operator.itemgetter(keyIndex)
+            if runRows is None:
+                runRows = MEMORY_BUDGET.getRows('sort', len(header), SORT_RUN_ROWS)
+            yield header
+            for row in reader:
+                # Blank lines are skipped, like pandas does when reading
+                if not row:
+                    continue
+                if len(row) < len(header):
+                    row += [''] * (len(header) - len(row))
+                run.append(row)
+                if len(run) >= runRows:
+                    runPaths.append(writeSortedRun(run, sortKey, workDirectory))
+                    run = []
+
+        run.sort(key=sortKey)
+        if not runPaths:
+            # Everything fit in a single run
+            for row in run:
+                yield row
+            return
+        if run:
+            runPaths.append(writeSortedRun(run, sortKey, workDirectory))
+            run = []
+        runFiles = [open(runPath, 'r', encoding='utf-8', newline='') for runPath in runPaths]
+        try:
+            for row in heapq.merge(*[csv.reader(runFile) for runFile in runFiles], key=sortKey):
+                yield row
+        finally:
+            for runFile in runFiles:
+                runFile.close()
+    finally:
+        for runPath in runPaths:
+            if os.path.exists(runPath):
+                os.remove(runPath)
+
+
+def writeSortedRun(run, sortKey, workDirectory=None):
+    """
+    Function that sorts a run of rows and spills it to a temporary file.
+    Parameters
+    ----------
+        - run : list
+            Rows to sort
+        - sortKey : callable
+            Key function of the sort
+        - workDirectory : str
+            Directory for the temporary file
+    Returns
+    -------
+        - runPath : str
+            Path of the temporary file
+    """
+    run.sort(key=sortKey)
+    descriptor, runPath = tempfile.mkstemp(suffix='.run.csv', dir=workDirectory)
+    with os.fdopen(descriptor, 'w', encoding='utf-8', newline='') as runFile:
+        csv.writer(runFile).writerows(run)
+    return runPath
+
+
+def iterMergedRows(shardRows, keyColumn, fieldOrder=None):
+    """
+    Generator that joins several row streams sorted by the same key column into wide rows (a full outer join).
+    Parameters
+    ----------
+        - shardRows : list
+            Row iterators, each yielding its header first and then its rows sorted by keyColumn
+        - keyColumn : str
+            Column the streams are joined on
+        - fieldOrder : list
+            Order of the output columns. Columns not listed are appended.
+    Yields
+    ------
+        - row : list
+            The merged header first, then one row per key. Values a shard doesn't have for a key are empty.
+    """
+    shardRows = [iter(rows) for rows in shardRows]
+    headers = [next(rows, None) or [keyColumn] for rows in shardRows]
+    keyIndexes = [header.index(keyColumn) for header in headers]
+
+    # Output columns: the requested order first, then anything else the shards returned
+    columns = []
+    for column in list(fieldOrder or []) + [column for header in headers for column in header]:
+        if column not in columns and any(column in header for header in headers):
+            columns.append(column)
+    keyPosition = columns.index(keyColumn)
+    # For every shard, where each of its non-key columns goes in the output
+    placements = [[(columns.index(column), index) for index, column in enumerate(header) if column != keyColumn]
+                  for header in headers]
+    yield columns
+
+    current = [next(rows, None) for rows in shardRows]
+    while True:
+        keys = [row[keyIndexes[index]] for index, row in enumerate(current) if row is not None]
+        if not keys:
+            return
+        key = min(keys)
+        merged = [''] * len(columns)
+        merged[keyPosition] = key
+        for index, row in enumerate(current):
+            if row is None or row[keyIndexes[index]] != key:
+                continue
+            for position, shardIndex in placements[index]:
+                merged[position] = row[shardIndex] if shardIndex < len(row) else ''
+            current[index] = next(shardRows[index], None)
+        yield merged
+
+
+def iterFileChunks(path, chunkSize=FILE_BUFFER_SIZE):
+    """
+    Generator that reads a file in large binary chunks.
+    Parameters
+    ----------
+        - path : str
+            Path of the file
+        - chunkSize : int
+            Bytes per chunk
+    Yields
+    ------
+        - chunk : bytes
+    """
+    with open(path, 'rb') as chunkedFile:
+        while True:
+            chunk = chunkedFile.read(chunkSize)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iterDecodedLines(chunks, encoding='utf-8-sig'):
+    """
+    Generator that turns a stream of byte chunks into text lines as the chunks arrive.
+    Multi-byte characters split across chunks are decoded correctly and a leading BOM is dropped.
+    Parameters
+    ----------
+        - chunks : iterable
+            Byte chunks (bytes or memoryview), e.g. SureDone.iterDownload()
+        - encoding : str
+            Encoding of the stream
+    Yields
+    ------
+        - line : str
+            One line of text, line ending included. A quoted field may span several lines, csv.reader joins them.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    for chunk in chunks:
+        if not chunk:  # filter out keep-alive new chunks
+            continue
+        # The decoder keeps references to undecoded bytes, so a reused buffer (memoryview) is copied once here
+        pending += decoder.decode(bytes(chunk))
+        lines = pending.split('\n')
+        # The last piece is an incomplete line, keep it for the next chunk
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', True)
+    if pending:
+        yield pending
+
+
+# Values pandas' read_csv reads as missing by default, which to_csv then writes as empty fields
+PANDAS_NA_VALUES = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                              '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'])
+# Values pandas' read_csv parses as integers and as floats, and how it writes the booleans it recognizes
+PANDAS_INTEGER_PATTERN = re.compile(r'^[+-]?\d+$')
+PANDAS_FLOAT_PATTERN = re.compile(r'^[+-]?((\d+\.?\d*|\.\d+)([eE][+-]?\d+)?|inf|Inf|INF|infinity|Infinity)$')
+PANDAS_BOOLEAN_VALUES = {'True': 'True', 'TRUE': 'True', 'true': 'True',
+                         'False': 'False', 'FALSE': 'False', 'false': 'False'}
+# Values that look like floats (integers are left out)
+FLOAT_VALUE_PATTERN = re.compile(r'^[+-]?(\d+\.\d*|\.\d+)([eE][+-]?\d+)?$')
+# Values the columnar cache stores as integers: no leading zeros and small enough for int64
+INTEGER_VALUE_PATTERN = re.compile(r'^-?(0|[1-9]\d{0,17})$')
+
+# Type of every SureDone field the script exports by default
+# - int : Counts, nullable integers
+# - float : Prices and measures, written with the float format of the output
+# - category : Few distinct values (conditions, brands, flags, profile and site ids)
+# - string : Free text and identifiers. Identifiers are never read as numbers, so UPCs keep their leading zeros
+#            and long eBay ids aren't rounded.
+# Fields not listed are treated like pandas would: decimal-looking values are formatted as floats.
+EXPORT_SCHEMA = {
+    'guid': 'string', 'stock': 'int', 'price': 'float', 'msrp': 'float', 'cost': 'float', 'title': 'string',
+    'longdescription': 'string', 'condition': 'category', 'brand': 'category', 'upc': 'string',
+    'media1': 'string', 'weight': 'float', 'datesold': 'string', 'totalsold': 'int',
+    'manufacturerpartnumber': 'string', 'warranty': 'category', 'mpn': 'string', 'ebayid': 'string',
+    'ebaysku': 'string', 'ebaycatid': 'category', 'ebaystoreid': 'category', 'ebayprice': 'float',
+    'ebaytitle': 'string', 'ebaystarttime': 'string', 'ebayendtime': 'string', 'ebaysiteid': 'category',
+    'ebaysubtitle': 'string', 'ebaypaymentprofileid': 'category', 'ebayreturnprofileid': 'category',
+    'ebayshippingprofileid': 'category', 'ebaybestofferenabled': 'category', 'ebaybestofferminimumprice': 'float',
+    'ebaybestofferautoacceptprice': 'float', 'ebaybuyitnow': 'category', 'ebayupcnot': 'category',
+    'ebayskip': 'category', 'amznsku': 'string', 'amznasin': 'string', 'amznprice': 'float', 'amznskip': 'category',
+    'walmartskip': 'category', 'walmartprice': 'float', 'walmartcategory': 'category',
+    'walmartdescription': 'string', 'walmartislisted': 'category', 'walmartinprogress': 'category',
+    'walmartstatus': 'category', 'walmarturl': 'string', 'total_stock': 'int',
+}
+
+# pandas dtype of every schema type
+PANDAS_DTYPES = {'int': 'Int64', 'float': 'float64', 'category': 'category', 'string': 'object'}
+
+# Kind of column (see ColumnProfile) the outputs write every schema type as. Integer columns are still profiled:
+# pandas wrote the ones with missing values as floats, and the outputs keep doing so.
+SCHEMA_KINDS = {'float': 'float', 'category': 'text', 'string': 'text'}
+
+
+def getPandasDtypes(columns):
+    """
+    Function that returns the dtypes to read an export with, from EXPORT_SCHEMA.
+    Parameters
+    ----------
+        - columns : list
+            Columns of the export
+    Returns
+    -------
+        - dtypes : dict
+            pandas dtype of every column. Columns missing from the schema are read as strings.
+    """
+    return {column: PANDAS_DTYPES[EXPORT_SCHEMA.get(column, 'string')] for column in columns}
+
+
+def readExport(path, columns=None, delimiter=','):
+    """
+    Function that reads a saved export into a DataFrame typed by EXPORT_SCHEMA instead of inferred dtypes.
+    Parameters
+    ----------
+        - path : str
+            Path of the export
+        - columns : list
+            Columns to read. None reads every column.
+        - delimiter : str
+            Delimiter of the file
+    Returns
+    -------
+        - data : pandas.DataFrame
+    """
+    import pandas as pd
+    header = pd.read_csv(path, sep=delimiter, nrows=0).columns.tolist()
+    columns = [column for column in header if columns is None or column in columns]
+    numeric = [column for column in columns if EXPORT_SCHEMA.get(column) in ('int', 'float')]
+    # Only numeric columns treat empty values as missing, text keeps its empty strings
+    return pd.read_csv(path, sep=delimiter, usecols=columns, dtype=getPandasDtypes(columns), keep_default_na=False,
+                       na_values={column: [''] for column in numeric})
+
+
+def iterExport(path, columns=None, delimiter=',', chunkRows=None):
+    """
+    Generator that reads a saved export in DataFrames of a fixed number of rows, typed like readExport().
+    Used to process exports that don't fit in memory at once.
+    Parameters
+    ----------
+        - path : str
+            Path of the export
+        - columns : list
+            Columns to read. None reads every column.
+        - delimiter : str
+            Delimiter of the file
+        - chunkRows : int
+            Rows per DataFrame. Defaults to what the run's MEMORY_BUDGET allows.
+    Yields
+    ------
+        - data : pandas.DataFrame
+    """
+    import pandas as pd
+    header = pd.read_csv(path, sep=delimiter, nrows=0).columns.tolist()
+    columns = [column for column in header if columns is None or column in columns]
+    numeric = [column for column in columns if EXPORT_SCHEMA.get(column) in ('int', 'float')]
+    if chunkRows is None:
+        chunkRows = MEMORY_BUDGET.getRows('chunks', len(columns), EXPORT_CHUNK_ROWS)
+    reader = pd.read_csv(path, sep=delimiter, usecols=columns, dtype=getPandasDtypes(columns),
+                         keep_default_na=False, na_values={column: [''] for column in numeric}, chunksize=chunkRows)
+    for chunk in reader:
+        yield chunk
+
+
+class ColumnProfile(object):
+    """
+    Finds the dtype pandas' read_csv gives every column of an export, from one pass over its rows, so that outputs
+    written row by row come out the way DataFrame.to_csv wrote them. Columns whose schema type fixes their kind
+    (see SCHEMA_KINDS) aren't profiled: identifiers stay text and prices are floats whatever their values. Kinds of
+    column:
+        - int : Every value is an integer and none is missing
+        - float : Every value is a number, some are decimals or missing (or all of them are missing)
+        - bool : Every value is one of pandas' true and false values
+        - text : Anything else
+    """
+
+    def __init__(self, header, naValues=PANDAS_NA_VALUES, schema=EXPORT_SCHEMA):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - header : list
+                Column names of the export
+            - naValues : set
+                Values read as missing
+            - schema : dict
+                Type of the known columns, see EXPORT_SCHEMA
+        """
+        self.header = header
+        self.naValues = naValues
+        self.fixedKinds = {column: SCHEMA_KINDS[schema[column]] for column in header
+                           if schema.get(column) in SCHEMA_KINDS}
+        # Kinds each column can still be. Columns found to be text are not checked anymore.
+        self.candidates = {index: {'int', 'float', 'bool'} for index, column in enumerate(header)
+                           if column not in self.fixedKinds}
+        self.hasMissing = [False] * len(header)
+        self.hasValue = [False] * len(header)
+
+    def update(self, row):
+        """
+        Function that narrows the kinds of the columns down with one data row.
+        Parameters
+        ----------
+            - row : list
+                Values in the order of the header. Short rows are missing their last values, like pandas reads them.
+        """
+        naValues = self.naValues
+        width = len(row)
+        settled = []
+        for index, kinds in self.candidates.items():
+            value = row[index] if index < width else ''
+            if value in naValues:
+                self.hasMissing[index] = True
+                continue
+            self.hasValue[index] = True
+            if 'int' in kinds and not isPandasInteger(value):
+                kinds.discard('int')
+            if 'float' in kinds and not PANDAS_FLOAT_PATTERN.match(value):
+                kinds.discard('float')
+            if 'bool' in kinds and value not in PANDAS_BOOLEAN_VALUES:
+                kinds.discard('bool')
+            if not kinds:
+                settled.append(index)
+        for index in settled:
+            del self.candidates[index]
+
+    def getKinds(self):
+        """
+        Function that returns the kind of every column.
+        Returns
+        -------
+            - kinds : dict
+                Kind of every column, by name
+        """
+        kinds = {}
+        for index, column in enumerate(self.header):
+            candidates = self.candidates.get(index)
+            if column in self.fixedKinds:
+                kind = self.fixedKinds[column]
+            elif not candidates:
+                kind = 'text'
+            elif not self.hasValue[index]:
+                # Nothing but missing values, pandas reads a column of NaN
+                kind = 'float'
+            elif 'int' in candidates and not self.hasMissing[index]:
+                kind = 'int'
+            elif 'float' in candidates:
+                kind = 'float'
+            elif 'bool' in candidates:
+                kind = 'bool'
+            else:
+                kind = 'text'
+            kinds[column] = kind
+        return kinds
+
+
+def isPandasInteger(value):
+    """ Function that tells if pandas reads a value as an int64. """
+    if not PANDAS_INTEGER_PATTERN.match(value):
+        return False
+    return len(value) < 19 or -2 ** 63 <= int(value) < 2 ** 63
+
+
+def getColumnKinds(chunks):
+    """
+    Function that reads an export once to find the kind of every column, see ColumnProfile.
+    Parameters
+    ----------
+        - chunks : iterable
+            Byte chunks of a comma separated file
+    Returns
+    -------
+        - kinds : dict
+            Kind of every column, by name. Empty for an empty export.
+    """
+    rows = csv.reader(iterDecodedLines(chunks))
+    header = next(rows, None)
+    if header is None:
+        return {}
+    profile = ColumnProfile(header)
+    for row in rows:
+        # Blank lines are skipped, like pandas does when reading
+        if row:
+            profile.update(row)
+    return profile.getKinds()
+
+
+def getValueFormatter(kind, floatFormat=None, naValues=PANDAS_NA_VALUES):
+    """
+    Function that returns how the values of a column are written, the way DataFrame.to_csv writes its dtype.
+    Parameters
+    ----------
+        - kind : str
+            Kind of the column, see ColumnProfile
+        - floatFormat : str
+            %-style format of the values of float columns. None writes them like Python prints floats.
+        - naValues : set
+            Values written as empty fields. None writes every value of a text column as it was received.
+    Returns
+    -------
+        - formatter : callable
+            Takes the value as received, returns the value to write
+    """
+    naValues = naValues if naValues is not None else ()
+
+    def formatText(value):
+        return '' if value in naValues else value
+
+    def formatInteger(value):
+        try:
+            return str(int(value))
+        except ValueError:
+            return formatText(value)
+
+    def formatFloat(value):
+        if value in naValues:
+            return ''
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+        return floatFormat % number if floatFormat is not None else repr(number)
+
+    def formatBoolean(value):
+        return PANDAS_BOOLEAN_VALUES.get(value, formatText(value))
+
+    return {'int': formatInteger, 'float': formatFloat, 'bool': formatBoolean}.get(kind, formatText)
+
+
+class FileSink(object):
+    """
+    Base class of the export outputs. Data is written to a '<path>.<pid>.<token>.part' file of its own and only
+    renamed to the final path, atomically, once the whole export has been written. A failed download never leaves a
+    truncated file behind, and runs writing the same path at the same time never write to the same file.
+    """
+
+    def __init__(self, path):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - path : str
+                Final path of the file
+        """
+        self.path = path
+        self.partPath = None
+        self.file = None
+        self.bytesWritten = 0
+
+    def getPartPath(self):
+        """
+        Function that creates the .part file of this sink next to the final path, the first time it is called.
+        Returns
+        -------
+            - partPath : str
+        """
+        while self.partPath is None:
+            partPath = '{}.{}.{:08x}.part'.format(self.path, os.getpid(), random.getrandbits(32))
+            try:
+                os.close(os.open(partPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+            except FileExistsError:
+                continue
+            self.partPath = partPath
+        return self.partPath
+
+    def close(self):
+        """ Function that flushes and closes the .part file. """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def commit(self):
+        """ Function that moves the completed .part file to the final path and records its size. """
+        self.close()
+        if self.partPath is None:
+            # Never opened, the file at the final path (if any) is left as it is
+            raise LoadingError('Nothing was written to {}.'.format(self.path))
+        os.replace(self.partPath, self.path)
+        self.partPath = None
+        self.bytesWritten = os.path.getsize(self.path)
+
+    def discard(self):
+        """ Function that removes the .part file of a failed write. """
+        self.close()
+        if self.partPath is not None and os.path.exists(self.partPath):
+            os.remove(self.partPath)
+        self.partPath = None
+
+
+class OutputSink(FileSink):
+    """ One delimited output file, fed row by row by a TeeWriter. """
+
+    def __init__(self, path, delimiter=',', quoting=csv.QUOTE_MINIMAL, escapechar=None, floatFormat=None,
+                 columns=None, lineTerminator=os.linesep, encoding='utf-8', naValues=PANDAS_NA_VALUES):
+        """
+        Constructor function. Arguments mirror the ones of pandas' to_csv so outputs can be moved over one to one.
+        Parameters
+        ----------
+            - path : str
+                Path of the file to write
+            - delimiter : str
+                Field separator
+            - quoting : int
+                One of the csv.QUOTE_* constants
+            - escapechar : str
+                Character used to escape delimiters and quotes when quoting is csv.QUOTE_NONE
+            - floatFormat : str
+                %-style format applied to the values of float columns, e.g. '%.2f'. None writes them like Python
+                prints floats.
+            - columns : list
+                Subset (and order) of columns to write. None writes every column.
+            - lineTerminator : str
+                Line ending of the written file
+            - encoding : str
+                Encoding of the written file
+            - naValues : set
+                Values written as empty fields, like pandas does with the values it reads as missing.
+                None writes every value of text columns as it was received.
+        Values are written according to the kind of their column (see ColumnProfile), set in columnKinds by the
+        TeeWriter feeding the sink. Without it, columns take the kind of their schema type, or are written as text.
+        """
+        FileSink.__init__(self, path)
+        self.delimiter = delimiter
+        self.quoting = quoting
+        self.escapechar = escapechar
+        self.floatFormat = floatFormat
+        self.columns = columns
+        self.lineTerminator = lineTerminator
+        self.encoding = encoding
+        self.naValues = naValues
+        self.columnKinds = None
+        self.writer = None
+        self.indices = None
+        self.formatters = []
+
+    def open(self, header):
+        """
+        Function that opens the file and writes the header row.
+        Parameters
+        ----------
+            - header : list
+                Column names of the stream feeding this sink
+        """
+        if self.columns is not None:
+            missing = [column for column in self.columns if column not in header]
+            if missing:
+                LOGGER.writeLog("Columns {} not found in export, skipping them in {}.".format(missing, self.path),
+                                severity='warning')
+            self.indices = [header.index(column) for column in self.columns if column in header]
+            header = [header[index] for index in self.indices]
+        kinds = self.columnKinds or {}
+        self.formatters = [getValueFormatter(kinds.get(column) or SCHEMA_KINDS.get(EXPORT_SCHEMA.get(column), 'text'),
+                                             self.floatFormat, self.naValues)
+                           for column in header]
+        self.file = open(self.getPartPath(), 'w', encoding=self.encoding, newline='')
+        self.writer = self.getWriter()
+        self.writer.writerow(header)
+
+    def getWriter(self):
+        """ Function that builds the csv writer of the open file. """
+        # Like pandas, quotes are plain characters when nothing is quoted, only delimiters are escaped
+        return csv.writer(self.file, delimiter=self.delimiter, quoting=self.quoting, escapechar=self.escapechar,
+                          quotechar=None if self.quoting == csv.QUOTE_NONE else '"',
+                          lineterminator=self.lineTerminator)
+
+    def writeRow(self, row):
+        """
+        Function that writes one data row.
+        Parameters
+        ----------
+            - row : list
+                Values in the order of the header given to open()
+        """
+        self.writer.writerow(self.formatRow(row))
+
+    def formatRow(self, row):
+        """
+        Function that turns a row of the stream into the row this file gets: selected columns, every value
+        written according to the kind of its column.
+        Parameters
+        ----------
+            - row : list
+                Values in the order of the header given to open()
+        Returns
+        -------
+            - row : list
+        """
+        if self.indices is not None:
+            row = [row[index] if index < len(row) else '' for index in self.indices]
+        formatters = self.formatters
+        if len(row) < len(formatters):
+            # Short rows are missing their last values
+            row = row + [''] * (len(formatters) - len(row))
+        return [formatValue(value) for formatValue, value in zip(formatters, row)]
+
+
+class RawSink(FileSink):
+    """ An output file that receives the downloaded bytes exactly as they were sent. """
+
+    def __init__(self, path, hashContent=False):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - path : str
+                Path of the file to write
+            - hashContent : bool
+                Keep the SHA-256 of the bytes received, to check a copy of the file later
+        """
+        FileSink.__init__(self, path)
+        self.hashContent = hashContent
+        self.contentHash = None
+        self.bytesReceived = 0
+
+    def open(self, header=None):
+        if self.file is None:
+            self.file = open(self.getPartPath(), 'wb')
+            self.contentHash = hashlib.sha256() if self.hashContent else None
+            self.bytesReceived = 0
+
+    def writeChunk(self, chunk):
+        self.file.write(chunk)
+        self.bytesWritten += len(chunk)
+        self.bytesReceived += len(chunk)
+        if self.contentHash is not None:
+            self.contentHash.update(chunk)
+
+    def getContentHash(self):
+        """ Function that returns the SHA-256 of the bytes received, in hexadecimal, None if they weren't hashed. """
+        return self.contentHash.hexdigest() if self.contentHash is not None else None
+
+
+class DeltaSink(OutputSink):
+    """
+    An output file that only receives the rows that changed since the previous run, plus the keys of the rows that
+    disappeared. A snapshot of the last export (the hash of every row, indexed by key) is kept in an SQLite file and
+    replaced, atomically, together with the output. The snapshot is read and written row by row, never loaded, so
+    memory doesn't grow with the catalog.
+    Every row written gets a leading 'change' column: added, changed or removed (removed rows only carry their key).
+    """
+
+    def __init__(self, path, snapshotPath, keyColumn='guid', **kwargs):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - path : str
+                Path of the file to write
+            - snapshotPath : str
+                Path of the snapshot of the previous export
+            - keyColumn : str
+                Column identifying a row across runs
+            - kwargs : dict
+                Formatting arguments of OutputSink
+        """
+        OutputSink.__init__(self, path, **kwargs)
+        self.snapshotPath = snapshotPath
+        self.snapshotPartPath = snapshotPath + '.part'
+        self.keyColumn = keyColumn
+        self.keyIndex = None
+        self.width = 0
+        self.snapshot = None
+        self.hasPrevious = False
+        self.counts = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0}
+
+    def open(self, header):
+        self.keyIndex = header.index(self.keyColumn)
+        self.width = len(header)
+        headerHash = hashRow(header)
+        if os.path.exists(self.snapshotPartPath):
+            os.remove(self.snapshotPartPath)
+        self.snapshot = sqlite3.connect(self.snapshotPartPath)
+        self.snapshot.execute('CREATE TABLE meta (headerHash TEXT)')
+        self.snapshot.execute('INSERT INTO meta VALUES (?)', (headerHash,))
+        self.snapshot.execute('CREATE TABLE rows (key TEXT PRIMARY KEY, hash TEXT) WITHOUT ROWID')
+        self.hasPrevious = self.attachPrevious(headerHash)
+        if not self.hasPrevious:
+            LOGGER.writeLog("No snapshot of a previous export with these fields, every row is new in {}.".format(
+                self.path), severity='warning')
+        OutputSink.open(self, ['change'] + header)
+
+    def attachPrevious(self, headerHash):
+        """
+        Function that opens the previous snapshot next to the one being written.
+        Parameters
+        ----------
+            - headerHash : str
+                Hash of the current header. A snapshot taken with other columns can't be compared and is ignored.
+        Returns
+        -------
+            - attached : bool
+        """
+        if not os.path.exists(self.snapshotPath):
+            return False
+        try:
+            self.snapshot.execute('ATTACH DATABASE ? AS previous', (self.snapshotPath,))
+            previousHeader = self.snapshot.execute('SELECT headerHash FROM previous.meta').fetchone()
+        except sqlite3.DatabaseError:
+            return False
+        if previousHeader is None or previousHeader[0] != headerHash:
+            self.snapshot.commit()
+            self.snapshot.execute('DETACH DATABASE previous')
+            return False
+        return True
+
+    def writeRow(self, row):
+        key = row[self.keyIndex] if self.keyIndex < len(row) else ''
+        rowHash = hashRow(row)
+        self.snapshot.execute('INSERT OR REPLACE INTO rows VALUES (?, ?)', (key, rowHash))
+        previousHash = None
+        if self.hasPrevious:
+            previous = self.snapshot.execute('SELECT hash FROM previous.rows WHERE key = ?', (key,)).fetchone()
+            previousHash = previous[0] if previous is not None else None
+        if previousHash is None:
+            change = 'added'
+        elif previousHash != rowHash:
+            change = 'changed'
+        else:
+            self.counts['unchanged'] += 1
+            return
+        self.counts[change] += 1
+        OutputSink.writeRow(self, [change] + row)
+
+    def commit(self):
+        """ Function that appends the removed rows, then moves the output and the new snapshot into place. """
+        if self.writer is not None and self.file is None:
+            # Reopen to append the rows that are gone, TeeWriter closes sinks once the stream ends
+            self.file = open(self.getPartPath(), 'a', encoding=self.encoding, newline='')
+            self.writer = self.getWriter()
+        if self.snapshot is not None:
+            if self.hasPrevious:
+                removedKeys = self.snapshot.execute('SELECT key FROM previous.rows WHERE key NOT IN '
+                                                    '(SELECT key FROM main.rows)')
+                for (key,) in removedKeys:
+                    removed = [''] * self.width
+                    removed[self.keyIndex] = key
+                    self.writer.writerow(['removed'] + removed)
+                    self.counts['removed'] += 1
+            self.snapshot.commit()
+            self.snapshot.close()
+            self.snapshot = None
+        OutputSink.commit(self)
+        if os.path.exists(self.snapshotPartPath):
+            os.replace(self.snapshotPartPath, self.snapshotPath)
+        LOGGER.writeLog("Delta: {added} added, {changed} changed, {removed} removed, {unchanged} unchanged.".format(
+            **self.counts), severity='normal')
+
+    def writeEmpty(self, header):
+        """
+        Function that writes the delta of an export identical to the previous one: the header without any row.
+        Parameters
+        ----------
+            - header : list
+                Column names of the export
+        """
+        OutputSink.open(self, ['change'] + header)
+        self.close()
+        OutputSink.commit(self)
+        LOGGER.writeLog("Delta: export unchanged, no rows written to {}.".format(self.path), severity='normal')
+
+    def discard(self):
+        """ Function that removes the partial output and snapshot, keeping the previous snapshot for next time. """
+        OutputSink.discard(self)
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+        if os.path.exists(self.snapshotPartPath):
+            os.remove(self.snapshotPartPath)
+
+
+def hashRow(row):
+    """
+    Function that returns a short fingerprint of a row's values.
+    Parameters
+    ----------
+        - row : list
+            Values of the row
+    Returns
+    -------
+        - hash : str
+            16 hexadecimal characters
+    """
+    return hashlib.sha1('\x1f'.join(row).encode('utf-8')).hexdigest()[:16]
+
+
+class TeeWriter(object):
+    """ Parses an export once and feeds every row to any number of sinks at the same time. """
+
+    def __init__(self, sinks, columnKinds=None):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - sinks : list
+                OutputSink and RawSink objects to write to
+            - columnKinds : dict
+                Kind of every column of the stream, as returned by getColumnKinds(). Given to the OutputSinks so that
+                they write values like DataFrame.to_csv did. None writes columns by their schema type.
+        """
+        self.rawSinks = [sink for sink in sinks if isinstance(sink, RawSink)]
+        self.rowSinks = [sink for sink in sinks if not isinstance(sink, RawSink)]
+        for sink in self.rowSinks:
+            if isinstance(sink, OutputSink):
+                sink.columnKinds = columnKinds
+        self.bytesRead = 0
+        self.rowCount = 0
+
+    def writeStream(self, chunks):
+        """
+        Function that writes a downloading export to every sink in a single pass.
+        Every sink is committed to its final path only if the whole stream was written, else discarded.
+        Parameters
+        ----------
+            - chunks : iterable
+                Byte chunks of a comma separated file
+        Returns
+        -------
+            - rowCount : int
+                Number of data rows written (header excluded)
+        """
+        for sink in self.rawSinks:
+            sink.open()
+        rowCount = self.writeRows(csv.reader(iterDecodedLines(self.teeChunks(chunks))))
+        PROFILER.addBytes('parse', bytesIn=self.bytesRead)
+        return rowCount
+
+    def commit(self):
+        """ Function that moves every sink's completed file to its final path. """
+        for sink in self.rawSinks + self.rowSinks:
+            sink.commit()
+        PROFILER.addBytes('write', bytesOut=sum(sink.bytesWritten for sink in self.rowSinks))
+
+    def discard(self):
+        """ Function that removes the partial file of every sink. """
+        for sink in self.rawSinks + self.rowSinks:
+            sink.discard()
+
+    def teeChunks(self, chunks):
+        """ Generator that hands every chunk to the raw sinks before it is parsed. """
+        for chunk in chunks:
+            if not chunk:  # filter out keep-alive new chunks
+                continue
+            self.bytesRead += len(chunk)
+            for sink in self.rawSinks:
+                sink.writeChunk(chunk)
+            yield chunk
+
+    def writeRows(self, rows):
+        """
+        Function that writes already parsed rows to every row sink.
+        Every sink is committed to its final path only if all the rows were written, else discarded.
+        Parameters
+        ----------
+            - rows : iterator
+                Rows as lists of str, header first
+        Returns
+        -------
+            - rowCount : int
+                Number of data rows written (header excluded)
+        """
+        try:
+            rowCount = self.feedRows(rows)
+        except BaseException:
+            self.discard()
+            raise
+        self.commit()
+        return rowCount
+
+    def feedRows(self, rows):
+        """ Function that opens the row sinks with the header and writes every following row to them. """
+        rowCount = 0
+        rowSinks = self.rowSinks
+        if PROFILER.enabled:
+            # Parsing, formatting and writing are interleaved row by row, each one's share is timed separately
+            rows = PROFILER.timeIterable('parse', rows)
+            rowSinks = [ProfiledSink(sink) for sink in rowSinks]
+        rows = iter(rows)
+        try:
+            header = next(rows, None)
+            if header is None:
+                # Not even a header, no output is replaced by an empty file
+                raise LoadingError('The export is empty.')
+            for sink in rowSinks:
+                sink.open(header)
+            for row in rows:
+                # Blank lines are skipped, like pandas does when reading
+                if not row:
+                    continue
+                for sink in rowSinks:
+                    sink.writeRow(row)
+                rowCount += 1
+        finally:
+            for sink in rowSinks:
+                sink.close()
+            self.rowCount = rowCount
+            if rowSinks is not self.rowSinks:
+                PROFILER.addTime('transform', sum(sink.transformSeconds for sink in rowSinks), rowCount)
+                PROFILER.addTime('write', sum(sink.writeSeconds for sink in rowSinks), rowCount)
+        return rowCount
+
+
+class ProfiledSink(object):
+    """
+    Stands in for a row sink while the run is profiled, timing how long rows take to format (transform) and to
+    write. Only plain OutputSinks can be split, the time of other sinks all counts as writing.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.transformSeconds = 0.0
+        self.writeSeconds = 0.0
+
+    def open(self, header):
+        self.sink.open(header)
+
+    def close(self):
+        self.sink.close()
+
+    def writeRow(self, row):
+        start = time.perf_counter()
+        if type(self.sink) is OutputSink:
+            row = self.sink.formatRow(row)
+            formatted = time.perf_counter()
+            self.sink.writer.writerow(row)
+            self.transformSeconds += formatted - start
+        else:
+            formatted = start
+            self.sink.writeRow(row)
+        self.writeSeconds += time.perf_counter() - formatted
+
+
+def getInventorySink(directory):
+    """
+    Function that describes suredone_inventory.tsv, the file that SQL Server imports.
+    Parameters
+    ----------
+        - directory : str
+            Directory to write the file in
+    Returns
+    -------
+        - sink : OutputSink
+    """
+    return OutputSink(os.path.join(directory, 'suredone_inventory.tsv'), delimiter='\t', quoting=csv.QUOTE_NONE,
+                      escapechar='\\', floatFormat='%.2f')
+
+
+def getDeltaSink(directory, snapshotPath):
+    """
+    Function that describes suredone_inventory_delta.tsv, the rows of suredone_inventory.tsv that changed since the
+    last run, in the same format.
+    Parameters
+    ----------
+        - directory : str
+            Directory to write the file in
+        - snapshotPath : str
+            Path of the snapshot of the previous export
+    Returns
+    -------
+        - sink : DeltaSink
+    """
+    return DeltaSink(os.path.join(directory, 'suredone_inventory_delta.tsv'), snapshotPath, delimiter='\t',
+                     quoting=csv.QUOTE_NONE, escapechar='\\', floatFormat='%.2f')
+
+
+class ColumnarSink(FileSink):
+    """
+    Keeps the export as an Arrow IPC (Feather v2) file, a typed columnar copy that can be memory-mapped by
+    loadColumnarCache() without parsing any text. Rows are converted in batches, so memory stays bounded.
+    Column types come from EXPORT_SCHEMA, columns not in it are inferred from the first batch. Requires pyarrow.
+    """
+
+    def __init__(self, path, batchRows=None):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - path : str
+                Path of the file to write
+            - batchRows : int
+                Rows converted and written at a time. Defaults to what the run's MEMORY_BUDGET allows.
+        """
+        FileSink.__init__(self, path)
+        self.batchRows = batchRows
+        self.header = None
+        self.batch = []
+        self.schema = None
+        self.writer = None
+        self.failed = False
+
+    def open(self, header):
+        self.header = header
+        self.batch = []
+        if self.batchRows is None:
+            self.batchRows = MEMORY_BUDGET.getRows('columnar', len(header), COLUMNAR_BATCH_ROWS)
+
+    def writeRow(self, row):
+        if self.failed:
+            return
+        self.batch.append(row)
+        if len(self.batch) >= self.batchRows:
+            self.flush()
+
+    def flush(self):
+        """ Function that converts the buffered rows to typed columns and appends them to the file. """
+        import pyarrow
+        import pyarrow.ipc
+        if not self.batch or self.failed:
+            return
+        width = len(self.header)
+        columns = [[row[index] if index < len(row) else '' for row in self.batch] for index in range(width)]
+        self.batch = []
+        if self.schema is None:
+            self.schema = pyarrow.schema([(name, getArrowType(name, values)) for name, values in zip(self.header,
+                                                                                                columns)])
+            self.file = pyarrow.OSFile(self.getPartPath(), 'wb')
+            self.writer = pyarrow.ipc.new_file(self.file, self.schema)
+        try:
+            arrays = [toArrowArray(values, field.type) for values, field in zip(columns, self.schema)]
+        except ValueError as e:
+            # A later batch doesn't fit the types seen in the first one, the cache is skipped for this run
+            LOGGER.writeLog("Columnar cache skipped: {}".format(e), severity='warning')
+            self.failed = True
+            return
+        self.writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        import pyarrow
+        import pyarrow.ipc
+        self.flush()
+        if self.schema is None and self.header is not None and not self.failed:
+            # Header only, keep an empty table with the export's columns
+            self.schema = pyarrow.schema([(name, pyarrow.string()) for name in self.header])
+            self.file = pyarrow.OSFile(self.getPartPath(), 'wb')
+            self.writer = pyarrow.ipc.new_file(self.file, self.schema)
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        FileSink.close(self)
+
+    def commit(self):
+        if self.failed:
+            self.discard()
+            return
+        FileSink.commit(self)
+
+
+def getArrowType(column, values):
+    """
+    Function that picks the Arrow type of a column from EXPORT_SCHEMA, or from its values if it isn't listed.
+    Categories are kept as strings in the file and turned into categoricals by loadColumnarCache().
+    Parameters
+    ----------
+        - column : str
+            Name of the column
+        - values : list
+            Values of the column in the first batch
+    Returns
+    -------
+        - type : pyarrow.DataType
+    """
+    import pyarrow
+    fieldType = EXPORT_SCHEMA.get(column)
+    if fieldType == 'int':
+        return pyarrow.int64()
+    if fieldType == 'float':
+        return pyarrow.float64()
+    if fieldType is not None:
+        return pyarrow.string()
+    return inferColumnType(values)
+
+
+def inferColumnType(values):
+    """
+    Function that picks the narrowest Arrow type that can hold every value of a column.
+    Numbers with leading zeros (UPCs, zip codes) and very long digit strings stay strings.
+    Parameters
+    ----------
+        - values : list
+            Values of the column as str
+    Returns
+    -------
+        - type : pyarrow.DataType
+    """
+    import pyarrow
+    present = [value for value in values if value != '']
+    if present and all(INTEGER_VALUE_PATTERN.match(value) for value in present):
+        return pyarrow.int64()
+    if present and all(INTEGER_VALUE_PATTERN.match(value) or FLOAT_VALUE_PATTERN.match(value) for value in present):
+        return pyarrow.float64()
+    return pyarrow.string()
+
+
+def toArrowArray(values, arrowType):
+    """
+    Function that converts a column of str values to an Arrow array. Empty values become nulls in numeric columns.
+    Parameters
+    ----------
+        - values : list
+            Values of the column as str
+        - arrowType : pyarrow.DataType
+            Type of the column
+    Returns
+    -------
+        - array : pyarrow.Array
+    """
+    import pyarrow
+    if arrowType == pyarrow.int64():
+        return pyarrow.array([int(value) if value != '' else None for value in values], type=arrowType)
+    if arrowType == pyarrow.float64():
+        return pyarrow.array([float(value) if value != '' else None for value in values], type=arrowType)
+    return pyarrow.array(values, type=arrowType)
+
+
+def getColumnarCachePath():
+    """ Function that returns where the columnar copy of the latest export is kept. """
+    return os.path.join(getStateDirectory(), 'latest_export.arrow')
+
+
+def getColumnarSink():
+    """
+    Function that describes the columnar copy of the latest export.
+    Returns
+    -------
+        - sink : ColumnarSink
+            None if pyarrow isn't installed
+    """
+    if importOptional('pyarrow.ipc') is None:
+        LOGGER.writeLog("pyarrow not installed, the columnar cache is not updated.", severity='warning')
+        return None
+    return ColumnarSink(getColumnarCachePath())
+
+
+def loadColumnarCache(columns=None, path=None, asDataFrame=False):
+    """
+    Function that opens the columnar copy of the latest export. The file is memory-mapped, only the columns asked
+    for are touched and nothing is parsed.
+    Parameters
+    ----------
+        - columns : list
+            Names of the columns to return. None returns every column.
+        - path : str
+            File to open. Defaults to the cache written by the last run.
+        - asDataFrame : bool
+            Return a pandas DataFrame, with the schema's category columns as categoricals
+    Returns
+    -------
+        - table : pyarrow.Table or pandas.DataFrame
+    """
+    if importOptional('pyarrow.ipc') is None:
+        raise ImportError('loadColumnarCache requires pyarrow (pip install pyarrow).')
+    import pyarrow
+    source = pyarrow.memory_map(path or getColumnarCachePath(), 'r')
+    table = pyarrow.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    if asDataFrame:
+        return table.to_pandas(categories=[name for name in table.column_names
+                                           if EXPORT_SCHEMA.get(name) == 'category'])
+    return table
+
+
+def transcodeStream(chunks, outputPath, delimiter):
+    """
+    Function that re-delimits a CSV stream into a file, one row at a time.
+    Quoting and escaping follow the csv module's rules, the same ones pandas' to_csv uses.
+    Parameters
+    ----------
+        - chunks : iterable
+            Byte chunks of a comma separated file
+        - outputPath : str
+            Path of the file to write
+        - delimiter : str
+            Delimiter of the written file
+    Returns
+    -------
+        - rowCount : int
+            Number of data rows written (header excluded)
+    """
+    return TeeWriter([OutputSink(outputPath, delimiter=delimiter)]).writeStream(chunks)
+
+
+def parseArgs(argv):
+    """
+    Function that parses the arguments sent from the command line 
+    and returns the behavioral variables to the caller.
+    Parameters
+    ----------
+        - argv : str
+            Arguments sent through the command line
+    
+    Returns
+    -------
+        - waitTime : int
+            The time defined in seconds by the user before which the requests must not timeout if a response is not received from the API
+            Can be float in order to access millisecond scale
+        - configPath : str
+            A custom path to the configuration file containing API keys
+        - delimiter : str
+            A single character that is to be used as the delimiter in the CSVs
+        - outputFilePath : str
+            A custom path to the location where the file needs to be downloaded. Must contain the file name as well.
+        - verbose : bool
+        - preserveOldFiles : bool
+            A boolean variable that will tell the script to keep or remove older downloaded files in the download path
+        - dataFields : str
+            Comma-separated fields to export
+        - outputFileExtension : str
+            Extension of the output file, decided by the delimiter
+        - segments : int
+            Number of parallel connections used to download the export file
+        - pollCap : float
+            Longest wait in seconds between two checks of whether the export is ready
+        - shards : int
+            Number of exports the fields are split into
+        - delta : bool
+            Write the rows that changed since the last run to suredone_inventory_delta.tsv
+        - cacheTTL : float
+            Seconds a finished export is reused by later runs
+        - detectChanges : bool
+            Skip writing the outputs when the downloaded export is identical to the last run's
+        - exitUnchanged : bool
+            Exit with EXIT_CODE_UNCHANGED when the outputs were kept
+        - customOutput : bool
+            The output path was given, rather than named after the time of the run
+        - retention : RetentionManager
+            Purges the previous files of the default download directory before new outputs are written, None to keep
+            them
+    """
+    # Defining options in for command line arguments
+    options = "hw:f:d:o:vpc:r:s:i:n:et:m:aul:"
+    long_options = ["help", "wait=", "file=", 'delimiter=', 'output=', 'verbose', 'preserve', 'fields=',
+                    'retry-budget=', 'segments=', 'poll-cap=', 'shards=', 'delta', 'cache-ttl=', 'memory-limit=', 'always-write',
+                    'exit-unchanged', 'profile', 'cprofile', 'metrics=', 'log-level=', 'keep-files=', 'keep-age=']
+
+    # Arguments
+    waitTime = 15
+    configPath = 'suredone.yaml'
+    customConfigPathFoundAndValidated = False
+    delimiter = ','
+    outputFilePath = ''
+    customOutputPathFoundAndValidated = False
+    verbose = False
+    preserveOldFiles = False
+    defaultOutputFileExtension = '.txt'
+    outputFileExtension = defaultOutputFileExtension
+    defaultFieldsBrief = 'guid,stock,price,msrp,cost,ebayid'
+    defaultFieldsDetailed = 'guid,stock,price,msrp,cost,title,longdescription,condition,brand,upc,media1,weight,' \
+                            'datesold,totalsold,manufacturerpartnumber,warranty,mpn,ebayid,ebaysku,ebaycatid,' \
+                            'ebaystoreid,ebayprice,ebaytitle,ebaystarttime,ebayendtime,ebaysiteid,ebaysubtitle,' \
+                            'ebaypaymentprofileid,ebayreturnprofileid,ebayshippingprofileid,ebaybestofferenabled,' \
+                            'ebaybestofferminimumprice,ebaybestofferautoacceptprice,ebaybuyitnow,ebayupcnot,ebayskip,' \
+                            'amznsku,amznasin,amznprice,amznskip,walmartskip,walmartprice,walmartcategory,' \
+                            'walmartdescription,walmartislisted,walmartinprogress,walmartstatus,walmarturl,total_stock'
+
+    dataFields = defaultFieldsDetailed
+    segments = DEFAULT_SEGMENTS
+    pollCap = DEFAULT_POLL_MAX_DELAY
+    shards = DEFAULT_SHARDS
+    delta = False
+    cacheTTL = DEFAULT_EXPORT_CACHE_TTL
+    detectChanges = True
+    exitUnchanged = False
+    keepFiles = 0
+    keepAge = None
+
+    # Extracting arguments
+    opts = None
+    try:
+        opts, args = getopt.getopt(argv, options, long_options)
+    except getopt.GetoptError:
+        # Not logging here since this is a command-line feature and must be printed on console
+        print("Error in arguments!", file=LOGGER.terminal)
+        print(HELP_MESSAGE, file=LOGGER.terminal)
+        exit()
+
+    for option, value in opts:
+        if option in ('-h', '--help'):
+            # Print help message on the console only, and exit
+            print(HELP_MESSAGE, file=LOGGER.terminal)
+            sys.exit()
+        elif option in ("-w", "--wait"):
+            waitTime = float(value)
+        elif option in ("-f", "--file"):
+            configPath = value
+            customConfigPathFoundAndValidated = validateConfigPath(configPath)
+        elif option in ("-d", "--delimiter"):
+            delimiter = value
+            delimiter = validateDelimiter(delimiter)
+        elif option in ("-o", "--output"):
+            outputFilePath = value
+            customOutputPathFoundAndValidated = validateDownloadPath(outputFilePath)
+        elif option in ("-p", "--preserve"):
+            preserveOldFiles = True
+        elif option in ("-v", "--verbose"):
+            verbose = True
+            # Updating logger's behavior based on verbose
+            LOGGER.verbose = verbose
+        elif option in ("-l", "--log-level"):
+            if value not in SEVERITY_LEVELS:
+                print("Error in arguments! Log level must be one of: normal, warning, error, code-breaker",
+                      file=LOGGER.terminal)
+                print(HELP_MESSAGE, file=LOGGER.terminal)
+                exit()
+            # Entries less severe than the level are dropped
+            LOGGER.setLevel(value)
+        elif option in ("-c", "--fields"):
+            dataFields = validateFields(value, defaultFieldsDetailed)
+        elif option in ("-r", "--retry-budget"):
+            # Updating the run's retry budget shared by every api call
+            RETRY_BUDGET.maxSeconds = float(value)
+        elif option in ("-s", "--segments"):
+            segments = max(1, int(value))
+        elif option in ("-i", "--poll-cap"):
+            pollCap = max(1.0, float(value))
+        elif option in ("-n", "--shards"):
+            shards = max(1, int(value))
+        elif option in ("-e", "--delta"):
+            delta = True
+        elif option in ("-t", "--cache-ttl"):
+            cacheTTL = max(0.0, float(value))
+        elif option in ("-m", "--memory-limit"):
+            # Updating the run's memory budget read by every buffered step
+            MEMORY_BUDGET.maxMegabytes = max(1.0, float(value))
+        elif option in ("-a", "--always-write"):
+            detectChanges = False
+        elif option in ("-u", "--exit-unchanged"):
+            exitUnchanged = True
+        elif option == "--keep-files":
+            keepFiles = max(0, int(value))
+        elif option == "--keep-age":
+            keepAge = max(0.0, float(value))
+        elif option in ("--profile", "--cprofile"):
+            # Profiling the run, the report is written at exit
+            PROFILER.enable(*getReportPaths(LOGGER.getLog().name, cProfile=option == '--cprofile'))
+        elif option == "--metrics":
+            # Recording the run's metrics, the .prom file is written at exit
+            LOGGER.metrics.enable(value)
+            PROFILER.addListener(LOGGER.metrics.observeStage)
+
+    # Determine the output file extension based on the delimiter chosen
+    if delimiter == '\t':
+        outputFileExtension = '.tsv'
+    elif delimiter == ',':
+        outputFileExtension = '.csv'
+
+    # If custom path to config file wasn't found, search in default locations
+    if not customConfigPathFoundAndValidated:
+        configPath = getDefaultConfigPath()
+    retention = None
+    if not customOutputPathFoundAndValidated:
+        outputFilePath = getDefaultDownloadPath(extension=outputFileExtension)
+        if not preserveOldFiles:
+            retention = RetentionManager(os.path.dirname(outputFilePath), EXPORT_RETENTION_PATTERNS,
+                                         keepNewest=keepFiles, maxAge=keepAge)
+
+    return waitTime, configPath, delimiter, outputFilePath, preserveOldFiles, verbose, dataFields, \
+        outputFileExtension, segments, pollCap, shards, delta, cacheTTL, detectChanges, exitUnchanged, \
+        customOutputPathFoundAndValidated, retention
+
+
+def validateFields(inputString, defaultFields):
+    """
+    Function to check if the fields String is properly formatted (each word separated by a comma) with no
+    special characters involved.
+
+    :param inputString: str: String inputted in commandline
+    :param defaultFields: str: Default fields decided
+    :return: Same input string if successfully validated else the default fields.
+    """
+    fieldsList = inputString.split(',')
+
+    for field in fieldsList:
+        # Check if this field contains an alphabet
+        if not re.search('[a-zA-Z]', field):
+            LOGGER.writeLog("Error found in [{}] field. Reverting to defaults.", severity='warning')
+            return defaultFields
+
+        # Check that it only contains alphanumeric characters
+        if not re.match('[a-zA-Z0-9_]', field):
+            LOGGER.writeLog("Error found in [{}] field. Reverting to defaults.", severity='warning')
+            return defaultFields
+    return inputString
+
+
+def validateDownloadPath(path):
+    """
+    Function that will vlidate the custom download path and load defaul if not found.
+    Parameters
+    ----------
+        - path : str
+            The custom download path that needs to be validated
+    Returns
+    -------
+        - path : str
+            The same path as input if validated and a default download path if invalidated
+    """
+    if not path.endswith('.csv'):
+        LOGGER.writeLog(
+            "The download path must define the filename as well with '.csv' extension. Switching to default download location.",
+            severity='warning')
+        return False
+    return True
+
+
+def validateDelimiter(delimiter):
+    """
+    Function that validates the delimiter option input by the user.
+    Main issues to check for is length and make sure that the chosen delimiter is within a list of acceptable options.
+    Parameters
+    ----------
+        - delimiter : str
+            The user-specified delimiter option
+    
+    Returns
+    -------
+        - delimiter : str
+            The same delimiter if validated and a ',' as a delimiter if not validated.
+    """
+    # Account for '\\t' and '\t'
+    if delimiter == '\\t':
+        delimiter = '\t'
+
+    # Check for length
+    if len(delimiter) > 1:
+        LOGGER.writeLog("Length of the delimiter was greater than one character, switching to default ',' delimiter.",
+                        severity='warning')
+        delimiter = ','
+        return delimiter
+
+    # Check that it's within acceptable options
+    acceptableDelimiters = [',', '\t', ':', ';', '|', ' ']
+
+    if delimiter not in acceptableDelimiters:
+        LOGGER.writeLog("Delimiter was not selected from acceptable options, switching to ',' default delimiter.",
+                        severity='warning')
+        delimiter = ','
+        return delimiter
+
+    return delimiter
+
+
+def validateConfigPath(configPath):
+    """
+    Function to validate the provided config file path.
+    Parameters
+    ----------
+        - configPath : str
+            Path to the configuration file
+    Returns
+    -------
+        - validated : bool
+            A True or False as a result of the validation of the path
+    """
+    # Check extension, must be YAML
+    if not configPath.endswith('yaml'):
+        LOGGER.writeLog(
+            "Configuration file must be .yaml extension.\nLooking for configuration file in default locations.",
+            severity='error')
+        return False
+
+    # Check if file exists
+    if not os.path.exists(configPath):
+        LOGGER.writeLog(
+            "Specified path to the configuration file is invalid.\nLooking for configuration file in default locations.",
+            severity='error')
+        return False
+    else:
+        return True
+
+
+def getDefaultConfigPath():
+    """
+    Function to validate the provided config file path.
+    Returns
+    -------
+        - configPath : str
+            Path to the configuration file if found in the default locations
+    """
+    fileName = 'suredone.yaml'
+    # Check in current directory
+    directory = os.getcwd()
+    configPath = os.path.join(directory, fileName)
+    if os.path.exists(configPath):
+        return configPath
+
+    # Check in alternative locations
+    if sys.platform == 'win32' or sys.platform == 'win64':  # Windows
+        directory = os.path.expandvars(r'%LOCALAPPDATA%')
+        configPath = os.path.join(directory, fileName)
+        if os.path.exists(configPath):
+            return configPath
+    elif sys.platform == 'linux' or sys.platform == 'linux2':  # Linux
+        directory = expanduser('~')
+        configPath = os.path.join(directory, fileName)
+        if os.path.exists(configPath):
+            return configPath
+    else:
+        LOGGER.writeLog(
+            "Platform couldn't be recognized. Are you sure you are running this script on Windows or Ubuntu Linux?",
+            severity='code-breaker', data={'code': 1})
+        exit()
+
+    LOGGER.writeLog(
+        "suredone.yaml config file wasn't found in default locations!\nSpecify a path to configuration file using (-f --file) argument.",
+        severity='code-breaker', data={'code': 1})
+    exit()
+
+
+def getStateDirectory():
+    """
+    Function that determines the directory where the script keeps what it remembers between runs.
+    Will also create the directory if it isn't present.
+    Returns
+    -------
+        - stateDirectory : str
+            - Windows: %LOCALAPPDATA%/suredone_download
+            - Linux: $HOME/.suredone_download
+    """
+    if sys.platform == 'win32' or sys.platform == 'win64':  # Windows
+        stateDirectory = os.path.join(os.path.expandvars(r'%LOCALAPPDATA%'), 'suredone_download')
+    else:
+        stateDirectory = os.path.join(expanduser('~'), '.suredone_download')
+    if not os.path.exists(stateDirectory):
+        os.makedirs(stateDirectory)
+    return stateDirectory
+
+
+""" Custom Exceptions that will be caught by the script """
+
+
+class Logger(object):
+    """ The logger class that will handle all outputs, may it be console or log file. """
+
+    def __init__(self, verbose=False, metrics=None, level='normal'):
+        self.terminal = sys.stdout
+        # Opened by the first entry, so that runs stopping at the arguments (e.g. --help) leave no log file behind
+        self.log = None
+        # Shards and download segments may write the first entry from worker threads
+        self.openLock = threading.Lock()
+        self.verbose = verbose
+        # Entries less severe than the level are dropped
+        self.level = SEVERITY_LEVELS[level]
+        # Counters and histograms of the run, fed along with the log and written with --metrics
+        self.metrics = metrics if metrics is not None else MetricsEmitter('suredone_download')
+
+    def setLevel(self, level):
+        """
+        Function that sets the least severe entries still logged.
+        Parameters
+        ----------
+            - level : str
+                'normal', 'warning', 'error' or 'code-breaker'
+        """
+        self.level = SEVERITY_LEVELS[level]
+
+    def isEnabledFor(self, severity):
+        """ Function that tells whether entries of a severity are logged, to skip building costly messages. """
+        return SEVERITY_LEVELS.get(severity, 0) >= self.level
+
+    def getLogPath(self):
+        """
+        Function that will determine the default log file path based on the operating system being used.
+        Will also create appropriate directories they aren't present.
+        Returns
+        -------
+            - logFile : fileIO
+                File IO for the whole script to log to.
+        """
+        # Define the file name for logging
+        temp = datetime.now().strftime('%Y_%m_%d-%H-%M-%S')
+        logFileName = "suredone_download_" + temp + ".log"
+
+        # If the platform is windows, set the log file path to the current user's Downloads/log folder
+        if sys.platform == 'win32' or sys.platform == 'win64':  # Windows
+            logFilePath = os.path.expandvars(r'%USERPROFILE%')
+            logFilePath = os.path.join(logFilePath, 'Downloads')
+            logFilePath = os.path.join(logFilePath, 'log')
+            if os.path.exists(logFilePath):
+                return os.path.join(logFilePath, logFileName)
+            else:  # Create the log directory
+                os.mkdir(logFilePath)
+                return os.path.join(logFilePath, logFileName)
+
+        # If Linux, set the download path to the $HOME/downloads folder
+        elif sys.platform == 'linux' or sys.platform == 'linux2':  # Linux
+            logFilePath = expanduser('~')
+            logFilePath = os.path.join(logFilePath, 'log')
+            if os.path.exists(logFilePath):
+                return os.path.join(logFilePath, logFileName)
+            else:  # Create the log directory
+                os.mkdir(logFilePath)
+                return os.path.join(logFilePath, logFileName)
+
+    def getLog(self):
+        """
+        Function that returns the writer of the log file, opening the file and writing its header on first use.
+        Returns
+        -------
+            - log : BatchedLogWriter
+                Entries are queued and written in batches by a background thread, see logwriter.py
+        """
+        if self.log is None:
+            with self.openLock:
+                if self.log is None:
+                    log = BatchedLogWriter(self.getLogPath())
+                    # Write the header row
+                    log.write(' Ind. |LineNo.| Time stamp  : Message')
+                    log.write('\n=====================================\n')
+                    self.log = log
+        return self.log
+
+    def write(self, message):
+        if self.verbose:
+            self.terminal.write(message)
+            self.terminal.flush()
+        self.getLog().write(message)
+
+    def writeLog(self, message, lineNumber=None, severity='normal', data=None):
+        """
+        Function that writes out to the log file and console based on verbose.
+        The function will change behavior slightly based on severity of the message.
+        Entries below the logger's level are dropped before anything else is done, the others are queued and
+        formatted by the writer thread.
+        Parameters
+        ----------
+            - message : str
+                Message to write
+            - lineNumber : int
+                Line the message is logged from. Defaults to the caller's line.
+            - severity : str
+                Defines what the message is related to. Is the message:
+                    - [N] : A 'normal' notification
+                    - [W] : A 'warning'
+                    - [E] : An 'error'
+                    - [!] : A 'code-breaker error' (errors that are followed by the script exitting)
+            - data : dict
+                A dictionary that will contain additional information when a code-breaker error occurs
+                Attributes:
+                    - code : error code
+                        1 : Generic error, only print the message.
+                        2 : An API call was not successful. Response object attached.
+                        3 : YAML loading error. Error object attached
+                    - response : str
+                        JSON-like str - the response recieved from the request in conern at the point of error.
+                    - error : str
+                        String produced by exception if an exception occured
+        """
+        if SEVERITY_LEVELS.get(severity, 0) < self.level:
+            return
+        if lineNumber is None:
+            lineNumber = sys._getframe(1).f_lineno
+
+        details = None
+        if severity == 'code-breaker' and data is not None:
+            if data['code'] == 2:  # Response recieved but unsuccessful
+                details = data['response']
+            elif data['code'] == 3:  # YAML loading error
+                details = data['error']
+
+        # Queue the entry, the writer thread formats it
+        self.getLog().put((time.time(), severity, lineNumber, message, details))
+        self.metrics.inc('log_messages_total', severity=severity)
+        if self.verbose:
+            self.terminal.write(message + '\n')
+            self.terminal.flush()
+
+    def getCurrentTimestamp(self):
+        """
+        Simple function that calculates the current time stamp and simply formats it as a string and returns.
+        Mainly aimed for logging.
+        Returns
+        -------
+            - timestamp : str
+                A formatted string of current time
+        """
+        return datetime.now().strftime("%H:%M:%S.%f")[:-3]
+
+    def exceptionLogger(self, exctype, value, traceBack):
+        """
+        A simple printing function that will take place of the sys.excepthook function and print the results to the log instead of the console.
+        Parameters
+        ----------
+            - exctype : object
+                Exception type and details
+            - Value : str
+                The error passed while the exception was raised
+            - traceBack : traceback object
+                Contains information about the stack trace.
+        """
+        LOGGER.write('Exception Occured! Details follow below.\n')
+        LOGGER.write('Type:{}\n'.format(exctype))
+        LOGGER.write('Value:{}\n'.format(value))
+        LOGGER.write('Traceback:\n')
+        for i in traceback.format_list(traceback.extract_tb(traceBack)):
+            LOGGER.write(i)
+        # The process is about to exit, write out everything queued so far
+        LOGGER.flush()
+
+    def flush(self):
+        # This flush method is needed for python 3 compatibility.
+        # Writes out the entries still queued for the log file.
+        if self.log is not None:
+            self.log.flush()
+
+
+class LoadingError(Exception):
+    pass
+
+
+class UnauthorizedError(Exception):
+    pass
+
+
+class IncompleteDownloadError(LoadingError):
+    pass
+
+
+class RetryBudget(object):
+    """ Caps the total time a run spends sleeping between retries. Shared by every policy that is given it. """
+
+    def __init__(self, maxSeconds=DEFAULT_RETRY_BUDGET):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - maxSeconds : float
+                Total seconds of retry delays allowed for the whole run
+        """
+        self.maxSeconds = maxSeconds
+        self.spent = 0.0
+        self.lock = threading.Lock()
+
+    def consume(self, delay):
+        """
+        Function that takes a delay out of the budget.
+        Parameters
+        ----------
+            - delay : float
+                Seconds the caller wants to sleep
+        Returns
+        -------
+            - delay : float
+                The delay granted (trimmed to what is left) or None once the budget is exhausted
+        """
+        with self.lock:
+            remaining = self.maxSeconds - self.spent
+            if remaining <= 0:
+                return None
+            delay = min(delay, remaining)
+            self.spent += delay
+            return delay
+
+
+class MemoryBudget(object):
+    """
+    Sizes the row buffers of a run (sort runs of sharded exports, columnar cache batches, DataFrame chunks) so that
+    together they stay under a memory ceiling, whatever the size of the catalog. Everything else streams.
+    """
+
+    # Part of the ceiling each buffer may use
+    SHARES = {'sort': 0.5, 'columnar': 0.25, 'chunks': 0.25}
+
+    def __init__(self, maxMegabytes=DEFAULT_MEMORY_LIMIT):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - maxMegabytes : float
+                Memory the buffers may hold together. None keeps their default sizes.
+        """
+        self.maxMegabytes = maxMegabytes
+
+    def getRows(self, buffer, width, default):
+        """
+        Function that returns how many rows a buffer may hold.
+        Parameters
+        ----------
+            - buffer : str
+                'sort', 'columnar' or 'chunks'
+            - width : int
+                Values per row
+            - default : int
+                Size used when no ceiling is set
+        Returns
+        -------
+            - rows : int
+        """
+        if self.maxMegabytes is None:
+            return default
+        rows = int(self.maxMegabytes * 1024 * 1024 * self.SHARES[buffer] / (max(width, 1) * ROW_VALUE_BYTES))
+        return max(rows, MIN_BUFFER_ROWS)
+
+
+class RetryPolicy(object):
+    """
+    Exponential backoff with full jitter: the n-th retry sleeps a random time between 0 and
+    min(maxDelay, baseDelay * multiplier ** n), so that jobs failing at the same moment don't retry in lockstep.
+    Every delay is recorded in history for tuning.
+    Subclass and override getDelay() or shouldRetry() to plug in a different strategy.
+    """
+
+    def __init__(self, maxAttempts=3, baseDelay=1.0, maxDelay=60.0, multiplier=2.0, retryStatuses=None,
+                 connectErrorsOnly=False, budget=None, sleep=time.sleep):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - maxAttempts : int
+                Number of retries allowed after the first attempt
+            - baseDelay : float
+                Upper bound of the first delay in seconds
+            - maxDelay : float
+                Upper bound of any single delay in seconds
+            - multiplier : float
+                Growth factor of the delay's upper bound per retry
+            - retryStatuses : tuple
+                HTTP status codes that may be retried. None retries every unsuccessful status.
+            - connectErrorsOnly : bool
+                Only retry exceptions raised before the request reached the server (connect timeouts).
+                Used for non-idempotent requests so that a write is never sent twice.
+            - budget : RetryBudget
+                Budget the delays are taken from. None doesn't cap the total.
+            - sleep : callable
+                Function used to wait
+        """
+        self.maxAttempts = maxAttempts
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.multiplier = multiplier
+        self.retryStatuses = retryStatuses
+        self.connectErrorsOnly = connectErrorsOnly
+        self.budget = budget
+        self.sleep = sleep
+        self.history = []
+
+    def getDelay(self, attempt):
+        """
+        Function that draws the delay before a retry.
+        Parameters
+        ----------
+            - attempt : int
+                Number of retries already made (0 for the first retry)
+        Returns
+        -------
+            - delay : float
+                Seconds to sleep
+        """
+        ceiling = min(self.maxDelay, self.baseDelay * (self.multiplier ** attempt))
+        return random.uniform(0, ceiling)
+
+    def shouldRetry(self, attempt, statusCode=None, error=None):
+        """
+        Function that decides if a failed request may be sent again.
+        Parameters
+        ----------
+            - attempt : int
+                Number of retries already made
+            - statusCode : int
+                HTTP status of the failed response, if one was received
+            - error : Exception
+                Exception raised by the request, if any
+        Returns
+        -------
+            - retry : bool
+        """
+        if attempt >= self.maxAttempts:
+            return False
+        if error is not None:
+            if self.connectErrorsOnly:
+                return isinstance(error, getConnectErrors())
+            return True
+        if self.retryStatuses is None:
+            return True
+        return statusCode in self.retryStatuses
+
+    def wait(self, attempt, reason, endpoint=''):
+        """
+        Function that sleeps before a retry and records the delay.
+        Parameters
+        ----------
+            - attempt : int
+                Number of retries already made
+            - reason : str
+                Short description of the failure
+            - endpoint : str
+                What was being requested
+        Returns
+        -------
+            - delay : float
+                Seconds slept or None if the budget didn't allow another retry
+        """
+        delay = self.reserveDelay(attempt, reason, endpoint=endpoint)
+        if delay is not None:
+            self.sleep(delay)
+        return delay
+
+    def reserveDelay(self, attempt, reason, endpoint=''):
+        """
+        Function that draws the delay before a retry, takes it from the budget and records it, without sleeping.
+        Used directly by callers that wait in their own way (e.g. asyncio.sleep).
+        Parameters
+        ----------
+            - attempt : int
+                Number of retries already made
+            - reason : str
+                Short description of the failure
+            - endpoint : str
+                What was being requested
+        Returns
+        -------
+            - delay : float
+                Seconds to wait or None if the budget doesn't allow another retry
+        """
+        delay = self.getDelay(attempt)
+        if self.budget is not None:
+            delay = self.budget.consume(delay)
+            if delay is None:
+                return None
+        self.history.append({'time': datetime.now().strftime('%H:%M:%S.%f')[:-3], 'endpoint': endpoint,
+                             'attempt': attempt + 1, 'reason': reason, 'delay': round(delay, 3)})
+        return delay
+
+
+def recordRetry(statusCode, delay):
+    """
+    Function that counts a retry and its backoff in the run's metrics.
+    Parameters
+    ----------
+        - statusCode : int
+            HTTP status of the failed response, None for connection errors and broken downloads
+        - delay : float
+            Seconds waited before the retry
+    """
+    LOGGER.metrics.inc('retries_total', cause=statusCode if statusCode is not None else 'error')
+    LOGGER.metrics.inc('sleep_seconds_total', delay, reason='retry')
+
+
+def getConnectErrors():
+    """
+    Function that lists the exceptions raised when a request never reached the server, for both HTTP clients.
+    Returns
+    -------
+        - errors : tuple
+            Exception classes
+    """
+    import requests
+    aiohttp = importOptional('aiohttp')
+    if aiohttp is None:
+        return (requests.exceptions.ConnectTimeout,)
+    return (requests.exceptions.ConnectTimeout, aiohttp.ClientConnectorError)
+
+
+def getDefaultRetryPolicies():
+    """
+    Function that builds the default retry policies, both drawing from the run's RETRY_BUDGET.
+    Returns
+    -------
+        - policies : dict
+            - get : RetryPolicy
+                Idempotent requests. Retries connection errors and any unsuccessful status.
+            - write : RetryPolicy
+                PUT/POST/DELETE. Retries only when the request never reached the server or the server said
+                it was unavailable.
+            - download : RetryPolicy
+                Export file downloads. Every retry resumes from the last byte received.
+    """
+    return {
+        'get': RetryPolicy(maxAttempts=3, baseDelay=2.0, maxDelay=60.0, budget=RETRY_BUDGET),
+        'write': RetryPolicy(maxAttempts=2, baseDelay=2.0, maxDelay=30.0, retryStatuses=(502, 503, 504),
+                             connectErrorsOnly=True, budget=RETRY_BUDGET),
+        'download': RetryPolicy(maxAttempts=5, baseDelay=1.0, maxDelay=30.0, budget=RETRY_BUDGET),
+    }
+
+
+class ExportReadinessPoller(object):
+    """
+    Decides how long to wait between two checks of whether an export is ready to download.
+    The delay starts short and grows geometrically up to a cap. Progress or ETA hints in the API's response are
+    used when present. How long every export took to become ready is saved, per field set, so that the next run
+    can wait about as long as exports usually take before its first check.
+    """
+
+    # Response keys that may carry the seconds left or the percentage done
+    ETA_KEYS = ('eta', 'eta_seconds', 'estimated_time', 'time_remaining', 'remaining')
+    PROGRESS_KEYS = ('progress', 'percent', 'percent_complete', 'percentage')
+
+    # Shards poll concurrently and share one history file, its updates are made one at a time
+    historyLock = threading.Lock()
+
+    def __init__(self, historyPath=None, historyKey='', initialDelay=DEFAULT_POLL_INITIAL_DELAY,
+                 maxDelay=DEFAULT_POLL_MAX_DELAY, factor=DEFAULT_POLL_FACTOR, maxWait=DEFAULT_POLL_MAX_WAIT,
+                 clock=time.monotonic, sleep=time.sleep):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - historyPath : str
+                JSON file with the readiness times of earlier exports. None keeps no history.
+            - historyKey : str
+                Identifies the kind of export (e.g. its field set) in the history
+            - initialDelay : float
+                Seconds before the first check when there is no history
+            - maxDelay : float
+                Cap of the delay between two checks
+            - factor : float
+                Growth of the delay after every unsuccessful check
+            - maxWait : float
+                Seconds to wait in total before giving up
+            - clock : callable
+                Monotonic clock returning seconds
+            - sleep : callable
+                Function used to wait
+        """
+        self.historyPath = historyPath
+        self.historyKey = historyKey
+        self.initialDelay = initialDelay
+        self.maxDelay = maxDelay
+        self.factor = factor
+        self.maxWait = maxWait
+        self.clock = clock
+        self.sleep = sleep
+        self.startedAt = clock()
+        self.delay = initialDelay
+        self.checks = 0
+
+    def start(self):
+        """
+        Function that starts the clock and sleeps before the first check, as long as exports like this one
+        usually take to become ready.
+        Returns
+        -------
+            - delay : float
+                Seconds slept
+        """
+        delay = self.reserveStart()
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+    def reserveStart(self):
+        """
+        Function that starts the clock and picks the delay before the first check, without sleeping.
+        Returns
+        -------
+            - delay : float
+                Seconds to wait
+        """
+        self.startedAt = self.clock()
+        return self.getFirstDelay()
+
+    def getFirstDelay(self):
+        """
+        Function that guesses when the export will be ready from the history of earlier exports.
+        Returns
+        -------
+            - delay : float
+                A bit less than the median readiness time, 0 if there is no history
+        """
+        import statistics
+        durations = self.loadHistory().get(self.historyKey, [])
+        if not durations:
+            return 0.0
+        return min(statistics.median(durations) * 0.8, self.maxWait)
+
+    def getNextDelay(self, response):
+        """
+        Function that picks the delay before the next check.
+        Parameters
+        ----------
+            - response : dict
+                The API's answer to the last check
+        Returns
+        -------
+            - delay : float
+        """
+        hint = self.getHint(response)
+        if hint is not None:
+            delay = hint
+        else:
+            delay = self.delay
+            self.delay = min(self.delay * self.factor, self.maxDelay)
+        return max(0.5, min(delay, self.maxDelay))
+
+    def getHint(self, response):
+        """
+        Function that reads the seconds left from ETA or progress fields, if the API sent any.
+        Parameters
+        ----------
+            - response : dict
+                The API's answer to the last check
+        Returns
+        -------
+            - seconds : float
+                Estimated seconds until the export is ready or None
+        """
+        if not isinstance(response, dict):
+            return None
+        for key in self.ETA_KEYS:
+            try:
+                return float(response[key])
+            except (KeyError, TypeError, ValueError):
+                continue
+        for key in self.PROGRESS_KEYS:
+            try:
+                progress = float(str(response[key]).rstrip('%'))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 0 < progress < 100:
+                # Extrapolate the time taken so far to the part that is left
+                elapsed = self.clock() - self.startedAt
+                return elapsed * (100 - progress) / progress
+        return None
+
+    def wait(self, response):
+        """
+        Function that sleeps until the next check.
+        Parameters
+        ----------
+            - response : dict
+                The API's answer to the last check
+        Returns
+        -------
+            - delay : float
+                Seconds slept or None once maxWait has passed
+        """
+        delay = self.reserveWait(response)
+        if delay is not None:
+            self.sleep(delay)
+        return delay
+
+    def reserveWait(self, response):
+        """
+        Function that counts a failed check and picks the delay before the next one, without sleeping.
+        Parameters
+        ----------
+            - response : dict
+                The API's answer to the last check
+        Returns
+        -------
+            - delay : float
+                Seconds to wait or None once maxWait has passed
+        """
+        self.checks += 1
+        remaining = self.maxWait - (self.clock() - self.startedAt)
+        if remaining <= 0:
+            return None
+        return min(self.getNextDelay(response), remaining)
+
+    def recordReady(self):
+        """
+        Function that saves how long this export took to become ready.
+        Returns
+        -------
+            - seconds : float
+        """
+        seconds = self.clock() - self.startedAt
+        if self.historyPath is None:
+            return seconds
+        with self.historyLock:
+            history = self.loadHistory()
+            durations = history.get(self.historyKey, []) + [round(seconds, 3)]
+            history[self.historyKey] = durations[-POLL_HISTORY_SIZE:]
+            writeJSONAtomically(self.historyPath, history)
+        return seconds
+
+    def loadHistory(self):
+        if self.historyPath is None or not os.path.exists(self.historyPath):
+            return {}
+        try:
+            with open(self.historyPath, 'r') as historyFile:
+                return json.load(historyFile)
+        except (IOError, ValueError):
+            return {}
+
+
+def writeJSONAtomically(path, content):
+    """
+    Function that writes a JSON file through a temporary file, so a reader never sees it half written.
+    Parameters
+    ----------
+        - path : str
+            Path of the file
+        - content : dict
+            JSON serializable content
+    """
+    # Every writer, process or thread, gets its own temporary file next to the final one
+    descriptor, temporaryPath = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                                 dir=os.path.dirname(path) or None)
+    try:
+        with os.fdopen(descriptor, 'w') as temporaryFile:
+            json.dump(content, temporaryFile, indent=1)
+        os.replace(temporaryPath, path)
+    except BaseException:
+        if os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+        raise
+
+
+class ExportCache(object):
+    """
+    Remembers the exports requested by recent runs, keyed by account and field set, so that runs close together
+    share one server-side export instead of each starting their own:
+        - An export still being generated is polled and downloaded again by the next run
+        - A finished download is kept as a local copy and reused, without any api call, until the TTL passes
+    The cache is a JSON file shared by every process, updated under a lock file.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_EXPORT_CACHE_TTL, maxPending=DEFAULT_POLL_MAX_WAIT, clock=time.time):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - path : str
+                JSON file holding the cache entries
+            - ttl : float
+                Seconds a finished export is reused for. 0 disables the cache.
+            - maxPending : float
+                Seconds an export still being generated is waited for by later runs
+            - clock : callable
+                Wall clock returning seconds, shared between processes
+        """
+        self.path = path
+        self.lockPath = path + '.lock'
+        self.ttl = ttl
+        self.maxPending = maxPending
+        self.clock = clock
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def getKey(self, user, data):
+        """
+        Function that identifies an export.
+        Parameters
+        ----------
+            - user : str
+                Account the export belongs to
+            - data : str
+                Query string built by getDataForExports(), fields already normalized
+        Returns
+        -------
+            - key : str
+        """
+        return hashlib.sha1((user + data).encode('utf-8')).hexdigest()[:16]
+
+    def getLocalPath(self, key):
+        """ Function that returns where the local copy of an export is kept. """
+        return os.path.join(os.path.dirname(self.path), 'export_{}.csv'.format(key))
+
+    def lookup(self, key):
+        """
+        Function that finds a reusable export.
+        Parameters
+        ----------
+            - key : str
+                Key returned by getKey()
+        Returns
+        -------
+            - entry : dict
+                - fileName : str
+                    Name of the server-side export
+                - requestedAt : float
+                    When the export was requested
+                - readyAt : float
+                    When it was downloaded, None while it is pending
+                - localPath : str
+                    Local copy of the export, None while it is pending
+                - size : int
+                    Size of the local copy, None while it is pending
+                - hash : str
+                    SHA-256 of the local copy, None while it is pending
+                None if there is nothing to reuse
+        """
+        if not self.enabled:
+            return None
+        entry = self.load().get(key)
+        if entry is None or not self.isFresh(entry):
+            return None
+        if entry.get('localPath') and not self.isCompleteCopy(entry['localPath'], entry.get('size')):
+            return None
+        return entry
+
+    def isFresh(self, entry):
+        now = self.clock()
+        if entry.get('readyAt') is not None:
+            return now - entry['readyAt'] < self.ttl
+        return now - entry['requestedAt'] < self.maxPending
+
+    def recordRequested(self, key, fileName):
+        """ Function that records an export that was just started, so that concurrent runs wait for it. """
+        self.update(key, {'fileName': fileName, 'requestedAt': self.clock(), 'readyAt': None, 'localPath': None})
+
+    def recordDownloaded(self, key, localPath, size, contentHash):
+        """
+        Function that records the local copy of a finished export, if it holds exactly what was downloaded.
+        Parameters
+        ----------
+            - key : str
+                Key of the entry
+            - localPath : str
+                Local copy of the export
+            - size : int
+                Bytes downloaded
+            - contentHash : str
+                SHA-256 of the bytes downloaded
+        Returns
+        -------
+            - recorded : bool
+                False if the copy was missing, empty or different, the entry is dropped then
+        """
+        if not self.isCompleteCopy(localPath, size, contentHash):
+            LOGGER.writeLog("Local copy {} doesn't match the download, it is not reused.".format(localPath),
+                            severity='warning')
+            self.forget(key)
+            return False
+        self.update(key, {'readyAt': self.clock(), 'localPath': localPath, 'size': size, 'hash': contentHash})
+        return True
+
+    def isCompleteCopy(self, localPath, size, contentHash=None):
+        """
+        Function that checks a local copy against the size, and the hash when given, of the export downloaded.
+        Empty copies never are complete: an export holds at least its header.
+        Parameters
+        ----------
+            - localPath : str
+            - size : int
+                Expected size. None only checks that the copy isn't empty (entries of older versions).
+            - contentHash : str
+                Expected SHA-256. None skips reading the copy.
+        Returns
+        -------
+            - complete : bool
+        """
+        try:
+            actualSize = os.path.getsize(localPath)
+        except OSError:
+            return False
+        if actualSize == 0 or (size is not None and actualSize != size):
+            return False
+        return contentHash is None or saveChunks(iterFileChunks(localPath))[1] == contentHash
+
+    def forget(self, key):
+        """ Function that drops an entry that turned out not to be reusable, and its local copy. """
+        self.update(key, None)
 
-    if delimiter not in acceptableDelimiters:
-        LOGGER.writeLog("Delimiter was not selected from acceptable options, switching to ',' default delimiter.",
-                        localFrame.f_lineno, severity='warning')
-        delimiter = ','
-        return delimiter
+    def update(self, key, values):
+        """
+        Function that changes one entry and prunes the expired ones, local copies included.
+        Parameters
+        ----------
+            - key : str
+                Key of the entry
+            - values : dict
+                Values to set on the entry. None removes it, local copy included.
+        """
+        if not self.enabled:
+            return
+        if not self.acquireLock():
+            LOGGER.writeLog("Export cache is locked by a running process, not updated.", severity='warning')
+            return
+        try:
+            entries = self.load()
+            if values is None:
+                removed = entries.pop(key, None) or {}
+                for localPath in {removed.get('localPath'), self.getLocalPath(key)}:
+                    if localPath and os.path.exists(localPath):
+                        os.remove(localPath)
+            else:
+                entries[key] = dict(entries.get(key, {}), **values)
+            for staleKey in [name for name, entry in entries.items() if not self.isFresh(entry)]:
+                stale = entries.pop(staleKey)
+                if stale.get('localPath') and os.path.exists(stale['localPath']):
+                    os.remove(stale['localPath'])
+            writeJSONAtomically(self.path, entries)
+        finally:
+            self.releaseLock()
 
-    return delimiter
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as cacheFile:
+                return json.load(cacheFile)
+        except (IOError, ValueError):
+            return {}
+
+    def acquireLock(self, timeout=10.0):
+        """
+        Function that takes the lock file, which holds the pid of its owner. A lock left behind by a process that is
+        gone is broken, a lock held by a running process never is.
+        Parameters
+        ----------
+            - timeout : float
+                Seconds to wait for a running owner to release the lock
+        Returns
+        -------
+            - acquired : bool
+                False if the lock was still held by a running process after the timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                lockFile = os.open(self.lockPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self.isLockAbandoned():
+                    self.releaseLock()
+                    continue
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.05)
+                continue
+            try:
+                os.write(lockFile, str(os.getpid()).encode('ascii'))
+            finally:
+                os.close(lockFile)
+            return True
 
+    def isLockAbandoned(self, graceSeconds=10.0):
+        """
+        Function that tells if the owner of the lock file is gone.
+        Parameters
+        ----------
+            - graceSeconds : float
+                A lock file without a pid is only considered abandoned once it is older than this, its owner may
+                be about to write it
+        Returns
+        -------
+            - abandoned : bool
+        """
+        try:
+            with open(self.lockPath, 'r') as lockFile:
+                owner = lockFile.read().strip()
+            modifiedAt = os.path.getmtime(self.lockPath)
+        except (IOError, OSError):
+            # Released in the meantime
+            return False
+        if owner.isdigit():
+            return not isProcessAlive(int(owner))
+        return time.time() - modifiedAt > graceSeconds
 
-def validateConfigPath(configPath):
+    def releaseLock(self):
+        try:
+            os.remove(self.lockPath)
+        except FileNotFoundError:
+            pass
+
+
+def isProcessAlive(pid):
     """
-    Function to validate the provided config file path.
+    Function that tells if a process is running.
     Parameters
     ----------
-        - configPath : str
-            Path to the configuration file
+        - pid : int
     Returns
     -------
-        - validated : bool
-            A True or False as a result of the validation of the path
+        - alive : bool
     """
-    localFrame = inspect.currentframe()
-    # Check extension, must be YAML
-    if not configPath.endswith('yaml'):
-        LOGGER.writeLog(
-            "Configuration file must be .yaml extension.\nLooking for configuration file in default locations.",
-            localFrame.f_lineno, severity='error')
-        return False
-
-    # Check if file exists
-    if not os.path.exists(configPath):
-        LOGGER.writeLog(
-            "Specified path to the configuration file is invalid.\nLooking for configuration file in default locations.",
-            localFrame.f_lineno, severity='error')
+    if sys.platform == 'win32' or sys.platform == 'win64':  # Windows
+        # os.kill() would terminate the process on Windows, ask for its exit code instead
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            # Access denied means it exists
+            return kernel32.GetLastError() == 5
+        try:
+            exitCode = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exitCode))
+            return exitCode.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
         return False
-    else:
+    except PermissionError:
+        # Owned by another user, but running
         return True
+    return True
 
 
-def getDefaultConfigPath():
+class ChangeDetector(object):
     """
-    Function to validate the provided config file path.
-    Returns
-    -------
-        - configPath : str
-            Path to the configuration file if found in the default locations
+    Remembers the content hash of the last export written for an account and field set to given outputs, and where
+    they were saved, so that a run downloading the very same export can keep those outputs instead of rewriting them.
     """
-    localFrame = inspect.currentframe()
-    fileName = 'suredone.yaml'
-    # Check in current directory
-    directory = os.getcwd()
-    configPath = os.path.join(directory, fileName)
-    if os.path.exists(configPath):
-        return configPath
 
-    # Check in alternative locations
-    if sys.platform == 'win32' or sys.platform == 'win64':  # Windows
-        directory = os.path.expandvars(r'%LOCALAPPDATA%')
-        configPath = os.path.join(directory, fileName)
-        if os.path.exists(configPath):
-            return configPath
-    elif sys.platform == 'linux' or sys.platform == 'linux2':  # Linux
-        directory = expanduser('~')
-        configPath = os.path.join(directory, fileName)
-        if os.path.exists(configPath):
-            return configPath
-    else:
-        LOGGER.writeLog(
-            "Platform couldn't be recognized. Are you sure you are running this script on Windows or Ubuntu Linux?",
-            localFrame.f_lineno, severity='code-breaker', data={'code': 1})
-        exit()
+    @staticmethod
+    def getKey(exportKey, outputPath, delimiter):
+        """
+        Function that identifies what a run writes.
+        Parameters
+        ----------
+            - exportKey : str
+                Identifies the account and field set, see ExportCache.getKey()
+            - outputPath : str
+                Path of the user-delimited output, or its directory when the file name changes every run
+            - delimiter : str
+                Delimiter of that output
+        Returns
+        -------
+            - key : str
+        """
+        identity = '\n'.join([exportKey, os.path.abspath(outputPath), delimiter])
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()[:16]
 
-    LOGGER.writeLog(
-        "suredone.yaml config file wasn't found in default locations!\nSpecify a path to configuration file using (-f --file) argument.",
-        localFrame.f_lineno, severity='code-breaker', data={'code': 1})
-    exit()
+    def __init__(self, path, key):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - path : str
+                JSON file holding the hashes of every account and field set
+            - key : str
+                Identifies the account, field set and outputs, see getKey()
+        """
+        self.path = path
+        self.key = key
+        self.previous = self.load().get(key)
+
+    def isUnchanged(self, contentHash):
+        """
+        Function that tells if an export is identical to the last one written, and its outputs are still there.
+        Parameters
+        ----------
+            - contentHash : str
+                Hash of the export just downloaded
+        Returns
+        -------
+            - unchanged : bool
+        """
+        if self.previous is None or self.previous['hash'] != contentHash:
+            return False
+        return all(os.path.exists(path) for path in self.previous['outputs'])
 
+    def record(self, contentHash, outputs, rows):
+        """
+        Function that saves the hash of the export just written.
+        Parameters
+        ----------
+            - contentHash : str
+                Hash of the export
+            - outputs : list
+                Paths of the files written from it
+            - rows : int
+                Number of records in it
+        """
+        hashes = self.load()
+        self.previous = {'hash': contentHash, 'outputs': outputs, 'rows': rows,
+                         'recordedAt': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        hashes[self.key] = self.previous
+        writeJSONAtomically(self.path, hashes)
 
-""" Custom Exceptions that will be caught by the script """
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as hashFile:
+                return json.load(hashFile)
+        except (IOError, ValueError):
+            return {}
 
 
-class Logger(object):
-    """ The logger class that will handle all outputs, may it be console or log file. """
+class KeepAliveAdapter(object):
+    """
+    A transport adapter that enables TCP keep-alive probes on every pooled connection.
+    Mixed into requests' HTTPAdapter by create(), so that requests is only imported once a session is opened.
+    """
 
-    def __init__(self, verbose=False):
-        self.terminal = sys.stdout
-        self.log = open(self.getLogPath(), "a")
-        # Write the header row
-        self.log.write(' Ind. |LineNo.| Time stamp  : Message')
-        self.log.write('\n=====================================\n')
-        self.verbose = verbose
+    # KeepAliveAdapter combined with HTTPAdapter, built by the first create()
+    adapterClass = None
 
-    def getLogPath(self):
+    @classmethod
+    def create(cls, keepAliveIdle=None, **kwargs):
         """
-        Function that will determine the default log file path based on the operating system being used.
-        Will also create appropriate directories they aren't present.
+        Function that builds an adapter. Takes the same arguments as the constructor.
         Returns
         -------
-            - logFile : fileIO
-                File IO for the whole script to log to.
+            - adapter : requests.adapters.HTTPAdapter
         """
-        # Define the file name for logging
-        temp = datetime.now().strftime('%Y_%m_%d-%H-%M-%S')
-        logFileName = "suredone_download_" + temp + ".log"
+        if cls.adapterClass is None:
+            import requests.adapters
+            cls.adapterClass = type('KeepAliveHTTPAdapter', (cls, requests.adapters.HTTPAdapter), {})
+        return cls.adapterClass(keepAliveIdle=keepAliveIdle, **kwargs)
 
-        # If the platform is windows, set the log file path to the current user's Downloads/log folder
-        if sys.platform == 'win32' or sys.platform == 'win64':  # Windows
-            logFilePath = os.path.expandvars(r'%USERPROFILE%')
-            logFilePath = os.path.join(logFilePath, 'Downloads')
-            logFilePath = os.path.join(logFilePath, 'log')
-            if os.path.exists(logFilePath):
-                return os.path.join(logFilePath, logFileName)
-            else:  # Create the log directory
-                os.mkdir(logFilePath)
-                return os.path.join(logFilePath, logFileName)
+    def __init__(self, keepAliveIdle=None, **kwargs):
+        """
+        Constructor function. Stores the keep-alive settings before the pool manager is initialized.
+        Parameters
+        ----------
+            - keepAliveIdle : int
+                Seconds of idleness before the OS starts sending keep-alive probes. None disables probes.
+            - kwargs : dict
+                Keyword arguments passed through to requests' HTTPAdapter (pool_connections, pool_maxsize, ...)
+        """
+        # Must be set before calling the parent constructor since it initializes the pool manager
+        self.keepAliveIdle = keepAliveIdle
+        super(KeepAliveAdapter, self).__init__(**kwargs)
 
-        # If Linux, set the download path to the $HOME/downloads folder
-        elif sys.platform == 'linux' or sys.platform == 'linux2':  # Linux
-            logFilePath = expanduser('~')
-            logFilePath = os.path.join(logFilePath, 'log')
-            if os.path.exists(logFilePath):
-                return os.path.join(logFilePath, logFileName)
-            else:  # Create the log directory
-                os.mkdir(logFilePath)
-                return os.path.join(logFilePath, logFileName)
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self.getSocketOptions()
+        super(KeepAliveAdapter, self).init_poolmanager(*args, **kwargs)
 
-    def write(self, message):
-        if self.verbose:
-            self.terminal.write(message)
-            self.terminal.flush()
-        self.log.write(message)
+    def getSocketOptions(self):
+        """
+        Function that builds the socket options applied to each new connection in the pool.
+        Returns
+        -------
+            - socketOptions : list
+                List of (level, option, value) tuples
+        """
+        # Same as urllib3's default: disable Nagle's algorithm
+        socketOptions = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+        if self.keepAliveIdle is None:
+            return socketOptions
+
+        socketOptions.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        # TCP_KEEPIDLE and TCP_KEEPINTVL are not available on every platform (e.g. Windows)
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            socketOptions.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, int(self.keepAliveIdle)))
+        if hasattr(socket, 'TCP_KEEPINTVL'):
+            socketOptions.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, int(self.keepAliveIdle) // 4)))
+        return socketOptions
+
+
+class RateLimiter(object):
+    """
+    A thread-safe token bucket that keeps every SureDone call made by the process under the account's quota.
+    The bucket is sized and refilled from the rate limit headers SureDone sends with every response:
+        - X-Rate-Limit-Limit : Requests allowed in the current window
+        - X-Rate-Limit-Remaining : Requests left in the current window
+        - X-Rate-Limit-Time-Reset-Ms : Milliseconds until the window resets
+    Until the first headers are seen the bucket has no capacity and never blocks.
+    """
 
-    def writeLog(self, message, lineNumber, severity='normal', data=None):
+    def __init__(self, capacity=None, refillPeriod=DEFAULT_RATE_LIMIT_PERIOD,
+                 fallbackWait=DEFAULT_RATE_LIMIT_FALLBACK_WAIT, clock=time.monotonic, sleep=time.sleep):
         """
-        Function that writes out to the log file and console based on verbose.
-        The function will change behavior slightly based on severity of the message.
+        Constructor function.
         Parameters
         ----------
-            - message : str
-                Message to write
-            - severity : str
-                Defines what the message is related to. Is the message:
-                    - [N] : A 'normal' notification
-                    - [W] : A 'warning'
-                    - [E] : An 'error'
-                    - [!] : A 'code-breaker error' (errors that are followed by the script exitting)
-            - data : dict
-                A dictionary that will contain additional information when a code-breaker error occurs
-                Attributes:
-                    - code : error code
-                        1 : Generic error, only print the message.
-                        2 : An API call was not successful. Response object attached.
-                        3 : YAML loading error. Error object attached
-                    - response : str
-                        JSON-like str - the response recieved from the request in conern at the point of error.
-                    - error : str
-                        String produced by exception if an exception occured
+            - capacity : int
+                Initial bucket size. None until learned from the API's headers.
+            - refillPeriod : float
+                Seconds for an empty bucket to refill completely when no reset time is known
+            - fallbackWait : float
+                Seconds to back off on a 429 response that doesn't say how long to wait
+            - clock : callable
+                Monotonic clock returning seconds
+            - sleep : callable
+                Function used to wait, replaceable so the bucket can be driven without real sleeping
         """
-        # Get a timestamp
-        timestamp = self.getCurrentTimestamp()
-
-        # Format the message based on severity
-        lineNumber = str(lineNumber)
-        if severity == 'normal':
-            indicator = '[N]'
-            toWrite = ' ' + indicator + '  |  ' + lineNumber + '  | ' + timestamp + ': ' + message
-        elif severity == 'warning':
-            indicator = '[W]'
-            toWrite = ' ' + indicator + '  |  ' + lineNumber + '  | ' + timestamp + ': ' + message
-        elif severity == 'error':
-            indicator = '[X]'
-            toWrite = ' ' + indicator + '  |  ' + lineNumber + '  | ' + timestamp + ': ' + message
-        elif severity == 'code-breaker':
-            indicator = '[!]'
-            toWrite = ' ' + indicator + '  |  ' + lineNumber + '  | ' + timestamp + ': ' + message
+        self.capacity = capacity
+        self.tokens = float(capacity) if capacity is not None else 0.0
+        self.refillPeriod = refillPeriod
+        self.fallbackWait = fallbackWait
+        self.clock = clock
+        self.sleep = sleep
+        self.lastRefill = clock()
+        self.resetAt = None
+        self.totalWait = 0.0
+        self.lock = threading.Lock()
 
-            if data['code'] == 2:  # Response recieved but unsuccessful
-                details = '\n[ErrorDetailsStart]\n' + data['response'] + '\n[ErrorDetailsEnd]'
-                toWrite = toWrite + details
-            elif data['code'] == 3:  # YAML loading error
-                details = '\n[ErrorDetailsStart]\n' + data['error'] + '\n[ErrorDetailsEnd]'
-                toWrite = toWrite + details
+    def acquire(self):
+        """
+        Function that blocks until a token is available and takes it.
+        Returns
+        -------
+            - waited : float
+                Seconds spent waiting for the token
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                delay = self.reserve()
+                if delay <= 0:
+                    self.totalWait += waited
+                    return waited
+            self.sleep(delay)
+            waited += delay
 
-        # Write out the message
-        self.log.write(toWrite + '\n')
-        if self.verbose:
-            self.terminal.write(message + '\n')
-            self.terminal.flush()
+    async def acquireAsync(self):
+        """
+        Coroutine version of acquire() that waits with asyncio.sleep instead of blocking the thread.
+        Returns
+        -------
+            - waited : float
+                Seconds spent waiting for the token
+        """
+        import asyncio
+        waited = 0.0
+        while True:
+            with self.lock:
+                delay = self.reserve()
+                if delay <= 0:
+                    self.totalWait += waited
+                    return waited
+            await asyncio.sleep(delay)
+            waited += delay
 
-    def getCurrentTimestamp(self):
+    def reserve(self):
         """
-        Simple function that calculates the current time stamp and simply formats it as a string and returns.
-        Mainly aimed for logging.
+        Function that takes a token if one is available. Must be called with the lock held.
         Returns
         -------
-            - timestamp : str
-                A formatted string of current time
+            - delay : float
+                0 if a token was taken, else the seconds until the next token becomes available
         """
-        return datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        if self.capacity is None:
+            return 0.0
+        now = self.clock()
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        if self.resetAt is not None:
+            return max(self.resetAt - now, 0.001)
+        return (1 - self.tokens) * self.refillPeriod / self.capacity
 
-    def exceptionLogger(self, exctype, value, traceBack):
+    def refill(self, now):
         """
-        A simple printing function that will take place of the sys.excepthook function and print the results to the log instead of the console.
+        Function that adds the tokens earned since the last refill. Must be called with the lock held.
+        A known reset time refills the whole bucket at once, otherwise tokens trickle in over refillPeriod.
         Parameters
         ----------
-            - exctype : object
-                Exception type and details
-            - Value : str
-                The error passed while the exception was raised
-            - traceBack : traceback object
-                Contains information about the stack trace.
+            - now : float
+                Current reading of the clock
         """
-        LOGGER.write('Exception Occured! Details follow below.\n')
-        LOGGER.write('Type:{}\n'.format(exctype))
-        LOGGER.write('Value:{}\n'.format(value))
-        LOGGER.write('Traceback:\n')
-        for i in traceback.format_list(traceback.extract_tb(traceBack)):
-            LOGGER.write(i)
+        if self.resetAt is not None:
+            if now >= self.resetAt:
+                self.tokens = float(self.capacity)
+                self.resetAt = None
+                self.lastRefill = now
+            return
+        elapsed = now - self.lastRefill
+        self.tokens = min(float(self.capacity), self.tokens + elapsed * self.capacity / self.refillPeriod)
+        self.lastRefill = now
 
-    def flush(self):
-        # This flush method is needed for python 3 compatibility.
-        # This handles the flush command by doing nothing.
-        # You might want to specify some extra behavior here.
-        pass
+    def update(self, headers):
+        """
+        Function that synchronizes the bucket with the rate limit headers of a response.
+        Parameters
+        ----------
+            - headers : dict-like
+                Response headers (case-insensitive mapping as provided by requests)
+        """
+        limit = parseHeaderNumber(headers, 'X-Rate-Limit-Limit')
+        remaining = parseHeaderNumber(headers, 'X-Rate-Limit-Remaining')
+        resetMs = parseHeaderNumber(headers, 'X-Rate-Limit-Time-Reset-Ms')
+        if limit is None and remaining is None and resetMs is None:
+            return
+        with self.lock:
+            now = self.clock()
+            if limit is not None and limit > 0:
+                self.capacity = int(limit)
+            if self.capacity is None:
+                # Remaining without a limit: the best guess for the bucket size is what we are told is left
+                self.capacity = max(int(remaining or 0), 1)
+            if remaining is not None:
+                self.tokens = min(float(remaining), float(self.capacity))
+            if resetMs is not None:
+                self.resetAt = now + resetMs / 1000.0
+            self.lastRefill = now
+
+    def penalize(self, headers):
+        """
+        Function that empties the bucket after a 429 (Too Many Requests) response.
+        The next acquire() then waits exactly until the reset time announced by the API.
+        Parameters
+        ----------
+            - headers : dict-like
+                Response headers of the 429 response
+        Returns
+        -------
+            - wait : float
+                Seconds the bucket will stay empty
+        """
+        resetMs = parseHeaderNumber(headers, 'X-Rate-Limit-Time-Reset-Ms')
+        retryAfter = parseHeaderNumber(headers, 'Retry-After')
+        if resetMs is not None:
+            wait = resetMs / 1000.0
+        elif retryAfter is not None:
+            wait = float(retryAfter)
+        else:
+            wait = self.fallbackWait
+        limit = parseHeaderNumber(headers, 'X-Rate-Limit-Limit')
+        with self.lock:
+            if limit is not None and limit > 0:
+                self.capacity = int(limit)
+            elif self.capacity is None:
+                self.capacity = 1
+            self.tokens = 0.0
+            self.resetAt = self.clock() + wait
+        return wait
+
+
+def parseHeaderNumber(headers, name):
+    """
+    Function that reads a numeric header value.
+    Parameters
+    ----------
+        - headers : dict-like
+            Response headers
+        - name : str
+            Header name
+    Returns
+    -------
+        - value : float
+            The header's value or None if it is missing or not a number
+    """
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def getDownloadLength(response, statusCode=None):
+    """
+    Function that reads the full size of a downloaded file from a response's headers.
+    Parameters
+    ----------
+        - response : requests.Response or aiohttp.ClientResponse
+            Response to a plain (200) or Range (206) request
+        - statusCode : int
+            Status of the response, for responses without a status_code attribute
+    Returns
+    -------
+        - length : int
+            Size of the whole file in bytes or None if the server didn't tell
+    """
+    if statusCode is None:
+        statusCode = response.status_code
+    if statusCode == 206:
+        # Content-Range: bytes <start>-<end>/<total>
+        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+    length = parseHeaderNumber(response.headers, 'Content-Length')
+    return int(length) if length is not None else None
+
+
+def splitByteRange(size, segments):
+    """
+    Function that splits a file into contiguous byte ranges of (nearly) equal length.
+    Parameters
+    ----------
+        - size : int
+            Size of the file in bytes
+        - segments : int
+            Number of ranges wanted
+    Returns
+    -------
+        - bounds : list
+            (start, end) tuples, end inclusive
+    """
+    segments = max(1, min(segments, size))
+    length = -(-size // segments)
+    return [(start, min(start + length, size) - 1) for start in range(0, size, length)]
+
+
+class AdaptiveChunkReader(object):
+    """
+    Reads a download stream into one reusable buffer and hands out memoryview slices of it.
+    The read size grows while reads complete quickly and shrinks when they are slow, so fast links are read in a
+    few large blocks and slow links still deliver data regularly. Slices are only valid until the next one is
+    requested: consumers write or decode them right away, nothing is copied into new bytes objects.
+    """
 
+    def __init__(self, initialSize=DEFAULT_CHUNK_SIZE, minSize=MIN_CHUNK_SIZE, maxSize=MAX_CHUNK_SIZE,
+                 targetSeconds=CHUNK_TARGET_SECONDS):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - initialSize : int
+                Bytes asked for by the first read
+            - minSize : int
+                Smallest read size
+            - maxSize : int
+                Largest read size, also the size of the buffer
+            - targetSeconds : float
+                Wanted duration of a single read
+        """
+        self.minSize = minSize
+        self.maxSize = maxSize
+        self.size = max(minSize, min(initialSize, maxSize))
+        self.targetSeconds = targetSeconds
+        self.buffer = bytearray(maxSize)
+        self.view = memoryview(self.buffer)
+        self.bytesRead = 0
+        self.secondsReading = 0.0
 
-class LoadingError(Exception):
-    pass
+    def iterChunks(self, response):
+        """
+        Generator that reads a streaming response.
+        Parameters
+        ----------
+            - response : requests.Response
+                Response opened with stream=True
+        Yields
+        ------
+            - chunk : memoryview
+                Slice of the reusable buffer holding the bytes just read
+        """
+        import requests
+        from urllib3.exceptions import ProtocolError, ReadTimeoutError
+        encoding = response.headers.get('Content-Encoding', 'identity').lower()
+        if encoding not in ('', 'identity'):
+            # Compressed despite asking for identity, let requests decode it
+            for chunk in response.iter_content(chunk_size=self.size):
+                yield chunk
+            return
 
+        raw = response.raw
+        while True:
+            started = time.perf_counter()
+            try:
+                count = raw.readinto(self.view[:self.size])
+            except (ProtocolError, ReadTimeoutError, OSError) as e:
+                # Same translation requests' iter_content does, so callers only handle requests exceptions
+                raise requests.exceptions.ChunkedEncodingError(e)
+            if not count:
+                return
+            self.adapt(count, time.perf_counter() - started)
+            yield self.view[:count]
 
-class UnauthorizedError(Exception):
-    pass
+    def adapt(self, count, elapsed):
+        """
+        Function that picks the size of the next read from the last one.
+        Parameters
+        ----------
+            - count : int
+                Bytes returned by the last read
+            - elapsed : float
+                Seconds the last read took
+        """
+        self.bytesRead += count
+        self.secondsReading += elapsed
+        if count == self.size and elapsed < self.targetSeconds / 2:
+            self.size = min(self.size * 2, self.maxSize)
+        elif elapsed > self.targetSeconds:
+            self.size = max(self.size // 2, self.minSize)
 
 
 class SureDone:
     """ A driver class to manage connection and make requests to the Suredone API """
 
-    def __init__(self, user, api_token, timeout):
+    def __init__(self, user, api_token, timeout, poolConnections=DEFAULT_POOL_CONNECTIONS,
+                 poolMaxSize=DEFAULT_POOL_MAXSIZE, keepAlive=DEFAULT_KEEP_ALIVE, keepAliveIdle=DEFAULT_KEEP_ALIVE_IDLE,
+                 rateLimiter=None, retryPolicies=None, apiEndpoint=DEFAULT_API_ENDPOINT):
         """
-        Constructor function. Basically creates a header template for api calls.
+        Constructor function. Basically creates a header template for api calls
+        and a pooled session that is reused by every api call and file download.
         Parameters
         ----------
             - user : str
                 User name for API
             - 'api_token' : str
                 Auth token provided by the API
+            - timeout : float
+                Seconds to wait for the server before a request times out
+            - poolConnections : int
+                Number of hosts to keep a connection pool for
+            - poolMaxSize : int
+                Maximum number of connections kept open in each pool
+            - keepAlive : bool
+                Reuse connections between requests. False sends 'Connection: close' with every request.
+            - keepAliveIdle : int
+                Seconds of idleness before TCP keep-alive probes are sent on pooled sockets
+            - rateLimiter : RateLimiter
+                Token bucket to draw from before every api call. Defaults to the process-wide RATE_LIMITER.
+            - retryPolicies : dict
+                RetryPolicy objects under the keys 'get' (idempotent calls), 'write' (PUT/POST/DELETE) and
+                'download' (resuming export downloads).
+                Defaults to getDefaultRetryPolicies().
+            - apiEndpoint : str
+                Base URL every api call is made under
         """
         self.timeout = timeout
-        self.api_endpoint = 'https://api.suredone.com/v1/'
+        self.api_endpoint = apiEndpoint
         self.headers = {}
         self.headers['Content-Type'] = 'application/x-www-form-urlencoded'
         self.headers['X-Auth-Integration'] = 'suredone_download_py'
         self.headers['x-auth-user'] = user
         self.headers['x-auth-token'] = api_token
+        self.poolConnections = poolConnections
+        self.poolMaxSize = poolMaxSize
+        self.keepAlive = keepAlive
+        self.keepAliveIdle = keepAliveIdle
+        self.rateLimiter = rateLimiter if rateLimiter is not None else RATE_LIMITER
+        self.retryPolicies = retryPolicies if retryPolicies is not None else getDefaultRetryPolicies()
+        self.session = self.createSession()
+
+    def createSession(self):
+        """
+        Function that creates the connection-pooled session used for all the requests made by this object.
+        Auth headers are deliberately not attached to the session so they are never sent to the export file host.
+        Returns
+        -------
+            - session : requests.Session
+                Session with a keep-alive adapter mounted for both http and https
+        """
+        import requests
+        session = requests.Session()
+        adapter = KeepAliveAdapter.create(keepAliveIdle=self.keepAliveIdle if self.keepAlive else None,
+                                          pool_connections=self.poolConnections, pool_maxsize=self.poolMaxSize,
+                                          max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not self.keepAlive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def openDownloadStream(self, url, offset=0, end=None):
+        """
+        Function that opens a streaming GET request on the pooled session.
+        Used to download exported files without paying for a new connection on every download.
+        Parameters
+        ----------
+            - url : str
+                Full URL of the file to download
+            - offset : int
+                Byte to start from. Anything above 0 sends a Range request.
+            - end : int
+                Last byte wanted (inclusive). None reads to the end of the file.
+        Returns
+        -------
+            - response : requests.Response
+                Streaming response. Must be closed (or fully consumed) to give the connection back to the pool.
+        """
+        # Ask for the bytes as stored so that Content-Length and Range offsets count the bytes we receive
+        headers = {'Accept-Encoding': 'identity'}
+        if offset > 0 or end is not None:
+            headers['Range'] = 'bytes={}-{}'.format(offset, '' if end is None else end)
+        return self.session.get(url, stream=True, timeout=self.timeout, headers=headers)
+
+    def iterDownload(self, url, chunkSize=DEFAULT_CHUNK_SIZE, start=0, end=None):
+        """
+        Generator that downloads a file (or a byte range of it) and transparently resumes it after a failure.
+        When the stream breaks, or ends before all the bytes were received, the download continues with a
+        Range request from the last byte received. Servers that ignore the Range header are handled by skipping the
+        bytes already delivered.
+        Parameters
+        ----------
+            - url : str
+                Full URL of the file to download
+            - chunkSize : int
+                Size of the first read, later reads adapt to the observed throughput
+            - start : int
+                First byte to download
+            - end : int
+                Last byte to download (inclusive). None downloads to the end of the file.
+        Yields
+        ------
+            - chunk : memoryview
+                Consecutive pieces of the file, never repeated. Only valid until the next chunk is requested.
+        """
+        import requests
+        policy = self.retryPolicies['download']
+        # One buffer for the whole download, kept across resumes
+        reader = AdaptiveChunkReader(initialSize=chunkSize)
+        position = start
+        # Exclusive end of the wanted bytes, learned from the first response when downloading to the end of file
+        stop = end + 1 if end is not None else None
+        attempt = 0
+        while True:
+            try:
+                response = self.openDownloadStream(url, offset=position, end=end)
+                try:
+                    if response.status_code not in (200, 206):
+                        raise requests.exceptions.HTTPError('HTTP {}'.format(response.status_code), response=response)
+                    # A 200 to a Range request means the server starts from byte zero again
+                    skip = position if response.status_code == 200 else 0
+                    if stop is None:
+                        stop = getDownloadLength(response)
+                    for chunk in reader.iterChunks(response):
+                        if skip:
+                            if len(chunk) <= skip:
+                                skip -= len(chunk)
+                                continue
+                            chunk = chunk[skip:]
+                            skip = 0
+                        if stop is not None and position + len(chunk) >= stop:
+                            # Drop whatever a server ignoring the range sends past the wanted bytes
+                            chunk = chunk[:stop - position]
+                            position += len(chunk)
+                            yield chunk
+                            break
+                        position += len(chunk)
+                        yield chunk
+                finally:
+                    response.close()
+                if stop is None or position >= stop:
+                    return
+                error = IncompleteDownloadError('Stream ended at byte {} of {}.'.format(position, stop))
+            except requests.exceptions.RequestException as e:
+                error = e
+
+            LOGGER.writeLog('Download interrupted at byte {} of {}: {}'.format(position, stop, error), severity='error')
+            if not self.waitBeforeRetry(policy, attempt, 'download', 'resume at byte {}'.format(position),
+                                        error=error):
+                raise IncompleteDownloadError('Download stopped at byte {} of {}.'.format(position, stop))
+            attempt += 1
+
+    def getRangeSize(self, url):
+        """
+        Function that checks whether the file server accepts Range requests by asking for the first byte.
+        Parameters
+        ----------
+            - url : str
+                Full URL of the file
+        Returns
+        -------
+            - size : int
+                Size of the file if ranges are supported, else None
+        """
+        import requests
+        try:
+            response = self.openDownloadStream(url, offset=0, end=0)
+        except requests.exceptions.RequestException:
+            return None
+        response.close()
+        if response.status_code != 206:
+            return None
+        return getDownloadLength(response)
+
+    def downloadSegments(self, url, path, segments, chunkSize=DEFAULT_CHUNK_SIZE):
+        """
+        Function that downloads a file over several connections at once.
+        The file is preallocated and each segment, fetched with its own Range request from a thread pool, is
+        written straight into its place. Every segment resumes on its own after a failure.
+        Parameters
+        ----------
+            - url : str
+                Full URL of the file
+            - path : str
+                Path to save the file at
+            - segments : int
+                Number of concurrent Range requests
+            - chunkSize : int
+                Size of the first read of each stream
+        Returns
+        -------
+            - downloaded : bool
+                False if the server doesn't support ranges and nothing was downloaded
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        size = self.getRangeSize(url)
+        if not size:
+            return False
+
+        # Preallocate so that every segment can be written in place
+        with open(path, 'wb') as segmentedFile:
+            segmentedFile.truncate(size)
+
+        bounds = splitByteRange(size, segments)
+        LOGGER.writeLog("Downloading {} bytes in {} segments.".format(size, len(bounds)), severity='normal')
+        with ThreadPoolExecutor(max_workers=len(bounds)) as pool:
+            futures = [pool.submit(self.downloadSegment, url, path, start, end, chunkSize) for start, end in bounds]
+            # Raise the first failure, if any
+            for future in futures:
+                future.result()
+        return True
+
+    def downloadSegment(self, url, path, start, end, chunkSize):
+        """
+        Function that downloads one byte range of a file into its place in the preallocated file.
+        Parameters
+        ----------
+            - url : str
+                Full URL of the file
+            - path : str
+                Path of the preallocated file
+            - start : int
+                First byte of the segment
+            - end : int
+                Last byte of the segment (inclusive)
+            - chunkSize : int
+                Size of the first read of the stream
+        """
+        with open(path, 'r+b') as segmentedFile:
+            segmentedFile.seek(start)
+            for chunk in self.iterDownload(url, chunkSize=chunkSize, start=start, end=end):
+                segmentedFile.write(chunk)
+
+    def close(self):
+        """ Function that closes every pooled connection held by the session. """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, value, traceBack):
+        self.close()
 
     def apicall(self, typ, endpoint, data=None):
         """
@@ -868,35 +4428,46 @@ class SureDone:
             - r : str
                 The JSON formatted response data after the request was made
         """
-        localFrame = inspect.currentframe()
+        import requests
         # Build url string by concatenating the main url with the sub module
         url = self.api_endpoint + endpoint
-        errorCount = 0
+        policy = self.getRetryPolicy(typ)
+        attempt = 0
 
         # Main loop
         while True:
-            # 3 or more errors break the loop
-            if errorCount >= 3:
-                break
             resp = None
+
+            # Wait for a token so that the account's quota is never exceeded
+            waited = self.rateLimiter.acquire()
+            if waited > 0:
+                LOGGER.writeLog('Rate limit reached, waited {:.3f} seconds.'.format(waited), severity='warning')
+                LOGGER.metrics.inc('sleep_seconds_total', waited, reason='rate_limit')
+            callStart = time.perf_counter()
             try:
                 # Invoke the corresponding api call based on the type
                 if typ == 'get':
-                    resp = requests.get(url, params=data, headers=self.headers, timeout=self.timeout)
+                    resp = self.session.get(url, params=data, headers=self.headers, timeout=self.timeout)
                 elif typ == 'put':
-                    resp = requests.put(url, data=json.dumps(data), headers=self.headers, timeout=self.timeout)
+                    resp = self.session.put(url, data=json.dumps(data), headers=self.headers, timeout=self.timeout)
                 elif typ == 'post':
-                    resp = requests.post(url, data=json.dumps(data), headers=self.headers, timeout=self.timeout)
+                    resp = self.session.post(url, data=json.dumps(data), headers=self.headers, timeout=self.timeout)
                 elif typ == 'delete':
-                    resp = requests.delete(url, data=json.dumps(data), headers=self.headers, timeout=self.timeout)
+                    resp = self.session.delete(url, data=json.dumps(data), headers=self.headers, timeout=self.timeout)
             except requests.exceptions.RequestException as e:
-                # Error handling. Increment error counter and sleep for
-                # 15 seconds and try again if error was ocurred
-                temp = 'HTTP Error {} {} {} {}.'.format(typ, url, data, e) + '\nAttempt ' + str(errorCount)
-                LOGGER.writeLog(temp, localFrame.f_lineno, severity='error')
-                errorCount += 1
-                time.sleep(15)
-                continue
+                # Error handling. Back off and try again if the policy allows it
+                LOGGER.metrics.inc('api_calls_total', method=typ, status='error')
+                temp = 'HTTP Error {} {} {} {}.'.format(typ, url, data, e) + '\nAttempt ' + str(attempt)
+                LOGGER.writeLog(temp, severity='error')
+                if self.waitBeforeRetry(policy, attempt, endpoint, 'connection error', error=e):
+                    attempt += 1
+                    continue
+                break
+            LOGGER.metrics.inc('api_calls_total', method=typ, status=resp.status_code)
+            LOGGER.metrics.observe('api_call_duration_seconds', time.perf_counter() - callStart, method=typ)
+
+            # Keep the shared bucket in sync with what the API says is left of the quota
+            self.rateLimiter.update(resp.headers)
 
             # If the response code is 200 (Which means OK)
             if resp.status_code == requests.codes.ok:
@@ -904,45 +4475,45 @@ class SureDone:
                 try:
                     r = json.loads(resp.text)
                 except json.decoder.JSONDecodeError:
-                    # Error handling. Increment error counter and raise LoadingError
-                    # if the response was OK but data couldn't be read in JSON
-                    temp = 'JSONDecodeError Error ' + typ + ' ' + url + ' ' + data + "\n" + resp.text
-                    LOGGER.writeLog(temp, localFrame.f_lineno, severity='error')
-                    errorCount += 1
+                    # Error handling. Raise LoadingError if the response was OK but data couldn't be read in JSON
+                    temp = 'JSONDecodeError Error {} {} {}\n{}'.format(typ, url, data, resp.text)
+                    LOGGER.writeLog(temp, severity='error')
                     raise LoadingError
 
                 # Return the JSON formatted data
                 return r
             elif resp.status_code == 401:  # Unauthorized
                 # Error handling. Handle for unauthorized error.
-                LOGGER.writeLog(json.dumps(self.headers, indent=4), localFrame.f_lineno, severity='error')
+                LOGGER.writeLog(json.dumps(self.headers, indent=4), severity='error')
                 raise UnauthorizedError
             elif resp.status_code == 403:
                 try:
                     # Try to load the data in JSON to get more information on error
                     r = json.loads(resp.text)
                 except json.decoder.JSONDecodeError:
-                    # Error handling. Increment error counter and sleep for 15 seconds 
-                    # and try again if the 403 error couldn't also be decoded to JSON either.
-                    LOGGER.writeLog('API json.decoder 403 ' + resp.text, localFrame.f_lineno, severity='error')
-                    errorCount += 1
-                    time.sleep(15)
-                    continue
+                    # Error handling. Back off and try again if the 403 error couldn't also be decoded to JSON either.
+                    LOGGER.writeLog('API json.decoder 403 ' + resp.text, severity='error')
+                    if self.waitBeforeRetry(policy, attempt, endpoint, 'http 403', statusCode=403):
+                        attempt += 1
+                        continue
+                    break
                 try:
                     # If the message tells us that the account has been expired
                     if r['message'] == 'The requested Account has expired.':
                         print('The requested Account has expired.')
                         raise LoadingError
                 except KeyError:
-                    # Error handling. Increment error counter and sleep for 15 seconds
-                    # and try again if r['message'] wasn't present in the response.
-                    LOGGER.writeLog('Api not message: 403 ' + resp.text + ' ' + data, localFrame.f_lineno,
-                                    severity='error')
-                    errorCount += 1
-                    time.sleep(15)
-                    continue
-            elif resp.status_code == 429:  # X-Rate-Limit-Time-Reset-Ms
-                time.sleep(40)
+                    # Error handling. Back off and try again if r['message'] wasn't present in the response.
+                    LOGGER.writeLog('Api not message: 403 {} {}'.format(resp.text, data), severity='error')
+                    if self.waitBeforeRetry(policy, attempt, endpoint, 'http 403', statusCode=403):
+                        attempt += 1
+                        continue
+                    break
+            elif resp.status_code == 429:  # Too Many Requests
+                # Empty the bucket until X-Rate-Limit-Time-Reset-Ms has passed, the next acquire() does the waiting
+                wait = self.rateLimiter.penalize(resp.headers)
+                LOGGER.writeLog('API rate limit hit (429). Waiting {:.3f} seconds for the reset.'.format(wait),
+                                severity='warning')
                 continue
             # elif resp.status_code == 422:
             #     error_count += 1
@@ -953,51 +4524,661 @@ class SureDone:
             #     time.sleep(60)
             #     continue
             else:
-                errorCount += 1
-                temp = 'Error' + ' ' + str(errorCount) + ' ' + str(
-                    resp.status_code) + ' ' + typ + ' ' + url + ' ' + data + '\n' + resp.text
-                LOGGER.writeLog(temp, localFrame.f_lineno, severity='error')
-                time.sleep(10)
+                temp = 'Error {} {} {} {} {}\n{}'.format(attempt + 1, resp.status_code, typ, url, data, resp.text)
+                LOGGER.writeLog(temp, severity='error')
+                if self.waitBeforeRetry(policy, attempt, endpoint, 'http {}'.format(resp.status_code),
+                                        statusCode=resp.status_code):
+                    attempt += 1
+                    continue
+            break
+        temp = 'Error {} {} {} {}'.format(attempt + 1, typ, url, data)
+        LOGGER.writeLog(temp, severity='error')
+        raise LoadingError
+
+    def getRetryPolicy(self, typ):
+        """
+        Function that picks the retry policy for a request type.
+        GETs are idempotent and retried freely, PUT/POST/DELETE use the more careful 'write' policy.
+        Parameters
+        ----------
+            - typ : str
+                Request type (get, put, post, delete)
+        Returns
+        -------
+            - policy : RetryPolicy
+        """
+        if typ == 'get':
+            return self.retryPolicies['get']
+        return self.retryPolicies['write']
+
+    def waitBeforeRetry(self, policy, attempt, endpoint, reason, statusCode=None, error=None):
+        """
+        Function that asks the policy whether a failed request may be retried and sleeps for the backoff delay.
+        Parameters
+        ----------
+            - policy : RetryPolicy
+                Policy of the failed request
+            - attempt : int
+                Number of retries already made for this request
+            - endpoint : str
+                The api endpoint, recorded with the delay
+            - reason : str
+                Short description of the failure, recorded with the delay
+            - statusCode : int
+                HTTP status of the failed response, if one was received
+            - error : Exception
+                The exception raised by the request, if any
+        Returns
+        -------
+            - retry : bool
+                True once the delay has been slept and the request should be sent again
+        """
+        if not policy.shouldRetry(attempt, statusCode=statusCode, error=error):
+            return False
+        delay = policy.wait(attempt, reason, endpoint=endpoint)
+        if delay is None:
+            LOGGER.writeLog('Retry budget of {} seconds exhausted, not retrying {}.'.format(
+                policy.budget.maxSeconds, endpoint), severity='error')
+            return False
+        LOGGER.writeLog('Retry {} of {} for {} ({}) after {:.3f} seconds.'.format(
+            attempt + 1, policy.maxAttempts, endpoint, reason, delay), severity='warning')
+        recordRetry(statusCode, delay)
+        return True
+
+
+class AsyncSureDone(object):
+    """
+    An asyncio version of the SureDone driver, for running many exports, polls and downloads in one event loop
+    (several accounts, or the shards of one export). apicall() behaves like SureDone.apicall(): the same rate
+    limiter, retry policies, status code handling and exceptions. A semaphore caps the requests in flight.
+    Requires aiohttp.
+
+    Example:
+        async with AsyncSureDone(user, apiToken, 15) as sureDone:
+            results = await asyncio.gather(*[sureDone.downloadExport(fields, path) for fields, path in jobs])
+    """
+
+    def __init__(self, user, api_token, timeout, maxConcurrency=DEFAULT_ASYNC_CONCURRENCY,
+                 poolMaxSize=DEFAULT_POOL_MAXSIZE, keepAliveIdle=DEFAULT_KEEP_ALIVE_IDLE, rateLimiter=None,
+                 retryPolicies=None, apiEndpoint=DEFAULT_API_ENDPOINT):
+        """
+        Constructor function. The HTTP session is created by open(), inside the event loop.
+        Parameters
+        ----------
+            - user : str
+                User name for API
+            - 'api_token' : str
+                Auth token provided by the API
+            - timeout : float
+                Seconds to wait for the server to connect or send data before a request times out
+            - maxConcurrency : int
+                Requests allowed in flight at once, downloads included
+            - poolMaxSize : int
+                Maximum number of connections kept open per host
+            - keepAliveIdle : int
+                Seconds an idle connection is kept in the pool
+            - rateLimiter : RateLimiter
+                Token bucket to draw from before every api call. Defaults to the process-wide RATE_LIMITER.
+            - retryPolicies : dict
+                Same as SureDone's
+            - apiEndpoint : str
+                Base URL every api call is made under
+        """
+        if importOptional('aiohttp') is None:
+            raise ImportError('AsyncSureDone requires aiohttp (pip install aiohttp).')
+        self.timeout = timeout
+        self.api_endpoint = apiEndpoint
+        self.headers = {}
+        self.headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        self.headers['X-Auth-Integration'] = 'suredone_download_py'
+        self.headers['x-auth-user'] = user
+        self.headers['x-auth-token'] = api_token
+        self.maxConcurrency = maxConcurrency
+        self.poolMaxSize = poolMaxSize
+        self.keepAliveIdle = keepAliveIdle
+        self.rateLimiter = rateLimiter if rateLimiter is not None else RATE_LIMITER
+        self.retryPolicies = retryPolicies if retryPolicies is not None else getDefaultRetryPolicies()
+        self.session = None
+        self.semaphore = None
+
+    async def open(self):
+        """ Coroutine that creates the pooled session and the concurrency limit in the running loop. """
+        import asyncio
+        import aiohttp
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit_per_host=self.poolMaxSize, keepalive_timeout=self.keepAliveIdle)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.timeout, sock_read=self.timeout)
+            # Auth headers are passed per api call so they are never sent to the export file host
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self.semaphore = asyncio.Semaphore(self.maxConcurrency)
+        return self
+
+    async def close(self):
+        """ Coroutine that closes every pooled connection. """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exctype, value, traceBack):
+        await self.close()
+
+    async def apicall(self, typ, endpoint, data=None):
+        """
+        Coroutine that makes an api call, see SureDone.apicall().
+        Parameters
+        ----------
+            - typ : str
+                Defines the type of request (get, put, post, delete)
+            - endpoint : str
+                Specific module of the API that needs to be called.
+            - data : dict
+                The data that is meant to be sent in the API request in key-value dict format.
+        Returns
+        -------
+            - r : dict
+                The JSON formatted response data after the request was made
+        """
+        import asyncio
+        import aiohttp
+        await self.open()
+        url = self.api_endpoint + endpoint
+        policy = self.retryPolicies['get'] if typ == 'get' else self.retryPolicies['write']
+        if typ == 'get':
+            requestArguments = {'params': data}
+        else:
+            requestArguments = {'data': json.dumps(data)}
+        attempt = 0
+
+        # Main loop
+        while True:
+            # Wait for a token so that the account's quota is never exceeded
+            waited = await self.rateLimiter.acquireAsync()
+            if waited > 0:
+                LOGGER.writeLog('Rate limit reached, waited {:.3f} seconds.'.format(waited), severity='warning')
+                LOGGER.metrics.inc('sleep_seconds_total', waited, reason='rate_limit')
+            callStart = time.perf_counter()
+            try:
+                async with self.semaphore:
+                    async with self.session.request(typ.upper(), url, headers=self.headers,
+                                                    **requestArguments) as resp:
+                        statusCode = resp.status
+                        responseHeaders = resp.headers
+                        text = await resp.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Error handling. Back off and try again if the policy allows it
+                LOGGER.metrics.inc('api_calls_total', method=typ, status='error')
+                temp = 'HTTP Error {} {} {} {}.'.format(typ, url, data, e) + '\nAttempt ' + str(attempt)
+                LOGGER.writeLog(temp, severity='error')
+                if await self.waitBeforeRetry(policy, attempt, endpoint, 'connection error', error=e):
+                    attempt += 1
+                    continue
+                break
+            LOGGER.metrics.inc('api_calls_total', method=typ, status=statusCode)
+            LOGGER.metrics.observe('api_call_duration_seconds', time.perf_counter() - callStart, method=typ)
+
+            # Keep the shared bucket in sync with what the API says is left of the quota
+            self.rateLimiter.update(responseHeaders)
+
+            if statusCode == 200:
+                try:
+                    return json.loads(text)
+                except json.decoder.JSONDecodeError:
+                    # Error handling. Raise LoadingError if the response was OK but data couldn't be read in JSON
+                    temp = 'JSONDecodeError Error {} {} {}\n{}'.format(typ, url, data, text)
+                    LOGGER.writeLog(temp, severity='error')
+                    raise LoadingError
+            elif statusCode == 401:  # Unauthorized
+                LOGGER.writeLog(json.dumps(self.headers, indent=4), severity='error')
+                raise UnauthorizedError
+            elif statusCode == 403:
+                try:
+                    # Try to load the data in JSON to get more information on error
+                    r = json.loads(text)
+                    message = r['message']
+                except (json.decoder.JSONDecodeError, KeyError, TypeError):
+                    message = None
+                if message == 'The requested Account has expired.':
+                    print('The requested Account has expired.')
+                    raise LoadingError
+                LOGGER.writeLog('API 403 {} {}'.format(text, data), severity='error')
+                if await self.waitBeforeRetry(policy, attempt, endpoint, 'http 403', statusCode=403):
+                    attempt += 1
+                    continue
+            elif statusCode == 429:  # Too Many Requests
+                # Empty the bucket until X-Rate-Limit-Time-Reset-Ms has passed, the next acquire does the waiting
+                wait = self.rateLimiter.penalize(responseHeaders)
+                LOGGER.writeLog('API rate limit hit (429). Waiting {:.3f} seconds for the reset.'.format(wait),
+                                severity='warning')
                 continue
+            else:
+                temp = 'Error {} {} {} {} {}\n{}'.format(attempt + 1, statusCode, typ, url, data, text)
+                LOGGER.writeLog(temp, severity='error')
+                if await self.waitBeforeRetry(policy, attempt, endpoint, 'http {}'.format(statusCode),
+                                              statusCode=statusCode):
+                    attempt += 1
+                    continue
             break
-        temp = 'Error ' + str(errorCount) + ' ' + typ + ' ' + url + ' ' + data
-        LOGGER.writeLog(temp, localFrame.f_lineno, severity='error')
+        temp = 'Error {} {} {} {}'.format(attempt + 1, typ, url, data)
+        LOGGER.writeLog(temp, severity='error')
         raise LoadingError
 
+    async def waitBeforeRetry(self, policy, attempt, endpoint, reason, statusCode=None, error=None):
+        """
+        Coroutine version of SureDone.waitBeforeRetry().
+        Returns
+        -------
+            - retry : bool
+                True once the delay has passed and the request should be sent again
+        """
+        import asyncio
+        if not policy.shouldRetry(attempt, statusCode=statusCode, error=error):
+            return False
+        delay = policy.reserveDelay(attempt, reason, endpoint=endpoint)
+        if delay is None:
+            LOGGER.writeLog('Retry budget of {} seconds exhausted, not retrying {}.'.format(
+                policy.budget.maxSeconds, endpoint), severity='error')
+            return False
+        LOGGER.writeLog('Retry {} of {} for {} ({}) after {:.3f} seconds.'.format(
+            attempt + 1, policy.maxAttempts, endpoint, reason, delay), severity='warning')
+        recordRetry(statusCode, delay)
+        await asyncio.sleep(delay)
+        return True
+
+    async def download(self, url, onChunk, chunkSize=DEFAULT_CHUNK_SIZE, start=0, end=None):
+        """
+        Coroutine that streams a file (or a byte range of it) to a callback and resumes it after a failure,
+        like SureDone.iterDownload().
+        Parameters
+        ----------
+            - url : str
+                Full URL of the file to download
+            - onChunk : callable
+                Called with every piece of the file, in order and never repeated
+            - chunkSize : int
+                Size of the first read, later reads adapt to the observed throughput
+            - start : int
+                First byte to download
+            - end : int
+                Last byte to download (inclusive). None downloads to the end of the file.
+        Returns
+        -------
+            - bytesDownloaded : int
+        """
+        import asyncio
+        import aiohttp
+        await self.open()
+        policy = self.retryPolicies['download']
+        reader = AdaptiveChunkReader(initialSize=chunkSize)
+        position = start
+        stop = end + 1 if end is not None else None
+        attempt = 0
+        while True:
+            # Ask for the bytes as stored so that Content-Length and Range offsets count the bytes we receive
+            headers = {'Accept-Encoding': 'identity'}
+            if position > 0 or end is not None:
+                headers['Range'] = 'bytes={}-{}'.format(position, '' if end is None else end)
+            try:
+                async with self.semaphore:
+                    async with self.session.get(url, headers=headers) as response:
+                        if response.status not in (200, 206):
+                            raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                              status=response.status)
+                        # A 200 to a Range request means the server starts from byte zero again
+                        skip = position if response.status == 200 else 0
+                        if stop is None:
+                            stop = getDownloadLength(response, statusCode=response.status)
+                        while stop is None or position < stop:
+                            started = time.perf_counter()
+                            chunk = await response.content.read(reader.size)
+                            if not chunk:
+                                break
+                            reader.adapt(len(chunk), time.perf_counter() - started)
+                            if skip:
+                                if len(chunk) <= skip:
+                                    skip -= len(chunk)
+                                    continue
+                                chunk = chunk[skip:]
+                                skip = 0
+                            if stop is not None:
+                                # Drop whatever a server ignoring the range sends past the wanted bytes
+                                chunk = chunk[:stop - position]
+                            position += len(chunk)
+                            onChunk(chunk)
+                if stop is None or position >= stop:
+                    return position - start
+                error = IncompleteDownloadError('Stream ended at byte {} of {}.'.format(position, stop))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            LOGGER.writeLog('Download interrupted at byte {} of {}: {}'.format(position, stop, error), severity='error')
+            if not await self.waitBeforeRetry(policy, attempt, 'download', 'resume at byte {}'.format(position),
+                                              error=error):
+                raise IncompleteDownloadError('Download stopped at byte {} of {}.'.format(position, stop))
+            attempt += 1
+
+    async def waitForExportURL(self, fileName, poller=None):
+        """
+        Coroutine version of waitForExportURL().
+        Parameters
+        ----------
+            - fileName : str
+                Name of the export file returned by bulk/exports
+            - poller : ExportReadinessPoller
+                Decides how long to wait between readiness checks. Defaults to one without history.
+        Returns
+        -------
+            - url : str
+                Download URL of the export or None if it wasn't ready in time
+        """
+        import asyncio
+        if poller is None:
+            poller = ExportReadinessPoller()
+        delay = poller.reserveStart()
+        while True:
+            if delay > 0:
+                LOGGER.metrics.inc('sleep_seconds_total', delay, reason='poll')
+                await asyncio.sleep(delay)
+            fileDownloadURLResponse = await self.apicall('get', 'bulk/exports/' + fileName, {})
+            if fileDownloadURLResponse['result'] == 'success':
+                readySeconds = poller.recordReady()
+                LOGGER.writeLog("Export {} ready after {:.1f} seconds and {} checks.".format(
+                    fileName, readySeconds, poller.checks + 1), severity='normal')
+                return fileDownloadURLResponse['url']
+            delay = poller.reserveWait(fileDownloadURLResponse)
+            if delay is None:
+                LOGGER.writeLog("Can not download.", severity='code-breaker',
+                                data={'code': 2, 'response': fileDownloadURLResponse})
+                return None
+            LOGGER.writeLog('Attempt {} {} - checked again after {:.1f} seconds.'.format(
+                poller.checks, fileDownloadURLResponse, delay), severity='warning')
+
+    async def downloadExport(self, fields, path, poller=None):
+        """
+        Coroutine that exports the fields, waits for the export and saves it as it is.
+        Parameters
+        ----------
+            - fields : str
+                Comma-separated fields to export
+            - path : str
+                Path to save the export at. Written to a .part file and renamed once complete.
+            - poller : ExportReadinessPoller
+                Decides how long to wait between readiness checks
+        Returns
+        -------
+            - bytesDownloaded : int
+        """
+        exportRequestResponse = await self.apicall('get', 'bulk/exports{}'.format(getDataForExports(fields)))
+        if exportRequestResponse['result'] != 'success':
+            raise LoadingError('Export failed: {}'.format(exportRequestResponse))
+        url = await self.waitForExportURL(exportRequestResponse['export_file'], poller=poller)
+        if url is None:
+            raise LoadingError('Export {} was not ready in time.'.format(exportRequestResponse['export_file']))
+        sink = RawSink(path)
+        sink.open()
+        try:
+            await self.download(url, sink.writeChunk)
+        except BaseException:
+            sink.discard()
+            raise
+        sink.commit()
+        return sink.bytesWritten
 
-def purge(directory, pattern, inclusive=True):
+
+class SyncSureDone(object):
     """
-    A simple function to remove everything within a directory and it's subdirectories if the file name mathces a specific pattern.
-    Parameters
-    ----------
-        - dir : str
-            The top level path of the directory from where the searching will begin
-        - pattern : regex-like str
-            A regex-like string that defines the pattern that needs to be deleted
-        - inclusive : boolean
-            Currently only has a True implementation
-    
-    Returns
-    -------
-        - count : int
-            The number files that were removed by the function
+    A blocking wrapper around AsyncSureDone for synchronous callers. Every call runs the matching coroutine to
+    completion on the wrapper's own event loop.
     """
-    count = 0
-    regexObj = re.compile(pattern)
-    for root, dirs, files in os.walk(directory, topdown=False):
-        for name in files:
-            path = os.path.join(root, name)
-            if bool(regexObj.search(path)) == bool(inclusive):
-                if path.endswith('.csv') or path.endswith('.tsv') or path.endswith('.txt'):
-                    os.remove(path)
-                    count += 1
-    return count
 
+    def __init__(self, *args, **kwargs):
+        """
+        Constructor function. Takes the same arguments as AsyncSureDone.
+        """
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        self.client = AsyncSureDone(*args, **kwargs)
+
+    def run(self, coroutine):
+        """ Function that runs a coroutine on the wrapper's loop and returns its result. """
+        return self.loop.run_until_complete(coroutine)
+
+    def apicall(self, typ, endpoint, data=None):
+        return self.run(self.client.apicall(typ, endpoint, data))
+
+    def waitForExportURL(self, fileName, poller=None):
+        return self.run(self.client.waitForExportURL(fileName, poller=poller))
+
+    def download(self, url, onChunk, chunkSize=DEFAULT_CHUNK_SIZE, start=0, end=None):
+        return self.run(self.client.download(url, onChunk, chunkSize=chunkSize, start=start, end=end))
+
+    def downloadExport(self, fields, path, poller=None):
+        return self.run(self.client.downloadExport(fields, path, poller=poller))
+
+    def close(self):
+        """ Function that closes the client's connections and the event loop. """
+        if not self.loop.is_closed():
+            self.run(self.client.close())
+            self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, value, traceBack):
+        self.close()
+
+
+class RetentionManager(object):
+    """
+    Removes the files of previous runs from a directory. Files are selected by compiled patterns matched on their
+    name, the newest ones and the recent ones can be kept, and the rest is deleted in batches.
+    Only the top level of the directory is searched unless asked otherwise: files of other tools in subdirectories are
+    never looked at, let alone removed.
+    """
+
+    def __init__(self, directory, patterns, keepNewest=0, maxAge=None, recursive=False, batchSize=PURGE_BATCH_SIZE,
+                 workers=PURGE_WORKERS):
+        """
+        Constructor function.
+        Parameters
+        ----------
+            - directory : str
+                Directory to clean up
+            - patterns : list
+                Regular expressions (str or compiled) matched against file names. Each pattern is a kind of file, the
+                newest files are kept per kind.
+            - keepNewest : int
+                Files of each kind kept, newest first
+            - maxAge : float
+                Files modified less than this many seconds ago are kept. None keeps none for their age.
+            - recursive : bool
+                Also search the subdirectories
+            - batchSize : int
+                Files removed per batch
+            - workers : int
+                Threads removing batches at once, for network file systems where every removal waits on the server
+        """
+        self.directory = directory
+        self.patterns = [re.compile(pattern) if isinstance(pattern, str) else pattern for pattern in patterns]
+        self.keepNewest = keepNewest
+        self.maxAge = maxAge
+        self.recursive = recursive
+        self.batchSize = batchSize
+        self.workers = workers
+
+    def getKind(self, name):
+        """ Function that returns the index of the first pattern matching a file name, None if none does. """
+        for index, pattern in enumerate(self.patterns):
+            if pattern.match(name):
+                return index
+        return None
+
+    def scan(self, protected=()):
+        """
+        Function that lists the files matching the patterns. Only the matching files are stat'ed.
+        Parameters
+        ----------
+            - protected : iterable
+                Paths of files left out, whatever their name
+        Returns
+        -------
+            - kinds : list
+                For every pattern, a list of (modification time, size, path) of the files it matched
+            - scanned : int
+                Directory entries looked at
+        """
+        kinds = [[] for _ in self.patterns]
+        protected = set(os.path.abspath(path) for path in protected)
+        scanned = 0
+        directories = [self.directory]
+        while directories:
+            directory = directories.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError as e:
+                LOGGER.writeLog("Could not list {}: {}".format(directory, e), severity='warning')
+                continue
+            for entry in entries:
+                scanned += 1
+                if entry.is_dir(follow_symlinks=False):
+                    if self.recursive:
+                        directories.append(entry.path)
+                    continue
+                kind = self.getKind(entry.name)
+                if kind is None or not entry.is_file(follow_symlinks=False):
+                    continue
+                if protected and os.path.abspath(entry.path) in protected:
+                    continue
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    # Removed meanwhile
+                    continue
+                kinds[kind].append((stat.st_mtime, stat.st_size, entry.path))
+        return kinds, scanned
+
+    def select(self, kinds, now=None):
+        """
+        Function that picks the files to remove: all but the keepNewest newest of each kind and those younger
+        than maxAge.
+        Parameters
+        ----------
+            - kinds : list
+                As returned by scan()
+            - now : float
+                Time the ages are counted from. Defaults to the current time.
+        Returns
+        -------
+            - expired : list
+                (size, path) of the files to remove
+            - kept : int
+                Files kept
+        """
+        now = time.time() if now is None else now
+        expired = []
+        kept = 0
+        for files in kinds:
+            files.sort(reverse=True)
+            for rank, (modified, size, path) in enumerate(files):
+                if rank < self.keepNewest or (self.maxAge is not None and now - modified < self.maxAge):
+                    kept += 1
+                else:
+                    expired.append((size, path))
+        return expired, kept
+
+    def removeBatch(self, batch):
+        """
+        Function that removes a batch of files. Files that can't be removed are logged and skipped.
+        Returns
+        -------
+            - removed : int
+            - bytesReclaimed : int
+            - failed : int
+        """
+        removed = 0
+        bytesReclaimed = 0
+        failed = 0
+        for size, path in batch:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already removed by someone else
+                continue
+            except OSError as e:
+                LOGGER.writeLog("Could not remove {}: {}".format(path, e), severity='warning')
+                failed += 1
+                continue
+            removed += 1
+            bytesReclaimed += size
+        return removed, bytesReclaimed, failed
+
+    def purge(self, protected=()):
+        """
+        Function that removes the expired files.
+        Parameters
+        ----------
+            - protected : iterable
+                Paths of files never removed nor counted among the newest, e.g. the ones just written
+        Returns
+        -------
+            - report : dict
+                - scanned : int
+                    Directory entries looked at
+                - matched : int
+                    Files matching a pattern
+                - kept : int
+                    Files kept for being among the newest or recent enough
+                - removed : int
+                    Files removed
+                - bytesReclaimed : int
+                    Size of the files removed
+                - failed : int
+                    Files that couldn't be removed
+        """
+        kinds, scanned = self.scan(protected)
+        expired, kept = self.select(kinds)
+        batches = [expired[index:index + self.batchSize] for index in range(0, len(expired), self.batchSize)]
+        if self.workers > 1 and len(batches) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(batches))) as pool:
+                results = list(pool.map(self.removeBatch, batches))
+        else:
+            results = [self.removeBatch(batch) for batch in batches]
+        return {'scanned': scanned, 'matched': kept + len(expired), 'kept': kept,
+                'removed': sum(result[0] for result in results),
+                'bytesReclaimed': sum(result[1] for result in results),
+                'failed': sum(result[2] for result in results)}
+
+
+# Metrics of the run, fed through the logger and only written with --metrics
+METRICS = MetricsEmitter('suredone_download')
+declareRunMetrics(METRICS)
+METRICS.counter('api_calls_total', 'SureDone API calls, by method and HTTP status (error when none was received)')
+METRICS.histogram('api_call_duration_seconds', 'Response time of the SureDone API calls, by method')
+METRICS.counter('retries_total', 'Requests retried, by HTTP status of the failure (error for connection errors)')
+METRICS.counter('sleep_seconds_total', 'Seconds slept, by reason (retry, rate_limit, poll)')
+METRICS.counter('bytes_downloaded_total', 'Bytes of export downloaded')
+METRICS.counter('files_purged_total', 'Files of previous runs removed from the download directory')
+METRICS.counter('bytes_purged_total', 'Bytes reclaimed by removing the files of previous runs')
 
 # Determine log file path
-LOGGER = Logger(verbose=False)
+LOGGER = Logger(verbose=False, metrics=METRICS)
+
+# Rate limiter shared by every SureDone object in the process
+RATE_LIMITER = RateLimiter()
+
+# Retry time allowed for the whole run, shared by every retry policy
+RETRY_BUDGET = RetryBudget()
+
+# Memory the row buffers of the run may hold
+MEMORY_BUDGET = MemoryBudget()
+
+# Stage timings of the run, only collected with --profile
+PROFILER = RunProfiler('suredone_download')
 
 if __name__ == "__main__":
     sys.stdout = LOGGER
     sys.excepthook = LOGGER.exceptionLogger
-    main(sys.argv[1:])
+    sys.exit(main(sys.argv[1:]))
@@ -2,8 +2,11 @@
 '''
     Clean up Walker Inventory feed
 '''
+import os
+import sys
 import csv
 import pandas as pd
+from profiling import RunProfiler
 
 inputfile='./walker.csv'
 outputfile='walker.tsv'
@@ -16,33 +19,57 @@ my_columns={
             'part GG inventory':str
             }
 
-# Read suredone.csv
-data = pd.read_csv(inputfile, converters=my_columns, skiprows=0)
+# Stage timings, only collected with --profile
+PROFILER = RunProfiler('walker')
 
-data['part description'] = data['part description'].str.replace(',', '')
 
-# List Columns to save in tsv file
-# In this case I am saving all columns
-my_list=list(data.columns.values)
+def readFeed(path):
+    # Read walker.csv
+    return pd.read_csv(path, converters=my_columns, skiprows=0)
 
-'''
-my_list = ['VendorID',
-         'LineMasterID',
-         'Part',
-         'PartNumber',
-         'Interchangepartnumber',
-         'Description',
-         'UPC',
-         'Cost']
-'''
 
-# Write data frame by selected columns to csv file
-data.to_csv(outputfile, encoding='utf-8', escapechar='\\', float_format='%.2f', index=False, columns = my_list, line_terminator='\r\n', quoting=csv.QUOTE_NONE, sep='\t') # Create csv file for SQL Server to import
-'''
-    columns = my_list      - Only save selected columns from my_list
-    encoding='utf-8'       - Use utf encoding
-    float_format='%.2f'    - Set to 2 decimal places
-    index=False            - Turn off row number
-    quoting=csv.QUOTE_NONE - Don't surround text columns with double quotes
-    sep=','                - Use comma as column delimiter
-'''
+def cleanFeed(data):
+    data['part description'] = data['part description'].str.replace(',', '')
+    return data
+
+
+def writeFeed(data, path):
+    # List Columns to save in tsv file
+    # In this case I am saving all columns
+    my_list=list(data.columns.values)
+
+    '''
+    my_list = ['VendorID',
+             'LineMasterID',
+             'Part',
+             'PartNumber',
+             'Interchangepartnumber',
+             'Description',
+             'UPC',
+             'Cost']
+    '''
+
+    # Write data frame by selected columns to csv file
+    data.to_csv(path, encoding='utf-8', escapechar='\\', float_format='%.2f', index=False, columns = my_list, line_terminator='\r\n', quoting=csv.QUOTE_NONE, sep='\t') # Create csv file for SQL Server to import
+    '''
+        columns = my_list      - Only save selected columns from my_list
+        encoding='utf-8'       - Use utf encoding
+        float_format='%.2f'    - Set to 2 decimal places
+        index=False            - Turn off row number
+        quoting=csv.QUOTE_NONE - Don't surround text columns with double quotes
+        sep=','                - Use comma as column delimiter
+    '''
+
+
+if __name__ == '__main__':
+    # --profile writes walker_profile.json next to the output, --cprofile also dumps walker_profile.pstats
+    if '--profile' in sys.argv or '--cprofile' in sys.argv:
+        PROFILER.enable('walker_profile.json', 'walker_profile.pstats' if '--cprofile' in sys.argv else None)
+
+    with PROFILER.stage('parse', bytesIn=os.path.getsize(inputfile)):
+        data = readFeed(inputfile)
+    with PROFILER.stage('transform'):
+        data = cleanFeed(data)
+    with PROFILER.stage('write') as writeStage:
+        writeFeed(data, outputfile)
+        writeStage.addBytes(bytesOut=os.path.getsize(outputfile))